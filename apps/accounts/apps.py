@@ -3,4 +3,7 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.accounts'
-    label = 'accounts'  # <<< adiciona label curto
\ No newline at end of file
+    label = 'accounts'  # <<< adiciona label curto
+
+    def ready(self):
+        from . import cronometro  # noqa: F401  (execute_wrapper nas conexões novas)
@@ -0,0 +1,153 @@
+"""
+Cabeçalho ``Server-Timing`` com o tempo de cada requisição separado em SQL,
+templates, motor de slots e total (aparece no DevTools, inclusive nas
+requisições HTMX).
+
+``ServerTimingMiddleware`` abre uma ``Medicao`` por requisição num
+``ContextVar`` (que também chega às threads de ``sync_to_async``), a mesma
+usada por ``metricas.MetricasMiddleware``; quem quiser ser medido usa
+``medir(metrica)`` ou ``@cronometrado(metrica)`` e, fora de uma requisição
+medida, não paga nada além de ler o ContextVar. O SQL é medido por
+um ``execute_wrapper`` instalado em cada conexão nova e o template pelo backend
+``TemplatesCronometrados`` (configurado em ``TEMPLATES``).
+
+``settings.SERVER_TIMING`` (por padrão igual a ``DEBUG``) liga o middleware.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates, Template
+
+# métrica -> descrição no cabeçalho, na ordem em que aparecem
+METRICAS = {
+    "sql": "SQL",
+    "tpl": "Templates",
+    "slots": "Motor de slots",
+}
+
+_atual: ContextVar["Medicao | None"] = ContextVar("cronometro_medicao", default=None)
+
+
+class Medicao:
+    """Tempos (segundos) e contagens acumulados de uma requisição."""
+
+    def __init__(self):
+        self.inicio = perf_counter()
+        self.tempos = dict.fromkeys(METRICAS, 0.0)
+        self.contagens = dict.fromkeys(METRICAS, 0)
+        self.abertas = set()
+
+    def somar(self, metrica, segundos):
+        self.tempos[metrica] = self.tempos.get(metrica, 0.0) + segundos
+        self.contagens[metrica] = self.contagens.get(metrica, 0) + 1
+
+    def cabecalho(self) -> str:
+        partes = []
+        for metrica, descricao in METRICAS.items():
+            if metrica == "sql":
+                descricao = f"SQL ({self.contagens['sql']} consultas)"
+            partes.append(f'{metrica};dur={self.tempos[metrica] * 1000:.1f};desc="{descricao}"')
+        partes.append(f'total;dur={(perf_counter() - self.inicio) * 1000:.1f};desc="Total"')
+        return ", ".join(partes)
+
+
+@contextmanager
+def medicao_da_requisicao():
+    """Abre uma ``Medicao`` (ou reaproveita a já aberta por outro middleware)."""
+    medicao = _atual.get()
+    if medicao is not None:
+        yield medicao
+        return
+    medicao = Medicao()
+    token = _atual.set(medicao)
+    try:
+        yield medicao
+    finally:
+        _atual.reset(token)
+
+
+@contextmanager
+def medir(metrica):
+    """Soma o tempo do bloco em ``metrica``; chamadas aninhadas da mesma métrica contam uma vez."""
+    medicao = _atual.get()
+    if medicao is None or metrica in medicao.abertas:
+        yield
+        return
+    medicao.abertas.add(metrica)
+    inicio = perf_counter()
+    try:
+        yield
+    finally:
+        medicao.abertas.discard(metrica)
+        medicao.somar(metrica, perf_counter() - inicio)
+
+
+def cronometrado(metrica):
+    def decorador(func):
+        @wraps(func)
+        def medido(*args, **kwargs):
+            with medir(metrica):
+                return func(*args, **kwargs)
+        return medido
+    return decorador
+
+
+def _medir_sql(execute, sql, params, many, context):
+    with medir("sql"):
+        return execute(sql, params, many, context)
+
+
+@receiver(connection_created)
+def _instalar_wrapper(sender, connection, **kwargs):
+    if _medir_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_medir_sql)
+
+
+class _TemplateCronometrado(Template):
+    def render(self, context=None, request=None):
+        with medir("tpl"):
+            return super().render(context, request)
+
+
+class TemplatesCronometrados(DjangoTemplates):
+    """``DjangoTemplates`` que mede a renderização (includes ficam dentro do template que os chama)."""
+
+    def from_string(self, template_code):
+        return _TemplateCronometrado(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return _TemplateCronometrado(super().get_template(template_name).template, self)
+
+
+class ServerTimingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "SERVER_TIMING", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with medicao_da_requisicao() as medicao:
+            response = self.get_response(request)
+        response["Server-Timing"] = medicao.cabecalho()
+        return response
+
+    async def __acall__(self, request):
+        with medicao_da_requisicao() as medicao:
+            response = await self.get_response(request)
+        response["Server-Timing"] = medicao.cabecalho()
+        return response
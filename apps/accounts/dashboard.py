@@ -0,0 +1,397 @@
+"""
+Agregações do dashboard do owner, resolvidas por loja e por período.
+
+O período (dia, semana ou mês) é escolhido pelo tamanho do intervalo, de modo
+que intervalos longos não gerem milhares de pontos por série; o agrupamento é
+feito no banco com ``Trunc*``.
+
+Períodos fechados (terminados antes de hoje) não mudam mais: o resultado de
+cada um fica em cache sem expiração e só é descartado quando um agendamento
+daquele dia é editado ou finalizado com atraso (ver receivers em
+``appointments.models``). O período corrente, os futuros e os períodos
+cortados pelas bordas do intervalo são sempre recalculados. Intervalos que
+alcançam o arquivo (``appointments.arquivo``) somam as duas tabelas.
+"""
+from datetime import date, timedelta
+import hashlib
+import uuid
+
+from django.core.cache import cache
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.utils import timezone
+
+from apps.appointments import arquivo
+from apps.appointments.models import Agendamento, AgendamentoArquivado
+
+FAMILIAS = ("totais", "funcionarios", "servicos")
+GRANULARIDADES = ("day", "week", "month")
+
+# limite de dias do intervalo para cada granularidade (acima disso, mês)
+LIMITE_DIARIO = 62
+LIMITE_SEMANAL = 366
+
+_CONFIRMADOS = Q(confirmado=True, valor_final__isnull=False)
+
+
+def escolher_granularidade(inicio: date, fim: date) -> str:
+    dias = (fim - inicio).days + 1
+    if dias <= LIMITE_DIARIO:
+        return "day"
+    if dias <= LIMITE_SEMANAL:
+        return "week"
+    return "month"
+
+
+def inicio_periodo(dia: date, granularidade: str) -> date:
+    if granularidade == "week":
+        return dia - timedelta(days=dia.weekday())
+    if granularidade == "month":
+        return dia.replace(day=1)
+    return dia
+
+
+def fim_periodo(inicio: date, granularidade: str) -> date:
+    if granularidade == "week":
+        return inicio + timedelta(days=6)
+    if granularidade == "month":
+        return (inicio.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return inicio
+
+
+def periodos(inicio: date, fim: date, granularidade: str) -> list[date]:
+    """Inícios dos períodos que cobrem ``[inicio, fim]``."""
+    out = []
+    cur = inicio_periodo(inicio, granularidade)
+    while cur <= fim:
+        out.append(cur)
+        cur = fim_periodo(cur, granularidade) + timedelta(days=1)
+    return out
+
+
+def _trunc(campo: str, granularidade: str):
+    if granularidade == "week":
+        return TruncWeek(campo)
+    if granularidade == "month":
+        return TruncMonth(campo)
+    return F(campo)
+
+
+def _chave(familia: str, granularidade: str, loja_id: int, periodo: date) -> str:
+    return f"dashboard:{familia}:{granularidade}:{loja_id}:{periodo.isoformat()}"
+
+
+def invalidar_dia(loja_id: int, dia: date) -> None:
+    """Descarta os resultados em cache dos períodos que contêm ``dia``."""
+    cache.delete_many([
+        _chave(f, g, loja_id, inicio_periodo(dia, g))
+        for f in FAMILIAS
+        for g in GRANULARIDADES
+    ])
+
+
+# ---------- cálculo (somente períodos que faltam no cache) ----------
+
+def _modelos(inicio):
+    return [Agendamento, AgendamentoArquivado] if arquivo.alcanca(inicio) else [Agendamento]
+
+
+def _calcula_totais(loja_ids, inicio, fim, granularidade):
+    out = {}
+    for modelo in _modelos(inicio):
+        qs = (modelo.objects
+              .filter(loja_id__in=loja_ids, data__range=[inicio, fim])
+              .values("loja_id", periodo=_trunc("data", granularidade))
+              .annotate(
+                  agendamentos=Count("id"),
+                  no_show=Count("id", filter=Q(no_show=True)),
+                  confirmados=Count("id", filter=_CONFIRMADOS),
+                  faturamento=Sum("valor_final", filter=_CONFIRMADOS),
+              )
+              .order_by())
+        for r in qs:
+            t = out.setdefault((r["loja_id"], r["periodo"]), _vazio("totais"))
+            t["agendamentos"] += r["agendamentos"]
+            t["no_show"] += r["no_show"]
+            t["confirmados"] += r["confirmados"]
+            t["faturamento"] += float(r["faturamento"] or 0)
+    return out
+
+
+def _calcula_funcionarios(loja_ids, inicio, fim, granularidade):
+    out = {}
+    for modelo in _modelos(inicio):
+        qs = (modelo.objects
+              .filter(_CONFIRMADOS, loja_id__in=loja_ids, data__range=[inicio, fim])
+              .values("loja_id", "funcionario_id", periodo=_trunc("data", granularidade))
+              .annotate(total=Sum("valor_final"))
+              .order_by())
+        for r in qs:
+            por_func = out.setdefault((r["loja_id"], r["periodo"]), {})
+            por_func[r["funcionario_id"]] = por_func.get(r["funcionario_id"], 0.0) + float(r["total"] or 0)
+    return out
+
+
+def _calcula_servicos(loja_ids, inicio, fim, granularidade):
+    out = {}
+    for modelo in _modelos(inicio):
+        through = modelo.servicos.through
+        ag = modelo.servicos.field.m2m_field_name()
+        qs = (through.objects
+              .filter(**{
+                  f"{ag}__loja_id__in": loja_ids,
+                  f"{ag}__data__range": [inicio, fim],
+                  "servico__loja_id": F(f"{ag}__loja_id"),
+              })
+              .values("servico_id", loja_id=F(f"{ag}__loja_id"),
+                      periodo=_trunc(f"{ag}__data", granularidade))
+              .annotate(total=Count("id"))
+              .order_by())
+        for r in qs:
+            por_serv = out.setdefault((r["loja_id"], r["periodo"]), {})
+            por_serv[r["servico_id"]] = por_serv.get(r["servico_id"], 0) + r["total"]
+    return out
+
+
+_CALCULOS = {
+    "totais": _calcula_totais,
+    "funcionarios": _calcula_funcionarios,
+    "servicos": _calcula_servicos,
+}
+
+
+def _vazio(familia):
+    if familia == "totais":
+        return {"agendamentos": 0, "no_show": 0, "confirmados": 0, "faturamento": 0.0}
+    return {}
+
+
+def resumo_por_periodo(familia: str, loja_ids, inicio: date, fim: date, granularidade: str = "day") -> dict:
+    """
+    Retorna ``{(loja_id, inicio_do_periodo): valor}`` para os períodos do intervalo.
+
+    Períodos fechados e inteiramente dentro do intervalo vêm do cache; os que
+    faltam são calculados numa única consulta agrupada e os fechados são
+    gravados sem expiração.
+    """
+    hoje = timezone.localdate()
+    inicios = periodos(inicio, fim, granularidade)
+    cacheaveis = {
+        p for p in inicios
+        if p >= inicio and fim_periodo(p, granularidade) <= fim and fim_periodo(p, granularidade) < hoje
+    }
+
+    chaves = {_chave(familia, granularidade, l, p): (l, p) for l in loja_ids for p in cacheaveis}
+    em_cache = cache.get_many(list(chaves))
+    resultado = {chaves[k]: v for k, v in em_cache.items()}
+
+    faltando = [(l, p) for l in loja_ids for p in inicios if (l, p) not in resultado]
+    if not faltando:
+        return resultado
+
+    calculado = _CALCULOS[familia](
+        {l for l, _ in faltando},
+        max(inicio, min(p for _, p in faltando)),
+        min(fim, fim_periodo(max(p for _, p in faltando), granularidade)),
+        granularidade,
+    )
+    novos = {}
+    for l, p in faltando:
+        valor = calculado.get((l, p)) or _vazio(familia)
+        resultado[(l, p)] = valor
+        if p in cacheaveis:
+            novos[_chave(familia, granularidade, l, p)] = valor
+    if novos:
+        cache.set_many(novos, timeout=None)
+    return resultado
+
+
+# ---------- painéis ----------
+#
+# Cada painel do dashboard é servido por um fragmento HTMX próprio
+# (``owner_dashboard_painel``) e tem o seu próprio cache, versionado por loja:
+# qualquer alteração de agendamento da loja troca a versão e os painéis dela
+# deixam de ser reaproveitados.
+
+PAINEL_CACHE_TIMEOUT = 300
+
+_FORMATO_ROTULO = {"day": "%d/%m", "week": "%d/%m", "month": "%m/%Y"}
+_NOME_PERIODO = {"day": "dia", "week": "semana", "month": "mês"}
+
+
+def _chave_versao(loja_id: int) -> str:
+    return f"dashboard:versao:{loja_id}"
+
+
+def invalidar_paineis(loja_id: int) -> None:
+    """Troca a versão da loja, descartando os painéis em cache que a incluem."""
+    cache.set(_chave_versao(loja_id), uuid.uuid4().hex, timeout=None)
+
+
+def _versoes(loja_ids) -> list[str]:
+    chaves = [_chave_versao(l) for l in loja_ids]
+    versoes = cache.get_many(chaves)
+    novas = {k: uuid.uuid4().hex for k in chaves if k not in versoes}
+    if novas:
+        cache.set_many(novas, timeout=None)
+        versoes.update(novas)
+    return [versoes[k] for k in chaves]
+
+
+def _periodos_do_intervalo(inicio, fim):
+    granularidade = escolher_granularidade(inicio, fim)
+    return granularidade, periodos(inicio, fim, granularidade)
+
+
+def painel_ticket_medio(lojas, inicio, fim):
+    granularidade, pontos = _periodos_do_intervalo(inicio, fim)
+    totais = resumo_por_periodo("totais", [l.id for l in lojas], inicio, fim, granularidade)
+    # somente lojas com atendimentos confirmados
+    labels, values = [], []
+    for loja in lojas:
+        fat = sum(totais[(loja.id, d)]["faturamento"] for d in pontos)
+        conf = sum(totais[(loja.id, d)]["confirmados"] for d in pontos)
+        if conf:
+            labels.append(loja.nome)
+            values.append(fat / conf)
+    return {"ticket_medio_labels": labels, "ticket_medio_values": values}
+
+
+def _painel_serie(campo, chave, lojas, inicio, fim):
+    granularidade, pontos = _periodos_do_intervalo(inicio, fim)
+    totais = resumo_por_periodo("totais", [l.id for l in lojas], inicio, fim, granularidade)
+    return {
+        chave: [
+            {"name": loja.nome, "data": [totais[(loja.id, d)][campo] for d in pontos]}
+            for loja in lojas
+        ],
+        "granularidade": granularidade,
+        "periodo_label": _NOME_PERIODO[granularidade],
+        "dia_labels": [d.strftime(_FORMATO_ROTULO[granularidade]) for d in pontos],
+    }
+
+
+def painel_faturamento_dia(lojas, inicio, fim):
+    return _painel_serie("faturamento", "fat_dia_series", lojas, inicio, fim)
+
+
+def painel_agendamentos_dia(lojas, inicio, fim):
+    return _painel_serie("agendamentos", "ag_dia_series", lojas, inicio, fim)
+
+
+def painel_servicos(lojas, inicio, fim):
+    from apps.cadastro.models import Servico
+
+    granularidade, _ = _periodos_do_intervalo(inicio, fim)
+    por_serv = resumo_por_periodo("servicos", [l.id for l in lojas], inicio, fim, granularidade)
+
+    # nomes resolvidos agora: o cache guarda só ids
+    serv_totais = {}
+    for (loja_id, _), valores in por_serv.items():
+        for serv_id, total in valores.items():
+            serv_totais.setdefault(loja_id, {}).setdefault(serv_id, 0)
+            serv_totais[loja_id][serv_id] += total
+    serv_ids = {s for v in serv_totais.values() for s in v}
+    serv_nomes = dict(Servico.objects.filter(id__in=serv_ids).values_list("id", "nome"))
+    servicos_por_loja = []
+    for loja in lojas:
+        itens = sorted(serv_totais.get(loja.id, {}).items(), key=lambda kv: -kv[1])
+        servicos_por_loja.append({
+            "loja": loja.nome,
+            "labels": [serv_nomes.get(s, "") for s, _ in itens],
+            "values": [t for _, t in itens],
+        })
+    return {"servicos_por_loja": servicos_por_loja}
+
+
+def painel_faturamento_funcionario(lojas, inicio, fim):
+    from apps.cadastro.models import Funcionario
+
+    granularidade, _ = _periodos_do_intervalo(inicio, fim)
+    por_func = resumo_por_periodo("funcionarios", [l.id for l in lojas], inicio, fim, granularidade)
+
+    func_totais = {}
+    for valores in por_func.values():
+        for func_id, total in valores.items():
+            func_totais[func_id] = func_totais.get(func_id, 0) + total
+    func_nomes = dict(Funcionario.objects.filter(id__in=func_totais).values_list("id", "nome"))
+    # agrupado pelo nome do funcionário
+    fat_por_nome = {}
+    for func_id, total in func_totais.items():
+        nome = func_nomes.get(func_id, "")
+        fat_por_nome[nome] = fat_por_nome.get(nome, 0) + total
+    fat_func = sorted(fat_por_nome.items())
+    return {
+        "fat_func_labels": [nome for nome, _ in fat_func],
+        "fat_func_values": [total for _, total in fat_func],
+    }
+
+
+def painel_no_show(lojas, inicio, fim):
+    granularidade, _ = _periodos_do_intervalo(inicio, fim)
+    totais = resumo_por_periodo("totais", [l.id for l in lojas], inicio, fim, granularidade)
+    no_show_count = sum(v["no_show"] for v in totais.values())
+    total_count = sum(v["agendamentos"] for v in totais.values())
+    return {
+        "no_show_count": no_show_count,
+        "no_show_percent": (no_show_count / total_count * 100) if total_count else 0,
+    }
+
+
+def painel_ocupacao(lojas, inicio, fim):
+    from apps.appointments.utils import calcular_ocupacao
+    from apps.cadastro.models import Funcionario
+
+    funcionarios = (Funcionario.objects
+                    .filter(loja__in=lojas, ativo=True)
+                    .select_related("loja__agendamento_config")
+                    .order_by("nome"))
+    ocupacao = calcular_ocupacao(funcionarios, inicio, fim)
+
+    # série diária agregada na mesma granularidade dos demais gráficos
+    granularidade, pontos = _periodos_do_intervalo(inicio, fim)
+    por_periodo = {p: [0, 0] for p in pontos}
+    for dia in ocupacao["dias"]:
+        acc = por_periodo[inicio_periodo(dia["data"], granularidade)]
+        acc[0] += dia["disponivel"]
+        acc[1] += dia["ocupado"]
+    return {
+        "ocupacao_percentual": ocupacao["percentual"],
+        "ocupacao_horas_ocupadas": ocupacao["ocupado"] / 60,
+        "ocupacao_horas_disponiveis": ocupacao["disponivel"] / 60,
+        "ocupacao_periodo_labels": [p.strftime(_FORMATO_ROTULO[granularidade]) for p in pontos],
+        "ocupacao_periodo_values": [
+            round(o / d * 100, 1) if d else 0 for d, o in por_periodo.values()
+        ],
+        "ocupacao_hora_labels": [f"{h['hora']:02d}h" for h in ocupacao["horas"]],
+        "ocupacao_hora_values": [round(h["percentual"], 1) for h in ocupacao["horas"]],
+        "ocupacao_funcionarios": [f for f in ocupacao["funcionarios"] if f["disponivel"]],
+        "periodo_label": _NOME_PERIODO[granularidade],
+    }
+
+
+PAINEIS = {
+    "no-show": painel_no_show,
+    "ticket-medio": painel_ticket_medio,
+    "faturamento-funcionario": painel_faturamento_funcionario,
+    "faturamento-dia": painel_faturamento_dia,
+    "agendamentos-dia": painel_agendamentos_dia,
+    "servicos": painel_servicos,
+    "ocupacao": painel_ocupacao,
+}
+
+
+def dados_painel(painel: str, lojas, inicio: date, fim: date) -> dict:
+    """Dados de um painel do dashboard, reaproveitando o cache do painel quando possível."""
+    lojas = list(lojas)
+    loja_ids = [l.id for l in lojas]
+    escopo = ",".join(str(l) for l in loja_ids) + ":" + ",".join(_versoes(loja_ids))
+    chave = "dashboard:painel:{}:{}:{}:{}".format(
+        painel, inicio.isoformat(), fim.isoformat(),
+        hashlib.sha1(escopo.encode()).hexdigest(),
+    )
+    dados = cache.get(chave)
+    if dados is None:
+        dados = PAINEIS[painel](lojas, inicio, fim)
+        cache.set(chave, dados, timeout=PAINEL_CACHE_TIMEOUT)
+    return dados
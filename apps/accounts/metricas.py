@@ -0,0 +1,242 @@
+"""
+Métricas no formato texto do Prometheus, sem dependências, servidas em
+``/metrics`` (``views.metricas_prometheus``, que exige ``METRICAS_TOKEN`` fora
+do DEBUG).
+
+- ``MetricasMiddleware`` registra, por nome de URL resolvido
+  (``accounts:owner_dashboard``...), a latência (histograma), as requisições
+  por status, as consultas SQL e o tempo no motor de slots; os dois últimos
+  vêm da ``Medicao`` do ``cronometro``.
+- ``CacheComMetricas`` envolve qualquer backend de cache (``BACKEND_REAL`` em
+  ``CACHES``) e conta acertos e faltas por grupo de chave
+  (``dashboard:versao``, ``agendamentos:arquivo``...).
+
+Cada família tem sua própria trava, segurada só para somar; a exportação
+copia os valores sob a trava e formata fora dela. Os valores são do processo:
+com vários workers, cada um expõe os seus.
+"""
+from bisect import bisect_left
+from threading import Lock
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.module_loading import import_string
+
+from . import cronometro
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+NAO_RESOLVIDA = "nao_resolvida"
+
+BUCKETS_REQUISICAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_SLOTS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _rotulos(nomes, valores, extra="") -> str:
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor) -> str:
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Familia:
+    tipo = ""
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._trava = Lock()
+        self._valores = {}
+
+    def _copia(self):
+        with self._trava:
+            return {chave: (list(v) if isinstance(v, list) else v) for chave, v in self._valores.items()}
+
+    def limpar(self):
+        with self._trava:
+            self._valores.clear()
+
+    def linhas(self):
+        yield f"# HELP {self.nome} {self.ajuda}"
+        yield f"# TYPE {self.nome} {self.tipo}"
+
+
+class Contador(_Familia):
+    tipo = "counter"
+
+    def inc(self, *rotulos, valor=1):
+        with self._trava:
+            self._valores[rotulos] = self._valores.get(rotulos, 0) + valor
+
+    def linhas(self):
+        yield from super().linhas()
+        for chave, valor in sorted(self._copia().items()):
+            yield f"{self.nome}{_rotulos(self.rotulos, chave)} {_numero(valor)}"
+
+
+class Histograma(_Familia):
+    """Guarda por série ``[contagem por bucket..., +Inf, soma]``; acumula só ao exportar."""
+
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, rotulos=(), buckets=BUCKETS_REQUISICAO):
+        super().__init__(nome, ajuda, rotulos)
+        self.buckets = tuple(buckets)
+
+    def observar(self, valor, *rotulos):
+        i = bisect_left(self.buckets, valor)
+        with self._trava:
+            serie = self._valores.get(rotulos)
+            if serie is None:
+                serie = self._valores[rotulos] = [0] * (len(self.buckets) + 1) + [0.0]
+            serie[i] += 1
+            serie[-1] += valor
+
+    def linhas(self):
+        yield from super().linhas()
+        for chave, serie in sorted(self._copia().items()):
+            acumulado = 0
+            for limite, n in zip((*map(_numero, self.buckets), "+Inf"), serie):
+                acumulado += n
+                le = f'le="{limite}"'
+                yield f"{self.nome}_bucket{_rotulos(self.rotulos, chave, le)} {acumulado}"
+            yield f"{self.nome}_sum{_rotulos(self.rotulos, chave)} {_numero(serie[-1])}"
+            yield f"{self.nome}_count{_rotulos(self.rotulos, chave)} {acumulado}"
+
+
+REQUISICOES = Contador(
+    "barber_requisicoes_total", "Requisições por view e status.", ("view", "status"),
+)
+LATENCIA = Histograma(
+    "barber_requisicao_duracao_segundos", "Tempo de resposta por view.", ("view",),
+)
+SQL_CONSULTAS = Contador(
+    "barber_sql_consultas_total", "Consultas SQL executadas por view.", ("view",),
+)
+SQL_TEMPO = Contador(
+    "barber_sql_duracao_segundos_total", "Tempo em SQL por view.", ("view",),
+)
+SLOTS = Histograma(
+    "barber_slots_duracao_segundos", "Tempo no motor de slots por requisição que o usa.",
+    ("view",), buckets=BUCKETS_SLOTS,
+)
+CACHE = Contador(
+    "barber_cache_acessos_total", "Leituras de cache por grupo de chave e resultado.",
+    ("cache", "grupo", "resultado"),
+)
+
+FAMILIAS = [REQUISICOES, LATENCIA, SQL_CONSULTAS, SQL_TEMPO, SLOTS, CACHE]
+
+
+def exportar() -> str:
+    return "\n".join(linha for familia in FAMILIAS for linha in familia.linhas()) + "\n"
+
+
+def registrar(view, status, duracao, medicao):
+    REQUISICOES.inc(view, status)
+    LATENCIA.observar(duracao, view)
+    if medicao.contagens["sql"]:
+        SQL_CONSULTAS.inc(view, valor=medicao.contagens["sql"])
+        SQL_TEMPO.inc(view, valor=medicao.tempos["sql"])
+    if medicao.contagens["slots"]:
+        SLOTS.observar(medicao.tempos["slots"], view)
+
+
+class MetricasMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "METRICAS", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _view(request):
+        match = getattr(request, "resolver_match", None)
+        return match.view_name if match else NAO_RESOLVIDA
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        inicio = perf_counter()
+        with cronometro.medicao_da_requisicao() as medicao:
+            response = self.get_response(request)
+        registrar(self._view(request), response.status_code, perf_counter() - inicio, medicao)
+        return response
+
+    async def __acall__(self, request):
+        inicio = perf_counter()
+        with cronometro.medicao_da_requisicao() as medicao:
+            response = await self.get_response(request)
+        registrar(self._view(request), response.status_code, perf_counter() - inicio, medicao)
+        return response
+
+
+def _grupo(chave) -> str:
+    """``dashboard:receita:dia:3:2025-01-02`` -> ``dashboard:receita``."""
+    return ":".join(str(chave).split(":", 2)[:2])
+
+
+class CacheComMetricas:
+    """
+    Backend de cache que delega tudo a ``BACKEND_REAL`` e conta as leituras::
+
+        CACHES = {"default": {
+            "BACKEND": "apps.accounts.metricas.CacheComMetricas",
+            "BACKEND_REAL": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "default",
+        }}
+    """
+
+    _ausente = object()
+
+    def __init__(self, location, params):
+        params = dict(params)
+        self.nome = location or "default"
+        self._cache = import_string(params.pop("BACKEND_REAL"))(location, params)
+
+    def __getattr__(self, nome):
+        return getattr(self._cache, nome)
+
+    def __contains__(self, key):
+        return key in self._cache
+
+    def _contar(self, chaves, encontradas):
+        for chave in chaves:
+            CACHE.inc(self.nome, _grupo(chave), "hit" if chave in encontradas else "miss")
+
+    def get(self, key, default=None, version=None):
+        valor = self._cache.get(key, self._ausente, version=version)
+        CACHE.inc(self.nome, _grupo(key), "miss" if valor is self._ausente else "hit")
+        return default if valor is self._ausente else valor
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        encontrados = self._cache.get_many(keys, version=version)
+        self._contar(keys, encontrados)
+        return encontrados
+
+    async def aget(self, key, default=None, version=None):
+        valor = await self._cache.aget(key, self._ausente, version=version)
+        CACHE.inc(self.nome, _grupo(key), "miss" if valor is self._ausente else "hit")
+        return default if valor is self._ausente else valor
+
+    async def aget_many(self, keys, version=None):
+        keys = list(keys)
+        encontrados = await self._cache.aget_many(keys, version=version)
+        self._contar(keys, encontrados)
+        return encontrados
@@ -4,6 +4,8 @@ from django.utils import timezone
 from django.core.validators import RegexValidator
 from django.utils.text import slugify
 
+from . import slugs
+
 class UserManager(BaseUserManager):
     use_in_migrations = True
 
@@ -54,6 +56,13 @@ class User(AbstractUser):
 
     objects = UserManager()
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # nome e telefone carregados: a busca do histórico só reindexa se mudarem
+        instance._busca_original = (instance.__dict__.get("full_name"), instance.__dict__.get("phone"))
+        return instance
+
     def __str__(self):
         role = "Owner" if self.is_owner else ("Cliente" if self.is_client else "Usuário")
         return f"{self.email or self.full_name} ({role})"
@@ -66,15 +75,11 @@ class User(AbstractUser):
             iniciais = sobrenome[:2] if sobrenome else ""
 
             base_slug = slugify(f"{base}{iniciais}") or "grupo"
-            candidato = base_slug
-            i = 1
-
-            # garante unicidade
-            while User.objects.filter(grupo=candidato).exclude(pk=self.pk).exists():
-                i += 1
-                candidato = f"{base_slug}{i}"
-
-            self.grupo = candidato
+            # sem restrição de unicidade no banco: basta a consulta única do alocador
+            self.grupo = slugs.proximo_livre(
+                User.objects.exclude(pk=self.pk), "grupo", base_slug, separador="",
+                max_length=self._meta.get_field("grupo").max_length,
+            )
 
         super().save(*args, **kwargs)
 
@@ -0,0 +1,212 @@
+"""
+Perfil de requisições marcadas, para investigar lentidão de uma loja em
+produção sem novo deploy.
+
+Um usuário staff marca a requisição com o cabeçalho ``X-Perfil`` ou com
+``?_perfil=`` na URL:
+
+- ``1``/``cprofile``: roda sob ``cProfile`` e grava ``.prof`` (abre com
+  ``pstats``, snakeviz...);
+- ``amostragem``: uma thread lê a pilha da requisição a cada
+  ``PERFIL_INTERVALO`` segundos e grava ``.collapsed`` (uma pilha por linha,
+  ``a;b;c N``), pronto para ``flamegraph.pl`` ou speedscope.
+
+O arquivo vai para ``settings.PERFIL_DIR`` com o nome da view e da loja
+(``accounts.owner_dashboard__3__20250102-101500-123456.prof``), e o nome volta
+no cabeçalho ``X-Perfil`` da resposta. Uma requisição é perfilada por vez
+(as outras seguem normais, com ``X-Perfil: ocupado``).
+
+Sob ASGI (``barber.asgi``) a cadeia roda em modo assíncrono e as views
+síncronas executam na thread do ``sync_to_async``, fora do alcance do
+cProfile da thread do loop: nesse caso os dois modos viram amostragem de
+todas as threads (cada pilha começa com ``thread:<nome>``), o que inclui o que
+outras requisições simultâneas estiverem fazendo.
+"""
+import cProfile
+import sys
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from threading import Event, Lock, Thread, enumerate as threads_ativas, get_ident
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.text import slugify
+
+CABECALHO = "X-Perfil"
+PARAMETRO = "_perfil"
+AMOSTRAGEM = "amostragem"
+INTERVALO = 0.005
+
+_em_uso = Lock()
+
+
+class Amostrador:
+    """
+    Conta as pilhas da thread ``alvo`` (formato collapsed) enquanto ativo;
+    com ``alvo=None``, as de todas as threads, cada uma sob ``thread:<nome>``.
+    """
+
+    def __init__(self, alvo, intervalo):
+        self.alvo = alvo
+        self.intervalo = intervalo
+        self.pilhas = Counter()
+        self._parar = Event()
+        self._thread = Thread(target=self._rodar, name="perfil-amostragem", daemon=True)
+
+    def _rodar(self):
+        propria = get_ident()
+        while not self._parar.wait(self.intervalo):
+            frames = sys._current_frames()
+            if self.alvo is not None:
+                frames = {self.alvo: frames.get(self.alvo)}
+                nomes = None
+            else:
+                nomes = {t.ident: t.name for t in threads_ativas()}
+            for ident, frame in frames.items():
+                if ident == propria:
+                    continue
+                pilha = []
+                while frame is not None:
+                    pilha.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_qualname}")
+                    frame = frame.f_back
+                if pilha and nomes is not None:
+                    pilha.append(f"thread:{nomes.get(ident, ident)}")
+                if pilha:
+                    self.pilhas[";".join(reversed(pilha))] += 1
+
+    def iniciar(self):
+        self._thread.start()
+
+    def parar(self):
+        """Espera a amostra em curso terminar (até um ``intervalo``)."""
+        self._parar.set()
+        self._thread.join()
+
+    def __enter__(self):
+        self.iniciar()
+        return self
+
+    def __exit__(self, *exc):
+        self.parar()
+
+    def gravar(self, caminho):
+        caminho.write_text("".join(f"{pilha} {n}\n" for pilha, n in self.pilhas.most_common()))
+
+
+def _modo(valor):
+    if not valor or valor == "0":
+        return None
+    return AMOSTRAGEM if valor == AMOSTRAGEM else "cprofile"
+
+
+def _valor(request):
+    return request.headers.get(CABECALHO) or request.GET.get(PARAMETRO)
+
+
+def _staff(user) -> bool:
+    return bool(user and user.is_authenticated and user.is_staff)
+
+
+def pedido(request):
+    """Modo pedido na requisição (``"cprofile"``/``"amostragem"``) ou None."""
+    modo = _modo(_valor(request))
+    return modo if modo and _staff(getattr(request, "user", None)) else None
+
+
+async def apedido(request):
+    modo = _modo(_valor(request))
+    return modo if modo and _staff(await request.auser()) else None
+
+
+def _loja(request) -> str:
+    loja = (
+        request.GET.get("loja_filtro") or request.GET.get("loja")
+        or request.session.get("loja_filtro") or request.session.get("shop_slug")
+    )
+    return slugify(str(loja)) if loja else "sem-loja"
+
+
+def nome_arquivo(request, extensao) -> str:
+    match = getattr(request, "resolver_match", None)
+    view = match.view_name.replace(":", ".") if match else "nao_resolvida"
+    agora = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    return f"{view}__{_loja(request)}__{agora}.{extensao}"
+
+
+class PerfilMiddleware:
+    """Deve vir depois do ``AuthenticationMiddleware`` (precisa de ``request.user``)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PERFIL_DIR", None):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    async def __acall__(self, request):
+        if await apedido(request) is None:
+            return await self.get_response(request)
+        if not _em_uso.acquire(blocking=False):
+            response = await self.get_response(request)
+            response[CABECALHO] = "ocupado"
+            return response
+        try:
+            pasta = await sync_to_async(self._pasta)()
+            intervalo = getattr(settings, "PERFIL_INTERVALO", INTERVALO)
+            amostrador = Amostrador(None, intervalo)
+            amostrador.iniciar()
+            try:
+                response = await self.get_response(request)
+            finally:
+                # o join pode levar um intervalo inteiro: não trava o loop
+                await sync_to_async(amostrador.parar)()
+            # a sessão pode ainda não ter sido lida: nome e gravação fora do loop
+            nome = await sync_to_async(nome_arquivo)(request, "collapsed")
+            await sync_to_async(amostrador.gravar)(pasta / nome)
+        finally:
+            _em_uso.release()
+        response[CABECALHO] = nome
+        return response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        modo = pedido(request)
+        if modo is None:
+            return self.get_response(request)
+        if not _em_uso.acquire(blocking=False):
+            response = self.get_response(request)
+            response[CABECALHO] = "ocupado"
+            return response
+        try:
+            response, nome = self._perfilar(request, modo)
+        finally:
+            _em_uso.release()
+        response[CABECALHO] = nome
+        return response
+
+    @staticmethod
+    def _pasta():
+        pasta = Path(settings.PERFIL_DIR)
+        pasta.mkdir(parents=True, exist_ok=True)
+        return pasta
+
+    def _perfilar(self, request, modo):
+        pasta = self._pasta()
+        if modo == AMOSTRAGEM:
+            with Amostrador(get_ident(), getattr(settings, "PERFIL_INTERVALO", INTERVALO)) as amostrador:
+                response = self.get_response(request)
+            nome = nome_arquivo(request, "collapsed")
+            amostrador.gravar(pasta / nome)
+        else:
+            perfil = cProfile.Profile()
+            response = perfil.runcall(self.get_response, request)
+            nome = nome_arquivo(request, "prof")
+            perfil.dump_stats(pasta / nome)
+        return response, nome
@@ -0,0 +1,105 @@
+"""
+Alocação de slugs únicos (``base``, ``base-2``, ``base-3``...).
+
+``reservar`` descobre com uma consulta (prefixo + sufixo numérico) os slugs
+já usados para uma ou várias bases e devolve os próximos livres, o que serve
+tanto ao ``save()`` dos modelos quanto a importações em massa.
+``salvar_com_slug`` (e ``salvar_com_slugs``, para gravações em lote) repete
+a alocação se outro processo gravar o mesmo slug entre a consulta e o INSERT
+(``IntegrityError`` da restrição de unicidade).
+"""
+import re
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+TENTATIVAS = 3
+SUFIXO_RESERVA = 4  # dígitos garantidos para o sufixo quando a base é cortada
+
+
+def _ajustar(base, separador, max_length):
+    if max_length and len(base) + len(separador) + SUFIXO_RESERVA > max_length:
+        base = base[:max_length - len(separador) - SUFIXO_RESERVA].rstrip(separador or None)
+    return base
+
+
+def _usos(valor, separador, bases):
+    """``(base, n)`` para cada base que ``valor`` ocupa (a própria base conta como 1)."""
+    if valor in bases:
+        yield valor, 1
+    for k in range(1, len(valor)):
+        resto = valor[k:]
+        if resto.startswith(separador) and resto[len(separador):].isdigit() and valor[:k] in bases:
+            yield valor[:k], int(resto[len(separador):])
+
+
+def reservar(escopo, campo, bases, separador='-', max_length=None):
+    """
+    Um slug livre para cada item de ``bases`` (repetições ganham sufixos
+    diferentes), consultando ``escopo`` (queryset) uma única vez.
+    """
+    bases = [_ajustar(b, separador, max_length) for b in bases]
+    unicas = list(dict.fromkeys(bases))
+    if not unicas:
+        return []
+    padrao = '^(%s)(%s[0-9]+)?$' % ('|'.join(map(re.escape, unicas)), re.escape(separador))
+    prefixos = Q()
+    for b in unicas:
+        prefixos |= Q(**{f'{campo}__startswith': b})
+    usados = set(escopo.filter(prefixos, **{f'{campo}__regex': padrao}).values_list(campo, flat=True))
+
+    maior = dict.fromkeys(unicas, 0)
+    for valor in usados:
+        for base, n in _usos(valor, separador, maior):
+            maior[base] = max(maior[base], n)
+
+    slugs = []
+    for base in bases:
+        n = maior[base]
+        slug = base if n == 0 else f'{base}{separador}{max(n + 1, 2)}'
+        while slug in usados:
+            n += 1
+            slug = f'{base}{separador}{max(n + 1, 2)}'
+        maior[base] = max(n + 1, 1)
+        usados.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def proximo_livre(escopo, campo, base, separador='-', max_length=None):
+    return reservar(escopo, campo, [base], separador, max_length)[0]
+
+
+def salvar_com_slug(obj, campo, base, escopo, salvar, separador='-', tentativas=TENTATIVAS):
+    """
+    Preenche ``obj.<campo>`` com o próximo slug livre em ``escopo`` e chama
+    ``salvar()``; se o INSERT esbarrar na unicidade, aloca de novo.
+    """
+    max_length = obj._meta.get_field(campo).max_length
+    for tentativa in range(tentativas):
+        setattr(obj, campo, proximo_livre(escopo, campo, base, separador, max_length))
+        try:
+            with transaction.atomic():
+                return salvar()
+        except IntegrityError:
+            if tentativa == tentativas - 1:
+                raise
+
+
+def salvar_com_slugs(objs, campo, bases, escopo, salvar, separador='-', tentativas=TENTATIVAS):
+    """
+    Como ``salvar_com_slug`` para vários objetos novos gravados de uma vez
+    (``bulk_create`` em ``salvar()``): ``objs[i]`` recebe o slug de ``bases[i]``.
+    """
+    max_length = objs[0]._meta.get_field(campo).max_length
+    for tentativa in range(tentativas):
+        for obj, slug in zip(objs, reservar(escopo, campo, bases, separador, max_length)):
+            setattr(obj, campo, slug)
+        try:
+            with transaction.atomic():
+                return salvar()
+        except IntegrityError:
+            if tentativa == tentativas - 1:
+                raise
+            for obj in objs:
+                obj.pk, obj._state.adding = None, True
@@ -1,8 +1,28 @@
-from django.test import TestCase
+import csv
+import pstats
+import tempfile
+from datetime import date, time, timedelta
+from pathlib import Path
+from threading import Thread, get_ident
+from time import sleep
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 
-from apps.cadastro.models import Loja
+from apps.appointments import arquivo
+from apps.appointments.eventos import eventos_desde
+from apps.appointments.models import Agendamento
+from apps.cadastro.models import Cliente, Loja, Funcionario, FuncionarioAgendaSemanal, Servico
+from . import cronometro, metricas, perfil, slugs
+from .dashboard import dados_painel, escolher_granularidade, painel_faturamento_dia
+from .models import Subscription
 from .utils import get_shop_slug_from_host
 
 
@@ -33,3 +53,838 @@ class SubdomainTests(TestCase):
     def test_home_serves_client_start(self):
         response = self.client.get('/', HTTP_HOST="loja1.client.testserver")
         self.assertContains(response, "Identifique-se")
+
+
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        User = get_user_model()
+        self.owner = User.objects.create_user(
+            email="dono@example.com", username="dono", password="123", is_owner=True
+        )
+        self.cliente = User.objects.create_user(
+            email="cli@example.com", username="cli", password="123", is_client=True
+        )
+        self.loja = Loja.objects.create(owner=self.owner, nome="Loja Dash")
+        self.func = Funcionario.objects.create(loja=self.loja, nome="Ana")
+        self.ontem = timezone.localdate() - timedelta(days=1)
+        self.ag = Agendamento.objects.create(
+            cliente=self.cliente, loja=self.loja, funcionario=self.func,
+            data=self.ontem, hora=time(9, 0), confirmado=True, valor_final=50,
+        )
+
+    def test_dia_fechado_vem_do_cache(self):
+        dados = painel_faturamento_dia([self.loja], self.ontem, self.ontem)
+        self.assertEqual(dados["fat_dia_series"][0]["data"], [50.0])
+
+        # update() não dispara sinais: o dia fechado continua vindo do cache
+        Agendamento.objects.filter(pk=self.ag.pk).update(valor_final=80)
+        with self.assertNumQueries(0):
+            dados = painel_faturamento_dia([self.loja], self.ontem, self.ontem)
+        self.assertEqual(dados["fat_dia_series"][0]["data"], [50.0])
+
+    def test_edicao_de_agendamento_passado_invalida_o_dia(self):
+        dados_painel("faturamento-dia", [self.loja], self.ontem, self.ontem)
+        self.ag.valor_final = 80
+        self.ag.save()
+        dados = dados_painel("faturamento-dia", [self.loja], self.ontem, self.ontem)
+        self.assertEqual(dados["fat_dia_series"][0]["data"], [80.0])
+        dados = dados_painel("ticket-medio", [self.loja], self.ontem, self.ontem)
+        self.assertEqual(dados["ticket_medio_values"], [80.0])
+
+    def test_intervalo_longo_agrupa_por_mes(self):
+        inicio = self.ontem - timedelta(days=800)
+        self.assertEqual(escolher_granularidade(inicio, self.ontem), "month")
+        semanal = painel_faturamento_dia([self.loja], self.ontem - timedelta(days=90), self.ontem)
+        self.assertEqual(semanal["granularidade"], "week")
+        self.assertEqual(sum(semanal["fat_dia_series"][0]["data"]), 50.0)
+
+        dados = painel_faturamento_dia([self.loja], inicio, self.ontem)
+        self.assertEqual(dados["granularidade"], "month")
+        self.assertLessEqual(len(dados["dia_labels"]), 28)
+        self.assertEqual(dados["dia_labels"][-1], self.ontem.strftime("%m/%Y"))
+        self.assertEqual(sum(dados["fat_dia_series"][0]["data"]), 50.0)
+        self.assertEqual(dados["fat_dia_series"][0]["data"][-1], 50.0)
+
+    def test_totais_somam_o_arquivo(self):
+        corte = Servico.objects.create(loja=self.loja, nome="Corte", preco=50)
+        self.ag.servicos.set([corte])
+        self.assertEqual(arquivo.arquivar(dias=0), 1)
+        cache.clear()
+        dados = painel_faturamento_dia([self.loja], self.ontem, self.ontem)
+        self.assertEqual(dados["fat_dia_series"][0]["data"], [50.0])
+        dados = dados_painel("servicos", [self.loja], self.ontem, self.ontem)
+        self.assertIn("Corte", dados["servicos_por_loja"][0]["labels"])
+
+    def test_painel_servido_por_fragmento(self):
+        Subscription.objects.create(
+            owner=self.owner, end_date=timezone.now() + timedelta(days=7)
+        )
+        self.client.force_login(self.owner)
+        url = reverse("accounts:owner_dashboard_painel", args=["ticket-medio"])
+        response = self.client.get(url, {"start": self.ontem.isoformat(), "end": self.ontem.isoformat()})
+        self.assertContains(response, "chart_ticket_medio")
+        self.assertEqual(
+            self.client.get(reverse("accounts:owner_dashboard_painel", args=["inexistente"])).status_code,
+            404,
+        )
+
+        # segunda leitura do mesmo painel sai inteira do cache do painel
+        dados_painel("no-show", [self.loja], self.ontem, self.ontem)
+        with self.assertNumQueries(0):
+            dados_painel("no-show", [self.loja], self.ontem, self.ontem)
+
+
+class HistoricoExportTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.owner = User.objects.create_user(
+            email="dono@example.com", username="dono", password="123", is_owner=True
+        )
+        Subscription.objects.create(owner=self.owner, end_date=timezone.now() + timedelta(days=7))
+        cliente = User.objects.create_user(
+            email="cli@example.com", username="cli", password="123",
+            is_client=True, full_name="Maria Souza",
+        )
+        loja = Loja.objects.create(owner=self.owner, nome="Loja CSV")
+        func = Funcionario.objects.create(loja=loja, nome="Ana")
+        corte = Servico.objects.create(loja=loja, nome="Corte", preco=30)
+        barba = Servico.objects.create(loja=loja, nome="Barba", preco=20)
+        hoje = timezone.localdate()
+        ag = Agendamento.objects.create(
+            cliente=cliente, loja=loja, funcionario=func, data=hoje, hora=time(9, 0),
+            confirmado=True, valor_final=50,
+        )
+        ag.servicos.set([corte, barba])
+        Agendamento.objects.create(
+            cliente=cliente, loja=loja, funcionario=func,
+            data=hoje - timedelta(days=40), hora=time(10, 0),
+        )
+        self.client.force_login(self.owner)
+
+    def test_exporta_csv_com_filtros_e_servicos(self):
+        inicio = (timezone.localdate() - timedelta(days=7)).isoformat()
+        response = self.client.get(reverse("accounts:owner_historico_exportar"), {"inicio": inicio})
+        self.assertTrue(response.streaming)
+        linhas = b"".join(response.streaming_content).decode("utf-8-sig").splitlines()
+        self.assertEqual(len(linhas), 2)  # cabeçalho + 1 agendamento no intervalo
+        self.assertIn("Maria Souza", linhas[1])
+        self.assertIn("Barba, Corte", linhas[1])
+        self.assertIn("50,00", linhas[1])
+
+    def test_celulas_que_parecem_formula_sao_neutralizadas(self):
+        ag = Agendamento.objects.get(data=timezone.localdate())
+        ag.observacao = '=HYPERLINK("http://x")'
+        ag.save()
+        ag.cliente.full_name = "@Maria"
+        ag.cliente.save()
+        response = self.client.get(reverse("accounts:owner_historico_exportar"))
+        linhas = b"".join(response.streaming_content).decode("utf-8-sig").splitlines()
+        celulas = next(csv.reader([linhas[1]], delimiter=";"))
+        self.assertEqual(celulas[3], "'@Maria")
+        self.assertEqual(celulas[-1], """'=HYPERLINK("http://x")""")
+
+    def test_historico_le_tambem_o_arquivo(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        Agendamento.objects.filter(data=timezone.localdate()).update(
+            data=timezone.localdate() - timedelta(days=400)
+        )
+        self.assertEqual(arquivo.arquivar(), 1)
+
+        response = self.client.get(reverse("accounts:owner_historico"))
+        self.assertEqual(len(response.context["agendamentos"]), 2)
+        self.assertEqual(response.context["total_aproximado"], 2)
+        response = self.client.get(reverse("accounts:owner_historico_exportar"))
+        linhas = b"".join(response.streaming_content).decode("utf-8-sig").splitlines()
+        self.assertEqual(len(linhas), 3)
+        self.assertIn("Barba, Corte", linhas[2])  # o arquivado é o mais antigo
+
+    def test_busca_por_servico_na_tela_e_na_exportacao(self):
+        response = self.client.get(reverse("accounts:owner_historico"), {"q": "barb"})
+        self.assertEqual(len(response.context["agendamentos"]), 1)
+        response = self.client.get(reverse("accounts:owner_historico_exportar"), {"q": "barb"})
+        linhas = b"".join(response.streaming_content).decode("utf-8-sig").splitlines()
+        self.assertEqual(len(linhas), 2)
+
+
+
+class HistoricoPaginacaoTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.owner = User.objects.create_user(
+            email="pag@example.com", username="pag", password="123", is_owner=True
+        )
+        Subscription.objects.create(owner=self.owner, end_date=timezone.now() + timedelta(days=7))
+        loja = Loja.objects.create(owner=self.owner, nome="Loja Pag")
+        func = Funcionario.objects.create(loja=loja, nome="Ana")
+        dia = date(2024, 3, 1)
+        # vários agendamentos no mesmo horário: o id desempata o cursor
+        Agendamento.objects.bulk_create([
+            Agendamento(cliente=self.owner, loja=loja, funcionario=func,
+                        data=dia - timedelta(days=i // 3), hora=time(9 + i % 2, 0))
+            for i in range(45)
+        ])
+        self.client.force_login(self.owner)
+        self.url = reverse("accounts:owner_historico")
+
+    def test_carregar_mais_percorre_tudo_sem_repetir(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.context["total_aproximado"], 45)
+        vistos = [a.id for a in response.context["agendamentos"]]
+        cursor = response.context["proximo_cursor"]
+        while cursor:
+            response = self.client.get(self.url, {"cursor": cursor}, HTTP_HX_REQUEST="true")
+            self.assertTemplateUsed(response, "accounts/partials/owner_historico_linhas.html")
+            self.assertNotIn("total_aproximado", response.context)
+            vistos += [a.id for a in response.context["agendamentos"]]
+            cursor = response.context["proximo_cursor"]
+
+        esperado = list(
+            Agendamento.objects.order_by("-data", "-hora", "-id").values_list("id", flat=True)
+        )
+        self.assertEqual(vistos, esperado)
+
+    def test_total_aproximado_limitado(self):
+        with mock.patch("apps.accounts.views.HISTORICO_TOTAL_LIMITE", 30):
+            response = self.client.get(self.url)
+        self.assertContains(response, "Mais de 30 atendimentos")
+        self.assertContains(response, "Carregar mais")
+
+class AgendaAoVivoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.owner = User.objects.create_user(
+            email="vivo@example.com", username="vivo", password="123", is_owner=True
+        )
+        Subscription.objects.create(owner=self.owner, end_date=timezone.now() + timedelta(days=7))
+        self.loja = Loja.objects.create(owner=self.owner, nome="Loja Ao Vivo")
+        self.func = Funcionario.objects.create(loja=self.loja, nome="Ana")
+
+    def _agendar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Agendamento.objects.create(
+                cliente=self.owner, loja=self.loja, funcionario=self.func,
+                data=timezone.localdate(), hora=time(9, 30),
+            )
+
+    def test_resumo_da_home_marca_o_dia_dos_eventos(self):
+        # o script só recarrega os cartões para eventos de hoje (comparando com data-hoje)
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse("accounts:owner_home"))
+        self.assertContains(response, f'data-hoje="{timezone.localdate().isoformat()}"')
+        self.assertEqual(eventos_desde(self.loja.id, 0)[0], [])
+        ag = self._agendar()
+        (_, evento), = eventos_desde(self.loja.id, 0)[0]
+        self.assertEqual(evento["data"], ag.data.isoformat())
+
+    def test_publica_somente_transicoes(self):
+        ag = self._agendar()
+        ag = Agendamento.objects.get(pk=ag.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            ag.observacao = "sem mudança de estado"
+            ag.save()
+            ag.confirmado = True
+            ag.save()
+
+        eventos, cursor = eventos_desde(self.loja.id, 0)
+        self.assertEqual([e["tipo"] for _, e in eventos], ["criado", "finalizado"])
+        self.assertEqual(eventos[0][1]["hora"], "09:30")
+        self.assertEqual(eventos_desde(self.loja.id, cursor), ([], cursor))
+
+    def test_item_somente_para_pendentes(self):
+        ag = self._agendar()
+        self.client.force_login(self.owner)
+        url = reverse("accounts:owner_agendamento_item", args=[ag.pk])
+        self.assertContains(self.client.get(url, {"view": "day"}), f'data-agendamento="{ag.pk}"')
+        Agendamento.objects.filter(pk=ag.pk).update(no_show=True)
+        self.assertEqual(self.client.get(url).status_code, 204)
+
+    async def test_fluxo_sse_retoma_pelo_last_event_id(self):
+        ag = await sync_to_async(self._agendar)()
+        await self.async_client.aforce_login(self.owner)
+        response = await self.async_client.get(
+            reverse("accounts:owner_agendamentos_eventos"), {"loja": self.loja.id},
+            headers={"Last-Event-ID": "0"},
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        fluxo = aiter(response.streaming_content)
+        self.assertTrue((await anext(fluxo)).startswith(b"retry:"))
+        evento = (await anext(fluxo)).decode()
+        self.assertIn("event: agendamento", evento)
+        self.assertIn(f'"id":{ag.pk}', evento)
+        await fluxo.aclose()
+
+        outra = await Loja.objects.acreate(owner=await get_user_model().objects.acreate(
+            email="outro@example.com", username="outro", is_owner=True
+        ), nome="Outra")
+        response = await self.async_client.get(
+            reverse("accounts:owner_agendamentos_eventos"), {"loja": outra.id}
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class CalendarioDonoTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.owner = User.objects.create_user(
+            email="compacto@example.com", username="compacto", password="123", is_owner=True
+        )
+        Subscription.objects.create(owner=self.owner, end_date=timezone.now() + timedelta(days=7))
+        self.loja = Loja.objects.create(owner=self.owner, nome="Loja Cheia")
+        ana = Funcionario.objects.create(loja=self.loja, nome="Ana", cor_hex="#ff0000")
+        bia = Funcionario.objects.create(loja=self.loja, nome="Bia", cor_hex="#00ff00")
+        for func, hora in ((ana, 9), (ana, 10), (bia, 9)):
+            Agendamento.objects.create(
+                cliente=self.owner, loja=self.loja, funcionario=func,
+                data=date(2024, 5, 15), hora=time(hora, 0),
+            )
+        self.client.force_login(self.owner)
+        self.url = reverse("accounts:owner_home_agendamentos")
+        self.params = {"view": "month", "y": 2024, "m": 5, "loja_filtro": self.loja.id}
+
+    def test_mes_compacto_usa_somente_contagens(self):
+        response = self.client.get(self.url, {**self.params, "compacto": "1"})
+        self.assertTrue(response.context["compacto"])
+        self.assertEqual(response.context["total_pendentes"], 3)
+        self.assertNotContains(response, "data-agendamento=")
+        self.assertContains(response, 'data-func="', count=2)
+        self.assertContains(response, "view=day&d=2024-05-15")
+
+    def test_compacto_automatico_acima_do_limite(self):
+        with mock.patch("apps.accounts.views.COMPACTO_LIMITE", 2):
+            self.assertTrue(self.client.get(self.url, self.params).context["compacto"])
+        # a escolha explícita do dono prevalece (e fica na sessão)
+        self.client.get(self.url, {**self.params, "compacto": "0"})
+        with mock.patch("apps.accounts.views.COMPACTO_LIMITE", 2):
+            self.assertFalse(self.client.get(self.url, self.params).context["compacto"])
+
+    def test_celula_do_dia(self):
+        response = self.client.get(reverse("accounts:owner_agendamentos_dia"), {
+            "loja_filtro": self.loja.id, "d": "2024-05-15", "compacto": "1",
+        })
+        self.assertContains(response, 'id="ag-dia-2024-05-15"')
+        self.assertContains(response, '<span class="n">2</span>')
+
+    def test_visao_semanal(self):
+        response = self.client.get(self.url, {"view": "week", "d": "2024-05-16", "loja_filtro": self.loja.id})
+        self.assertEqual(response.context["week_start"], date(2024, 5, 13))
+        self.assertContains(response, 'id="ag-semana-2024-05-15"')
+        self.assertContains(response, 'class="tl-box ', count=3)
+
+    def _segunda_loja(self):
+        outra = Loja.objects.create(owner=self.owner, nome="Loja Centro")
+        caio = Funcionario.objects.create(loja=outra, nome="Caio")
+        Agendamento.objects.create(
+            cliente=self.owner, loja=outra, funcionario=caio,
+            data=date(2024, 5, 15), hora=time(8, 30),
+        )
+        return outra
+
+    def test_todas_as_lojas_no_mes(self):
+        self._segunda_loja()
+        params = {**self.params, "loja_filtro": "todas"}
+        response = self.client.get(self.url, params)
+        self.assertTrue(response.context["todas"])
+        self.assertEqual(response.context["total_pendentes"], 4)
+        self.assertContains(response, "Loja Centro</span>", count=1)
+        self.assertEqual(self.client.session["loja_filtro"], "todas")
+        # contagens por loja no modo compacto, da mesma consulta agrupada
+        response = self.client.get(self.url, {**params, "compacto": "1"})
+        self.assertContains(response, 'data-loja-id="', count=2)
+        self.assertContains(response, "loja_filtro=todas")
+
+    def test_todas_as_lojas_no_dia_ordena_por_hora(self):
+        self._segunda_loja()
+        response = self.client.get(self.url, {"view": "day", "d": "2024-05-15", "loja_filtro": "todas"})
+        horas = [a.hora for a in response.context["day_items"]]
+        self.assertEqual(horas, sorted(horas))
+        self.assertEqual(response.context["day_items"][0].loja.nome, "Loja Centro")
+
+
+class SeletorClienteTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.owner = User.objects.create_user(
+            email="sel@example.com", username="sel", password="123", is_owner=True
+        )
+        Subscription.objects.create(owner=self.owner, end_date=timezone.now() + timedelta(days=7))
+        outro = User.objects.create_user(
+            email="outro@example.com", username="outro", password="123", is_owner=True
+        )
+        self.clientes = {}
+        for nome, phone, dono in (
+            ("José Araújo", "+5585999990000", self.owner),
+            ("Joana Lima", "+5585988887777", self.owner),
+            ("Maria Souza", "+5585977776666", self.owner),
+            ("Jonas Alheio", "+5585966665555", outro),
+        ):
+            user = User.objects.create_user(
+                email=f"{phone}@example.com", username=phone, password="123",
+                is_client=True, full_name=nome, phone=phone,
+            )
+            Cliente.objects.create(owner=dono, user=user)
+            self.clientes[nome] = user
+        self.client.force_login(self.owner)
+        self.url = reverse("accounts:owner_buscar_clientes")
+
+    def _nomes(self, q):
+        response = self.client.get(self.url, {"q": q})
+        return [c["user__full_name"] for c in response.context["clientes"]]
+
+    def test_prefixo_de_nome_e_telefone(self):
+        self.assertEqual(self._nomes("jo"), ["Joana Lima", "José Araújo"])
+        self.assertEqual(self._nomes("JOSE ar"), ["José Araújo"])
+        self.assertEqual(self._nomes("(85) 9888"), ["Joana Lima"])
+        self.assertEqual(self._nomes("55859777"), ["Maria Souza"])
+        self.assertEqual(self._nomes("xyz"), [])
+
+    def test_renomear_cliente_atualiza_a_busca(self):
+        maria = self.clientes["Maria Souza"]
+        maria.full_name = "Mariana Souza"
+        maria.save()
+        self.assertEqual(self._nomes("mariana"), ["Mariana Souza"])
+
+    def test_sem_termo_mostra_recentes_e_modal_nao_lista_clientes(self):
+        loja = Loja.objects.create(owner=self.owner, nome="Loja Sel")
+        func = Funcionario.objects.create(loja=loja, nome="Ana")
+        for nome in ("Maria Souza", "José Araújo", "Maria Souza"):
+            Agendamento.objects.create(
+                cliente=self.clientes[nome], loja=loja, funcionario=func,
+                data=date(2024, 5, 1), hora=time(9, 0),
+            )
+        self.assertEqual(self._nomes(""), ["Maria Souza", "José Araújo"])
+
+        response = self.client.get(reverse("accounts:owner_criar_atendimento"))
+        self.assertContains(response, 'id="cliente-busca"')
+        self.assertNotContains(response, "Joana Lima")
+
+
+class SlugsTests(TestCase):
+    def setUp(self):
+        self.owner = get_user_model().objects.create_user(
+            email="slugs@example.com", username="slugs", password="123", is_owner=True, nome="Joao", sobrenome="Silva"
+        )
+
+    def test_proximo_livre_em_uma_consulta(self):
+        for nome in ("Barbearia", "Barbearia", "Barbearia Centro", "Barbearia"):
+            Loja.objects.create(owner=self.owner, nome=nome)
+        Loja.objects.filter(slug="barbearia-2").update(slug="barbearia-9")
+        with self.assertNumQueries(1):
+            slug = slugs.proximo_livre(Loja.objects.all(), "slug", "barbearia")
+        self.assertEqual(slug, "barbearia-10")
+        self.assertEqual(
+            sorted(Loja.objects.values_list("slug", flat=True)),
+            ["barbearia", "barbearia-3", "barbearia-9", "barbearia-centro"],
+        )
+
+    def test_reserva_em_lote_e_grupo_sem_separador(self):
+        loja = Loja.objects.create(owner=self.owner, nome="Loja")
+        Servico.objects.create(loja=loja, nome="Corte", preco=10)
+        Servico.objects.create(loja=loja, nome="Corte 2", preco=10)  # slug corte-2, base diferente
+        with self.assertNumQueries(1):
+            reservados = slugs.reservar(loja.servicos.all(), "slug", ["corte", "barba", "corte", "corte-2"])
+        self.assertEqual(reservados, ["corte-3", "barba", "corte-4", "corte-2-2"])
+
+        self.assertEqual(self.owner.grupo, "joaosi")
+        outro = get_user_model().objects.create_user(
+            email="slugs2@example.com", username="slugs2", password="123", is_owner=True, nome="Joao", sobrenome="Silva"
+        )
+        self.assertEqual(outro.grupo, "joaosi2")
+
+    def test_repete_quando_outro_processo_grava_o_mesmo_slug(self):
+        Loja.objects.create(owner=self.owner, nome="Dup")
+        # simula a corrida: a primeira alocação ainda não via o slug "dup"
+        with mock.patch.object(slugs, "reservar", side_effect=[["dup"], ["dup-2"]]):
+            loja = Loja.objects.create(owner=self.owner, nome="Dup")
+        self.assertEqual(loja.slug, "dup-2")
+
+
+class OrcamentoConsultasTests(TestCase):
+    """
+    Cada tela do dono e do cliente tem um teto de consultas que não depende
+    do tamanho da loja: a mesma tela é medida com o tenant em várias escalas
+    e o número de consultas tem de ser igual em todas e caber no orçamento.
+    """
+
+    ESCALAS = (1, 3, 6)
+    # consultas por requisição (sessão, usuário e assinatura incluídos)
+    ORCAMENTO = {
+        "dashboard": 4,
+        "painel-no-show": 6,
+        "painel-ticket-medio": 6,
+        "painel-faturamento-funcionario": 6,
+        "painel-faturamento-dia": 6,
+        "painel-agendamentos-dia": 6,
+        "painel-servicos": 7,
+        "painel-ocupacao": 9,
+        "home": 6,
+        "historico": 7,
+        "calendario-mes": 10,
+        "calendario-compacto": 8,
+        "calendario-semana": 11,
+        "calendario-dia": 9,
+        "calendario-todas": 9,
+        "dia-celula": 8,
+        "dia-semana": 12,
+        "criar-atendimento": 4,
+        "buscar-clientes": 4,
+        "slots": 9,
+        "lojas": 5,
+        "funcionarios": 7,
+        "servicos": 11,
+        "clientes": 5,
+        "cliente-dashboard": 6,
+        "agendar": 2,
+        "agendar-profissionais": 4,
+        "agendar-servicos": 7,
+        "agendar-servicos-escolha": 12,
+        "agendar-datahora": 9,
+        "agendar-reserva": 22,
+        "agendar-confirmacao": 5,
+    }
+
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.owner = User.objects.create_user(
+            email="dono@x.com", username="dono", password="x", is_owner=True
+        )
+        Subscription.objects.create(owner=self.owner, end_date=timezone.now() + timedelta(days=30))
+        self.lojas = [
+            Loja.objects.create(owner=self.owner, nome="Centro"),
+            Loja.objects.create(owner=self.owner, nome="Bairro"),
+        ]
+        self.hoje = timezone.localdate()
+        self.n = 0
+
+    def crescer(self, escala):
+        """Leva o tenant até ``escala`` unidades (profissional, serviços, cliente, agenda)."""
+        User = get_user_model()
+        while self.n < escala:
+            self.n += 1
+            n = self.n
+            for loja in self.lojas:
+                func = Funcionario.objects.create(loja=loja, nome=f"Prof {loja.id}-{n}")
+                FuncionarioAgendaSemanal.objects.bulk_create(
+                    FuncionarioAgendaSemanal(funcionario=func, weekday=wd, inicio=time(8), fim=time(18))
+                    for wd in range(7)
+                )
+                servicos = [
+                    Servico.objects.create(loja=loja, nome=f"Corte {loja.id}-{n}", preco=30, duracao_minutos=30),
+                    Servico.objects.create(loja=loja, nome=f"Barba {loja.id}-{n}", preco=20, duracao_minutos=15),
+                ]
+                func.servicos.add(*servicos)
+                cliente = User.objects.create_user(
+                    email=f"cli{loja.id}-{n}@x.com", username=f"cli{loja.id}-{n}", password="x",
+                    is_client=True, full_name=f"Cliente {n}", phone=f"+55859{loja.id:02d}{n:05d}",
+                )
+                Cliente.objects.create(owner=self.owner, user=cliente)
+                for d in range(-3, 4):
+                    for h in (9, 10):
+                        ag = Agendamento.objects.create(
+                            cliente=cliente, loja=loja, funcionario=func,
+                            data=self.hoje + timedelta(days=d), hora=time(h),
+                            confirmado=d < 0 and h == 9, no_show=d < 0 and h == 10,
+                        )
+                        ag.servicos.add(*servicos)
+        loja = self.lojas[0]
+        self.func = loja.funcionarios.order_by("-id").first()
+        self.servico = self.func.servicos.order_by("id").first()
+        self.cliente = Agendamento.objects.filter(funcionario=self.func).first().cliente
+
+    def medir(self, url, metodo="get", **kwargs):
+        cache.clear()  # mede sempre a frio: limite do arquivo, dashboard, etc.
+        with CaptureQueriesContext(connection) as consultas:
+            resp = getattr(self.client, metodo)(url, **kwargs)
+        self.assertIn(resp.status_code, (200, 204), url)
+        return len(consultas)
+
+    def telas_do_dono(self):
+        hoje = self.hoje.isoformat()
+        agenda = reverse("accounts:owner_home_agendamentos")
+        dia = reverse("accounts:owner_agendamentos_dia")
+        telas = {
+            "dashboard": reverse("accounts:owner_dashboard"),
+            "home": reverse("accounts:owner_home"),
+            "historico": reverse("accounts:owner_historico"),
+            "calendario-mes": agenda,
+            "calendario-compacto": agenda + "?compacto=1",
+            "calendario-semana": agenda + "?view=week",
+            "calendario-dia": agenda + "?view=day",
+            "calendario-todas": agenda + "?loja_filtro=todas",
+            "dia-celula": dia + f"?d={hoje}&compacto=1&loja_filtro={self.lojas[0].id}",
+            "dia-semana": dia + f"?d={hoje}&view=week",
+            "criar-atendimento": reverse("accounts:owner_criar_atendimento"),
+            "buscar-clientes": reverse("accounts:owner_buscar_clientes") + "?q=cliente",
+            "slots": reverse("accounts:owner_slots_disponiveis") + f"?funcionario={self.func.id}&data={hoje}",
+            "lojas": reverse("cadastro:owner_shops"),
+            "funcionarios": reverse("cadastro:funcionarios"),
+            "servicos": reverse("cadastro:servicos"),
+            "clientes": reverse("cadastro:clientes"),
+        }
+        for painel in ("no-show", "ticket-medio", "faturamento-funcionario", "faturamento-dia",
+                       "agendamentos-dia", "servicos", "ocupacao"):
+            telas[f"painel-{painel}"] = reverse("accounts:owner_dashboard_painel", args=[painel])
+        return telas
+
+    def medir_cliente(self, escala, medidas):
+        self.client.force_login(self.cliente)
+        sessao = self.client.session
+        sessao["shop_slug"] = self.lojas[0].slug
+        sessao.save()
+        hx = {"HTTP_HX_REQUEST": "true"}
+        servicos = reverse("appointments:agendamento_servicos", args=[self.func.id])
+        datahora = reverse("appointments:agendamento_datahora")
+        passos = [
+            ("cliente-dashboard", reverse("accounts:client_dashboard"), "get", {}),
+            ("agendar", reverse("appointments:agendamento_start"), "get", {}),
+            ("agendar-profissionais", reverse("appointments:agendamento_profissionais"), "get", hx),
+            ("agendar-servicos", servicos, "get", hx),
+            ("agendar-servicos-escolha", servicos, "post", {"data": {"servicos": [self.servico.id]}, **hx}),
+            ("agendar-datahora", datahora, "get", hx),
+            # um dia livre diferente a cada escala
+            ("agendar-reserva", datahora, "post", {
+                "data": {"data": (self.hoje + timedelta(days=10 + escala)).isoformat(), "hora": "08:00"}, **hx,
+            }),
+        ]
+        for nome, url, metodo, kwargs in passos:
+            medidas.setdefault(nome, []).append(self.medir(url, metodo, **kwargs))
+        ag = Agendamento.objects.filter(cliente=self.cliente).latest("id")
+        confirmacao = reverse("appointments:agendamento_confirmacao", args=[ag.id])
+        medidas.setdefault("agendar-confirmacao", []).append(self.medir(confirmacao, **hx))
+
+    def test_consultas_nao_crescem_com_os_dados(self):
+        medidas = {}
+        for escala in self.ESCALAS:
+            self.crescer(escala)
+            self.client.force_login(self.owner)
+            for nome, url in self.telas_do_dono().items():
+                medidas.setdefault(nome, []).append(self.medir(url))
+            self.medir_cliente(escala, medidas)
+
+        self.assertEqual(set(medidas), set(self.ORCAMENTO))
+        for nome, contagens in medidas.items():
+            with self.subTest(tela=nome, contagens=contagens):
+                self.assertEqual(len(set(contagens)), 1, f"{nome} cresce com os dados: {contagens}")
+                self.assertLessEqual(contagens[0], self.ORCAMENTO[nome])
+
+
+@override_settings(SERVER_TIMING=True)
+class ServerTimingTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.owner = User.objects.create_user(
+            email="dono@x.com", username="dono", password="x", is_owner=True
+        )
+        Subscription.objects.create(owner=self.owner, end_date=timezone.now() + timedelta(days=30))
+        loja = Loja.objects.create(owner=self.owner, nome="Centro")
+        self.func = Funcionario.objects.create(loja=loja, nome="Ana")
+        FuncionarioAgendaSemanal.objects.create(
+            funcionario=self.func, weekday=timezone.localdate().weekday(), inicio=time(9), fim=time(10)
+        )
+        self.client.force_login(self.owner)
+        self.url = reverse("accounts:owner_slots_disponiveis") + (
+            f"?funcionario={self.func.id}&data={timezone.localdate().isoformat()}"
+        )
+
+    def metricas(self, response):
+        """``{"sql": (ms, desc), ...}`` a partir do cabeçalho."""
+        metricas = {}
+        for parte in response["Server-Timing"].split(", "):
+            nome, dur, desc = parte.split(";")
+            metricas[nome] = (float(dur.removeprefix("dur=")), desc.removeprefix("desc=").strip('"'))
+        return metricas
+
+    def test_cabecalho_separa_sql_templates_e_slots(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(self.url, headers={"HX-Request": "true"})
+        metricas = self.metricas(response)
+        self.assertEqual(list(metricas), ["sql", "tpl", "slots", "total"])
+        self.assertEqual(metricas["sql"][1], f"SQL ({len(consultas)} consultas)")
+        self.assertGreater(metricas["slots"][0], 0)
+        self.assertGreater(metricas["tpl"][0], 0)
+        self.assertGreaterEqual(metricas["total"][0], metricas["slots"][0])
+
+    def test_aninhado_conta_uma_vez_e_fora_de_requisicao_nao_mede(self):
+        medicao = cronometro.Medicao()
+        token = cronometro._atual.set(medicao)
+        try:
+            with cronometro.medir("slots"), cronometro.medir("slots"):
+                pass
+        finally:
+            cronometro._atual.reset(token)
+        self.assertEqual(medicao.contagens["slots"], 1)
+        with cronometro.medir("slots"):  # sem Medicao ativa: só executa
+            pass
+
+    @override_settings(SERVER_TIMING=False)
+    def test_desligado_pela_configuracao(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Server-Timing", response)
+
+
+@override_settings(METRICAS_TOKEN="segredo")
+class MetricasTests(TestCase):
+    def setUp(self):
+        for familia in metricas.FAMILIAS:
+            familia.limpar()
+        cache.clear()
+        User = get_user_model()
+        self.owner = User.objects.create_user(
+            email="dono@x.com", username="dono", password="x", is_owner=True
+        )
+        Subscription.objects.create(owner=self.owner, end_date=timezone.now() + timedelta(days=30))
+        loja = Loja.objects.create(owner=self.owner, nome="Centro")
+        self.func = Funcionario.objects.create(loja=loja, nome="Ana")
+        FuncionarioAgendaSemanal.objects.create(
+            funcionario=self.func, weekday=timezone.localdate().weekday(), inicio=time(9), fim=time(10)
+        )
+        self.client.force_login(self.owner)
+
+    def linhas(self, **kwargs):
+        response = self.client.get(reverse("metricas"), headers={"Authorization": "Bearer segredo"}, **kwargs)
+        self.assertEqual(response["Content-Type"], metricas.CONTENT_TYPE)
+        return dict(l.rsplit(" ", 1) for l in response.content.decode().splitlines() if not l.startswith("#"))
+
+    def test_latencia_consultas_slots_e_cache_por_view(self):
+        slots = reverse("accounts:owner_slots_disponiveis") + (
+            f"?funcionario={self.func.id}&data={timezone.localdate().isoformat()}"
+        )
+        self.client.get(slots)
+        self.client.get(slots)
+        painel = reverse("accounts:owner_dashboard_painel", args=["faturamento-dia"])
+        self.client.get(painel)
+        self.client.get(painel)
+        linhas = self.linhas()
+
+        view = 'view="accounts:owner_slots_disponiveis"'
+        self.assertEqual(linhas[f'barber_requisicoes_total{{{view},status="200"}}'], "2")
+        self.assertEqual(linhas[f'barber_requisicao_duracao_segundos_bucket{{{view},le="+Inf"}}'], "2")
+        self.assertEqual(linhas[f"barber_requisicao_duracao_segundos_count{{{view}}}"], "2")
+        self.assertEqual(linhas[f"barber_slots_duracao_segundos_count{{{view}}}"], "2")
+        self.assertGreater(int(linhas[f"barber_sql_consultas_total{{{view}}}"]), 0)
+        grupo = 'barber_cache_acessos_total{cache="default",grupo="dashboard:painel",resultado="%s"}'
+        self.assertEqual((linhas[grupo % "miss"], linhas[grupo % "hit"]), ("1", "1"))
+
+    def test_histograma_acumula_e_contador_soma_entre_threads(self):
+        hist = metricas.Histograma("h", "teste", ("v",), buckets=(0.1, 1.0))
+        for valor in (0.05, 0.5, 5):
+            hist.observar(valor, "x")
+        self.assertEqual(list(hist.linhas())[2:], [
+            'h_bucket{v="x",le="0.1"} 1',
+            'h_bucket{v="x",le="1.0"} 2',
+            'h_bucket{v="x",le="+Inf"} 3',
+            'h_sum{v="x"} 5.55',
+            'h_count{v="x"} 3',
+        ])
+
+        contador = metricas.Contador("c", "teste", ("v",))
+        threads = [Thread(target=lambda: [contador.inc("x") for _ in range(1000)]) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(list(contador.linhas())[2:], ['c{v="x"} 8000'])
+
+    def test_token_protege_o_scrape(self):
+        self.client.logout()
+        self.assertEqual(reverse("metricas"), "/metrics")
+        self.assertEqual(self.client.get(reverse("metricas")).status_code, 401)
+        self.linhas()
+
+    def test_token_errado(self):
+        for cabecalho in ({}, {"Authorization": "Bearer outro"}, {"Authorization": "Bearer segrédo"}):
+            self.assertEqual(self.client.get(reverse("metricas"), headers=cabecalho).status_code, 401)
+
+    @override_settings(METRICAS_TOKEN=None)
+    def test_sem_token_so_com_debug(self):
+        self.assertEqual(self.client.get(reverse("metricas")).status_code, 403)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get(reverse("metricas")).status_code, 200)
+
+
+class PerfilTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.owner = User.objects.create_user(
+            email="dono@x.com", username="dono", password="x", is_owner=True
+        )
+        Subscription.objects.create(owner=self.owner, end_date=timezone.now() + timedelta(days=30))
+        self.loja = Loja.objects.create(owner=self.owner, nome="Centro")
+        self.func = Funcionario.objects.create(loja=self.loja, nome="Ana")
+        FuncionarioAgendaSemanal.objects.create(
+            funcionario=self.func, weekday=timezone.localdate().weekday(), inicio=time(9), fim=time(10)
+        )
+        self.client.force_login(self.owner)
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.pasta = Path(pasta.name)
+        ajuste = override_settings(PERFIL_DIR=self.pasta, PERFIL_INTERVALO=0.0005)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        self.url = reverse("accounts:owner_slots_disponiveis") + (
+            f"?funcionario={self.func.id}&data={timezone.localdate().isoformat()}&loja_filtro={self.loja.id}"
+        )
+
+    def test_staff_grava_pstats_com_view_e_loja(self):
+        self.owner.is_staff = True
+        self.owner.save(update_fields=["is_staff"])
+        response = self.client.get(self.url + f"&{perfil.PARAMETRO}=1")
+        self.assertEqual(response.status_code, 200)
+        nome = response[perfil.CABECALHO]
+        self.assertTrue(nome.startswith(f"accounts.owner_slots_disponiveis__{self.loja.id}__"), nome)
+        self.assertTrue(nome.endswith(".prof"))
+        funcoes = {f[2] for f in pstats.Stats(str(self.pasta / nome)).stats}
+        self.assertIn("gerar_slots_disponiveis", funcoes)
+
+    def test_amostragem_grava_pilhas_colapsadas(self):
+        self.owner.is_staff = True
+        self.owner.save(update_fields=["is_staff"])
+        response = self.client.get(self.url, headers={perfil.CABECALHO: perfil.AMOSTRAGEM})
+        nome = response[perfil.CABECALHO]
+        self.assertTrue(nome.endswith(".collapsed"))
+        for linha in (self.pasta / nome).read_text().splitlines():
+            pilha, n = linha.rsplit(" ", 1)
+            self.assertTrue(n.isdigit() and pilha)
+
+    async def test_asgi_amostra_a_view_na_thread_do_executor(self):
+        # sob ASGI a cadeia é assíncrona e a view síncrona roda em outra thread
+        await get_user_model().objects.filter(pk=self.owner.pk).aupdate(is_staff=True)
+        await self.async_client.aforce_login(self.owner)
+        parar, threads = perfil.Amostrador.parar, []
+
+        def parar_registrando(amostrador):
+            threads.append(get_ident())
+            parar(amostrador)
+
+        with mock.patch("apps.accounts.views.gerar_slots_disponiveis", side_effect=lambda *a: sleep(0.05) or []), \
+                mock.patch.object(perfil.Amostrador, "parar", parar_registrando):
+            response = await self.async_client.get(self.url, headers={perfil.CABECALHO: "1"})
+        self.assertEqual(response.status_code, 200)
+        # o join do amostrador não roda na thread do loop
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], get_ident())
+        nome = response[perfil.CABECALHO]
+        self.assertTrue(nome.startswith(f"accounts.owner_slots_disponiveis__{self.loja.id}__"), nome)
+        self.assertTrue(nome.endswith(".collapsed"))
+        pilhas = (self.pasta / nome).read_text()
+        self.assertIn("apps.accounts.views:owner_slots_disponiveis", pilhas)
+        self.assertTrue(all(l.startswith("thread:") for l in pilhas.splitlines()))
+
+    async def test_asgi_sem_staff_nao_perfila(self):
+        await self.async_client.aforce_login(self.owner)
+        response = await self.async_client.get(self.url, headers={perfil.CABECALHO: "1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(perfil.CABECALHO, response)
+        self.assertEqual(list(self.pasta.iterdir()), [])
+
+    def test_sem_staff_nao_perfila(self):
+        response = self.client.get(self.url, headers={perfil.CABECALHO: "1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(perfil.CABECALHO, response)
+        self.assertEqual(list(self.pasta.iterdir()), [])
@@ -10,9 +10,15 @@ urlpatterns = [
     path('logout/', views.owner_logout, name='owner_logout'),
     path('home/', views.owner_home, name='owner_home'),
     path('home/dashboard/', views.owner_dashboard, name='owner_dashboard'),
+    path('home/dashboard/<slug:painel>/', views.owner_dashboard_painel, name='owner_dashboard_painel'),
     path('home/historico/', views.owner_historico, name='owner_historico'),
+    path('home/historico/exportar/', views.owner_historico_exportar, name='owner_historico_exportar'),
     path("home/agendamentos/", views.owner_home_agendamentos, name="owner_home_agendamentos"),
+    path("home/agendamentos/eventos/", views.owner_agendamentos_eventos, name="owner_agendamentos_eventos"),
+    path("home/agendamentos/dia/", views.owner_agendamentos_dia, name="owner_agendamentos_dia"),
+    path("home/agendamentos/<int:pk>/item/", views.owner_agendamento_item, name="owner_agendamento_item"),
     path("home/criar-atendimento/", views.owner_criar_atendimento, name="owner_criar_atendimento"),
+    path("home/criar-atendimento/clientes/", views.owner_buscar_clientes, name="owner_buscar_clientes"),
     path("home/criar-atendimento/add-cliente/", views.owner_add_cliente, name="owner_add_cliente"),
     path("home/criar-atendimento/slots/", views.owner_slots_disponiveis, name="owner_slots_disponiveis"),
     path('home/fields-by-loja/', views.owner_fields_by_loja, name='owner_fields_by_loja'),
@@ -1,28 +1,41 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.utils import timezone
 from django.contrib import messages
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
-from django.http import HttpResponse
-from django.db.models import Q, Sum, Count, Avg
+from django.http import Http404, HttpResponse, QueryDict, StreamingHttpResponse
+from django.db.models import Q, Sum
 from django.views.decorators.http import require_POST
 from django.http import HttpRequest
-from django.core.paginator import Paginator
 
 from .forms import OwnerLoginForm, ClientStartForm, ClientVerifyForm
 from .models import User, ClientOTP, Subscription, Plan
 from apps.cadastro.forms import ClienteForm
-from apps.cadastro.models import Loja, Cliente, Funcionario, Servico
+from apps.cadastro.models import Loja, Cliente, Funcionario, Servico, filtro_busca_cliente
 from apps.accounts.decorators import subscription_required
-from apps.appointments.models import Agendamento
-from apps.appointments.utils import gerar_slots_disponiveis
+from apps.appointments import busca
+from apps.appointments.eventos import fluxo_sse
+from apps.appointments import arquivo
+from apps.appointments.models import Agendamento, AgendamentoArquivado
+from apps.appointments.utils import (
+    COMPACTO_LIMITE, gerar_slots_disponiveis, pendentes_do_dia, resumo_pendentes_por_dia,
+    semana_por_profissional,
+)
 from .utils import get_shop_slug_from_host
+from . import metricas
+from .dashboard import PAINEIS, dados_painel
 
+import csv
+import heapq
+import hmac
 import random
 import json
 from datetime import date, timedelta, time
 from calendar import Calendar
+from itertools import islice
 
 # ========== HELPERS ==========
 
@@ -138,12 +151,8 @@ def owner_home(request):
         return render(request, 'accounts/partials/owner_home.html', ctx)
     return render(request, 'accounts/owner_home.html', ctx)
 
-@login_required
-@subscription_required
-def owner_dashboard(request):
-    if not getattr(request.user, 'is_owner', False):
-        return redirect('accounts:owner_login')
-
+def _dashboard_filtros(request):
+    """Lojas e intervalo do dashboard a partir da querystring (padrão: últimos 30 dias)."""
     lojas_qs = request.user.lojas.order_by('nome')
     loja_ids = request.GET.getlist('lojas')
     if loja_ids:
@@ -156,107 +165,248 @@ def owner_dashboard(request):
     start_str = request.GET.get('start')
     end_date = date.fromisoformat(end_str) if end_str else timezone.now().date()
     start_date = date.fromisoformat(start_str) if start_str else end_date - timedelta(days=30)
+    return lojas_qs, lojas, [int(i) for i in loja_ids], start_date, end_date
 
-    base = Agendamento.objects.filter(
-        loja__in=lojas,
-        data__range=[start_date, end_date]
-    )
-    confirmados = base.filter(confirmado=True, valor_final__isnull=False)
-
-    ticket_qs = confirmados.values('loja__nome').annotate(media=Avg('valor_final')).order_by('loja__nome')
-    ticket_labels = [t['loja__nome'] for t in ticket_qs]
-    ticket_values = [float(t['media']) for t in ticket_qs]
-
-    dias = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
-    dia_labels = [d.strftime('%d/%m') for d in dias]
-
-    fat_series = []
-    for loja in lojas:
-        daily = confirmados.filter(loja=loja).values('data').annotate(total=Sum('valor_final'))
-        mapping = {item['data']: float(item['total']) for item in daily}
-        fat_series.append({'name': loja.nome, 'data': [mapping.get(d, 0) for d in dias]})
-
-    ag_series = []
-    for loja in lojas:
-        daily = base.filter(loja=loja).values('data').annotate(total=Count('id'))
-        mapping = {item['data']: item['total'] for item in daily}
-        ag_series.append({'name': loja.nome, 'data': [mapping.get(d, 0) for d in dias]})
-
-    servicos_por_loja = []
-    for loja in lojas:
-        serv_qs = (
-            Servico.objects.filter(loja=loja, agendamentos__in=base)
-            .annotate(total=Count('agendamentos'))
-            .order_by('-total')
-        )
-        labels = [s.nome for s in serv_qs]
-        values = [s.total for s in serv_qs]
-        servicos_por_loja.append({'loja': loja.nome, 'labels': json.dumps(labels), 'values': json.dumps(values)})
+@login_required
+@subscription_required
+def owner_dashboard(request):
+    """Página do dashboard: só filtros e placeholders; cada painel carrega pelo seu fragmento."""
+    if not getattr(request.user, 'is_owner', False):
+        return redirect('accounts:owner_login')
 
-    fat_func_qs = confirmados.values('funcionario__nome').annotate(total=Sum('valor_final')).order_by('funcionario__nome')
-    fat_func_labels = [f['funcionario__nome'] for f in fat_func_qs]
-    fat_func_values = [float(f['total']) for f in fat_func_qs]
+    lojas_qs, lojas, loja_ids, start_date, end_date = _dashboard_filtros(request)
 
-    no_show_count = base.filter(no_show=True).count()
-    total_count = base.count()
-    no_show_percent = (no_show_count / total_count * 100) if total_count else 0
+    params = QueryDict(mutable=True)
+    params['start'] = start_date.isoformat()
+    params['end'] = end_date.isoformat()
+    params.setlist('lojas', [str(i) for i in loja_ids])
 
     ctx = {
         'lojas': lojas_qs,
-        'lojas_ids': [int(i) for i in loja_ids],
+        'lojas_ids': loja_ids,
         'start': start_date,
         'end': end_date,
-        'ticket_medio_labels': json.dumps(ticket_labels),
-        'ticket_medio_values': json.dumps(ticket_values),
-        'fat_dia_series': json.dumps(fat_series),
-        'ag_dia_series': json.dumps(ag_series),
-        'dia_labels': json.dumps(dia_labels),
-        'servicos_por_loja': servicos_por_loja,
-        'fat_func_labels': json.dumps(fat_func_labels),
-        'fat_func_values': json.dumps(fat_func_values),
-        'no_show_count': no_show_count,
-        'no_show_percent': no_show_percent,
+        'painel_querystring': params.urlencode(),
     }
     target = request.headers.get('HX-Target')
     if request.headers.get('HX-Request') and target != 'content':
         return render(request, 'accounts/partials/owner_dashboard.html', ctx)
     return render(request, 'accounts/owner_dashboard.html', ctx)
 
+@login_required
+@subscription_required
+def owner_dashboard_painel(request, painel):
+    """Fragmento HTMX de um único painel do dashboard (carregado em paralelo aos demais)."""
+    if not getattr(request.user, 'is_owner', False):
+        return HttpResponse(status=403)
+    if painel not in PAINEIS:
+        raise Http404('Painel inexistente.')
+
+    _, lojas, _, start_date, end_date = _dashboard_filtros(request)
+    dados = dados_painel(painel, lojas, start_date, end_date)
+
+    ctx = {'painel': painel, **dados}
+    for key in ('ticket_medio_labels', 'ticket_medio_values', 'fat_dia_series', 'ag_dia_series',
+                'dia_labels', 'fat_func_labels', 'fat_func_values',
+                'ocupacao_periodo_labels', 'ocupacao_periodo_values',
+                'ocupacao_hora_labels', 'ocupacao_hora_values'):
+        if key in dados:
+            ctx[key] = json.dumps(dados[key])
+    if 'servicos_por_loja' in dados:
+        ctx['servicos_por_loja'] = [
+            {'loja': s['loja'], 'labels': json.dumps(s['labels']), 'values': json.dumps(s['values'])}
+            for s in dados['servicos_por_loja']
+        ]
+    return render(request, 'accounts/partials/dashboard_painel.html', ctx)
+
+def _filtra_historico(qs, params):
+    """
+    Filtros do histórico (inicio, fim e busca ``q`` por cliente, serviços ou
+    observação), compartilhados com a exportação. ``cliente`` é aceito como
+    sinônimo de ``q`` para links antigos.
+    """
+    inicio = params.get('inicio')
+    fim = params.get('fim')
+    termo = params.get('q') or params.get('cliente')
+    if inicio:
+        qs = qs.filter(data__gte=inicio)
+    if fim:
+        qs = qs.filter(data__lte=fim)
+    if termo:
+        qs = busca.filtrar(qs, termo)
+    return qs
+
+def _historicos(user, params):
+    """
+    Histórico filtrado do dono, ordenado por ``-data, -hora, -id``: a tabela
+    principal e, se o intervalo alcança o arquivo, a de agendamentos arquivados.
+    """
+    try:
+        inicio = date.fromisoformat(params.get('inicio') or '')
+    except ValueError:
+        inicio = None
+    modelos = [Agendamento, AgendamentoArquivado] if arquivo.alcanca(inicio) else [Agendamento]
+    return [
+        _filtra_historico(m.objects.filter(loja__owner=user).order_by('-data', '-hora', '-id'), params)
+        for m in modelos
+    ]
+
+HISTORICO_LOTE = 20
+HISTORICO_TOTAL_LIMITE = 1000
+
+def _cursor_historico(ag):
+    return f"{ag.data.isoformat()}_{ag.hora.isoformat()}_{ag.id}"
+
+def _apos_cursor(qs, cursor):
+    """
+    Keyset: agendamentos depois de ``cursor`` na ordem ``-data, -hora, -id``.
+    Cursor inválido volta para o início.
+    """
+    try:
+        data, hora, pk = cursor.split('_')
+        data, hora, pk = date.fromisoformat(data), time.fromisoformat(hora), int(pk)
+    except (AttributeError, ValueError):
+        return qs
+    return qs.filter(
+        Q(data__lt=data)
+        | Q(data=data, hora__lt=hora)
+        | Q(data=data, hora=hora, id__lt=pk)
+    )
+
 @login_required
 @subscription_required
 def owner_historico(request):
+    """
+    Histórico paginado por cursor (data, hora, id): cada lote lê só as linhas
+    seguintes pelo índice, sem COUNT nem OFFSET. O total aproximado (contagem
+    limitada a ``HISTORICO_TOTAL_LIMITE``) só é calculado na primeira página.
+    O arquivo só é consultado quando o lote pode conter linhas dele.
+    """
     if not getattr(request.user, 'is_owner', False):
         return redirect('accounts:owner_login')
 
-    ag_qs = (
-        Agendamento.objects
-        .filter(loja__owner=request.user)
-        .select_related('cliente', 'funcionario')
-        .prefetch_related('servicos')
-        .order_by('-data', '-hora')
-    )
-    inicio = request.GET.get('inicio')
-    fim = request.GET.get('fim')
-    cliente = request.GET.get('cliente')
-    if inicio:
-        ag_qs = ag_qs.filter(data__gte=inicio)
-    if fim:
-        ag_qs = ag_qs.filter(data__lte=fim)
-    if cliente:
-        ag_qs = ag_qs.filter(cliente__full_name__icontains=cliente)
-    paginator = Paginator(ag_qs, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    ag_qs, *arquivados = _historicos(request.user, request.GET)
+    cursor = request.GET.get('cursor')
+
+    def pagina(qs):
+        return (_apos_cursor(qs, cursor)
+                .select_related('cliente', 'funcionario')
+                .prefetch_related('servicos'))
+
+    lote = list(pagina(ag_qs)[:HISTORICO_LOTE + 1])
+    # o arquivo só tem datas <= limite(): um lote cheio e mais recente dispensa a consulta
+    if arquivados and not (len(lote) > HISTORICO_LOTE and lote[HISTORICO_LOTE - 1].data > arquivo.limite()):
+        lote = arquivo.mais_recentes([lote] + [pagina(qs) for qs in arquivados], HISTORICO_LOTE + 1)
+    tem_mais = len(lote) > HISTORICO_LOTE
+    lote = lote[:HISTORICO_LOTE]
 
     params = request.GET.copy()
-    params.pop('page', None)
-    ctx = {'page_obj': page_obj, 'querystring': params.urlencode()}
+    params.pop('cursor', None)
+    ctx = {
+        'agendamentos': lote,
+        'proximo_cursor': _cursor_historico(lote[-1]) if tem_mais else None,
+        'querystring': params.urlencode(),
+        'primeira_pagina': not cursor,
+        'termo': request.GET.get('q') or request.GET.get('cliente', ''),
+    }
+    if cursor and request.headers.get('HX-Request'):
+        return render(request, 'accounts/partials/owner_historico_linhas.html', ctx)
+
+    ctx['total_aproximado'] = sum(
+        qs[:HISTORICO_TOTAL_LIMITE + 1].count() for qs in [ag_qs, *arquivados]
+    )
+    ctx['total_limite'] = HISTORICO_TOTAL_LIMITE
     target = request.headers.get('HX-Target')
     if request.headers.get('HX-Request') and target != 'content':
         return render(request, 'accounts/partials/owner_historico.html', ctx)
     return render(request, 'accounts/owner_historico.html', ctx)
 
 
+class _Eco:
+    """Pseudo-arquivo para o ``csv.writer``: devolve a linha em vez de gravá-la."""
+    def write(self, value):
+        return value
+
+EXPORT_CHUNK_SIZE = 1000
+# células que Excel/Sheets interpretariam como fórmula
+CSV_INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+def _celula_texto(valor):
+    """Texto livre para o CSV, com ``'`` na frente se começar como fórmula."""
+    valor = valor or ''
+    return f"'{valor}" if valor.startswith(CSV_INICIO_FORMULA) else valor
+
+def _lotes_historico(qs):
+    """Linhas de ``qs`` (values) com os serviços, buscados uma vez por lote."""
+    rows = qs.values(
+        'id', 'criado_em', 'data', 'hora', 'cliente__full_name', 'cliente__phone',
+        'funcionario__nome', 'valor_final', 'teve_desconto', 'forma_pagamento',
+        'confirmado', 'no_show', 'observacao',
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    through = qs.model.servicos.through
+    origem = f"{qs.model.servicos.field.m2m_field_name()}_id"
+
+    while True:
+        lote = list(islice(rows, EXPORT_CHUNK_SIZE))
+        if not lote:
+            break
+        servicos = {}
+        for ag_id, nome in (through.objects
+                            .filter(**{f'{origem}__in': [r['id'] for r in lote]})
+                            .order_by('servico__nome')
+                            .values_list(origem, 'servico__nome')):
+            servicos.setdefault(ag_id, []).append(nome)
+        for r in lote:
+            r['servicos'] = ', '.join(servicos.get(r['id'], []))
+            yield r
+
+def _linhas_historico_csv(*querysets):
+    """
+    Gera o CSV linha a linha. Com o arquivo, as duas tabelas (já ordenadas por
+    ``-data, -hora, -id``) são intercaladas na mesma ordem.
+    """
+    writer = csv.writer(_Eco(), delimiter=';')
+    yield '\ufeff' + writer.writerow([
+        'Data de agendamento', 'Data de atendimento', 'Hora', 'Cliente', 'Telefone',
+        'Profissional', 'Serviços', 'Valor', 'Desconto?', 'Forma de pagamento',
+        'Finalizado?', 'No-show?', 'Observação',
+    ])
+
+    formas = dict(Agendamento.FormaPagamento.choices)
+    linhas = heapq.merge(
+        *(_lotes_historico(qs) for qs in querysets),
+        key=lambda r: (r['data'], r['hora'], r['id']), reverse=True,
+    )
+    for r in linhas:
+        yield writer.writerow([
+            timezone.localtime(r['criado_em']).strftime('%d/%m/%Y %H:%M'),
+            r['data'].strftime('%d/%m/%Y'),
+            r['hora'].strftime('%H:%M'),
+            _celula_texto(r['cliente__full_name']),
+            _celula_texto(r['cliente__phone']),
+            _celula_texto(r['funcionario__nome']),
+            _celula_texto(r['servicos']),
+            f"{r['valor_final']:.2f}".replace('.', ',') if r['valor_final'] is not None else '',
+            'Sim' if r['teve_desconto'] else 'Não',
+            formas.get(r['forma_pagamento'], ''),
+            'Sim' if r['confirmado'] else 'Não',
+            'Sim' if r['no_show'] else 'Não',
+            _celula_texto(r['observacao']),
+        ])
+
+@login_required
+@subscription_required
+def owner_historico_exportar(request):
+    """Exporta o histórico filtrado (mesmos filtros da tela) como CSV em streaming."""
+    if not getattr(request.user, 'is_owner', False):
+        return redirect('accounts:owner_login')
+
+    querysets = _historicos(request.user, request.GET)
+    resp = StreamingHttpResponse(_linhas_historico_csv(*querysets), content_type='text/csv; charset=utf-8')
+    nome = f"historico-{timezone.localdate():%Y%m%d}.csv"
+    resp['Content-Disposition'] = f'attachment; filename="{nome}"'
+    return resp
+
 @login_required
 @subscription_required
 def owner_sobre(request):
@@ -269,22 +419,43 @@ def owner_sobre(request):
     #     return render(request, 'accounts/partials/sobre.html', ctx)
     return render(request, 'accounts/sobre.html', ctx)
 
-@login_required
-@subscription_required
-def owner_home_agendamentos(request):
-    lojas = request.user.lojas.order_by('nome')
+TODAS_AS_LOJAS = 'todas'
 
-    # loja via GET/POST/sessão (mantém como já estava)
+def _lojas_do_calendario(request):
+    """
+    Lojas do dono (uma consulta) e a seleção do calendário: uma loja ou todas
+    (``loja_filtro=todas``). Retorna ``(lojas, loja, loja_ids)``; ``loja`` é
+    None na visão de todas as lojas.
+    """
+    lojas = list(request.user.lojas.select_related('agendamento_config').order_by('nome'))
     loja_id = (request.GET.get('loja_filtro') or request.POST.get('loja_filtro') or request.session.get('loja_filtro'))
-    loja = lojas.filter(id=loja_id).first() or lojas.first()
+    if str(loja_id) == TODAS_AS_LOJAS and lojas:
+        request.session['loja_filtro'] = TODAS_AS_LOJAS
+        return lojas, None, [l.id for l in lojas]
+
+    loja = next((l for l in lojas if str(l.id) == str(loja_id)), lojas[0] if lojas else None)
     if loja:
         request.session['loja_filtro'] = loja.id
+    return lojas, loja, [loja.id] if loja else []
+
+@login_required
+@subscription_required
+def owner_home_agendamentos(request):
+    lojas, loja, loja_ids = _lojas_do_calendario(request)
+    todas = loja is None and bool(loja_ids)
+    base_ctx = {
+        'lojas': lojas,
+        'loja': loja,
+        'todas': todas,
+        'loja_param': TODAS_AS_LOJAS if todas else (loja.id if loja else None),
+        'today': timezone.localdate(),
+    }
 
     # --- preferências de visualização (persistência em sessão) ---
     view_mode = (request.GET.get('view') or request.POST.get('view') or request.session.get('ag_view_mode') or 'month').lower()
     request.session['ag_view_mode'] = view_mode
 
-    if view_mode == 'day':
+    if view_mode in ('day', 'week'):
         # dia preferido: GET/POST/sessão -> fallback hoje
         d_str = request.GET.get('d') or request.POST.get('d') or request.session.get('ag_view_day')
         try:
@@ -293,24 +464,39 @@ def owner_home_agendamentos(request):
             day = timezone.localdate()
         request.session['ag_view_day'] = day.isoformat()
 
-        qs = (Agendamento.objects
-              .filter(loja=loja, data=day, confirmado=False, no_show=False)
-              .select_related('funcionario','cliente')
-              .prefetch_related('servicos')
-              .order_by('hora','funcionario__nome'))
+        if view_mode == 'week':
+            week_start = day - timedelta(days=day.weekday())
+            week_end = week_start + timedelta(days=6)
+            semana = (
+                semana_por_profissional([l for l in lojas if l.id in loja_ids], week_start, week_end)
+                if loja_ids else None
+            )
+            ctx = {
+                **base_ctx,
+                'view_mode': 'week',
+                'day': day,
+                'week_start': week_start,
+                'week_end': week_end,
+                'week_prev': week_start - timedelta(days=7),
+                'week_next': week_start + timedelta(days=7),
+                'semana': semana,
+                'current': day.replace(day=1),
+                'total_pendentes': semana['total_pendentes'] if semana else 0,
+            }
+            return render(request, 'accounts/partials/owner_home_agendamentos.html', ctx)
+
+        day_items, total_dia = pendentes_do_dia(loja_ids, day, todas=todas)
 
         ctx = {
-            'lojas': lojas,
-            'loja': loja,
+            **base_ctx,
             'view_mode': 'day',
             'day': day,
             'day_prev': day - timedelta(days=1),
             'day_next': day + timedelta(days=1),
-            'day_items': qs,
-            'today': timezone.localdate(),
+            'day_items': day_items,
             # para o botão "Mês" voltar ao mês do dia atual:
             'current': day.replace(day=1),
-            'total_pendentes': qs.count(),
+            'total_pendentes': total_dia,
         }
         return render(request, 'accounts/partials/owner_home_agendamentos.html', ctx)
 
@@ -330,34 +516,122 @@ def owner_home_agendamentos(request):
     weeks_dates = cal.monthdatescalendar(current.year, current.month)
     start, end = weeks_dates[0][0], weeks_dates[-1][-1]
 
-    pendentes_qs = (Agendamento.objects
-        .filter(loja=loja, data__range=[start, end], confirmado=False, no_show=False)
-        .select_related('funcionario','cliente')
-        .prefetch_related('servicos')
-        .order_by('data','hora'))
+    # modo compacto: '1'/'0' escolhidos pelo dono; sem escolha, decide pelo volume
+    compacto_pref = request.GET.get('compacto')
+    if compacto_pref in ('0', '1'):
+        request.session['ag_compacto'] = compacto_pref
+    compacto_pref = request.session.get('ag_compacto')
 
-    by_day = {}
-    for a in pendentes_qs:
-        by_day.setdefault(a.data, []).append(a)
-
-    weeks = [[(d, by_day.get(d, [])) for d in week] for week in weeks_dates]
+    pendentes_qs = Agendamento.objects.filter(
+        loja_id__in=loja_ids, data__range=[start, end], confirmado=False, no_show=False
+    )
+    # o mesmo GROUP BY alimenta as contagens dos dias e o total do mês
+    resumo = resumo_pendentes_por_dia(pendentes_qs, por_loja=todas)
+    total_pendentes = sum(r['total'] for r in resumo.values())
+    compacto = compacto_pref == '1' or (compacto_pref is None and total_pendentes > COMPACTO_LIMITE)
+
+    if compacto:
+        vazio = {'total': 0, 'grupos': []}
+        weeks = [[(d, resumo.get(d, vazio)) for d in week] for week in weeks_dates]
+    else:
+        by_day = {}
+        relacionados = ('funcionario', 'cliente', 'loja') if todas else ('funcionario', 'cliente')
+        for a in (pendentes_qs
+                  .select_related(*relacionados)
+                  .prefetch_related('servicos')
+                  .order_by('data', 'hora')):
+            by_day.setdefault(a.data, []).append(a)
+        weeks = [[(d, by_day.get(d, [])) for d in week] for week in weeks_dates]
 
     prev_first = (current.replace(day=1) - timedelta(days=1)).replace(day=1)
     next_first = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
 
     ctx = {
-        'lojas': lojas,
-        'loja': loja,
+        **base_ctx,
         'view_mode': 'month',
         'weeks': weeks,
         'current': current,
-        'today': timezone.localdate(),
         'prev_y': prev_first.year, 'prev_m': prev_first.month,
         'next_y': next_first.year, 'next_m': next_first.month,
-        'total_pendentes': pendentes_qs.count(),
+        'total_pendentes': total_pendentes,
+        'compacto': compacto,
     }
     return render(request, 'accounts/partials/owner_home_agendamentos.html', ctx)
 
+@login_required
+@subscription_required
+def owner_agendamento_item(request, pk):
+    """Um agendamento pendente do calendário, usado para aplicar os eventos ao vivo."""
+    a = get_object_or_404(
+        Agendamento.objects.select_related('funcionario', 'cliente', 'loja').prefetch_related('servicos'),
+        pk=pk, loja__owner=request.user,
+    )
+    if a.confirmado or a.no_show:
+        return HttpResponse(status=204)
+    modo = 'day' if request.GET.get('view') == 'day' else 'month'
+    todas = request.GET.get('loja_filtro') == TODAS_AS_LOJAS
+    return render(request, 'accounts/partials/agendamento_item.html', {'a': a, 'modo': modo, 'todas': todas})
+
+def _lojas_para_eventos(user, loja_param):
+    if not (user.is_authenticated and getattr(user, 'is_owner', False)):
+        return []
+    sub = getattr(user, 'subscription', None)
+    if not sub or not sub.is_active():
+        return []
+    lojas = user.lojas.order_by('id')
+    if loja_param != TODAS_AS_LOJAS:
+        try:
+            lojas = lojas.filter(pk=int(loja_param))
+        except ValueError:
+            return []
+    return list(lojas.values_list('id', flat=True))
+
+@login_required
+@subscription_required
+def owner_agendamentos_dia(request):
+    """Um dia do calendário (célula compacta ou linha da semana), recarregado pelo calendário ao vivo."""
+    _, loja, loja_ids = _lojas_do_calendario(request)
+    if not loja_ids:
+        raise Http404('Nenhuma loja.')
+    todas = loja is None
+    try:
+        day = date.fromisoformat(request.GET.get('d', ''))
+    except ValueError:
+        raise Http404('Dia inválido.')
+    if request.GET.get('view') == 'week':
+        semana = semana_por_profissional(
+            request.user.lojas.select_related('agendamento_config').filter(id__in=loja_ids), day, day
+        )
+        return render(request, 'accounts/partials/agendamento_semana_linha.html', {
+            'linha': semana['linhas'][0], 'horas': semana['horas'], 'today': timezone.localdate(),
+        })
+    modo = 'day' if request.GET.get('view') == 'day' else 'month'
+    compacto = modo == 'month' and request.GET.get('compacto') == '1'
+    items, _ = pendentes_do_dia(loja_ids, day, compacto, todas=todas)
+    return render(request, 'accounts/partials/agendamento_dia.html', {
+        'day': day, 'items': items, 'modo': modo, 'compacto': compacto, 'todas': todas,
+        'loja_param': TODAS_AS_LOJAS if todas else loja.id,
+    })
+
+async def owner_agendamentos_eventos(request):
+    """
+    Fluxo SSE (``text/event-stream``) com os agendamentos criados, finalizados
+    e marcados como no-show na loja (ou em todas, com ``loja=todas``). Deve ser
+    servido via ASGI (``barber.asgi``).
+    """
+    user = await request.auser()
+    loja_ids = await sync_to_async(_lojas_para_eventos)(user, request.GET.get('loja', ''))
+    if not loja_ids:
+        return HttpResponse(status=403)
+
+    resp = StreamingHttpResponse(
+        fluxo_sse(loja_ids, request.headers.get('Last-Event-ID')),
+        content_type='text/event-stream',
+    )
+    resp['Cache-Control'] = 'no-cache'
+    resp['X-Accel-Buffering'] = 'no'
+    return resp
+
 @login_required
 @subscription_required
 def owner_criar_atendimento(request):
@@ -374,7 +648,7 @@ def owner_criar_atendimento(request):
 
         # Se faltar algo, re-renderiza o modal no estado correto (com base em loja/func/data passados)
         if not (cliente_id and funcionario_id and servicos_ids and data_str and hora_str):
-            clientes = request.user.clientes.select_related('user').order_by('user__full_name')
+            cliente_sel = _cliente_do_dono(request.user, cliente_id)
             lojas = request.user.lojas.order_by('nome')    # <-- NOVO
 
             loja_sel = None
@@ -395,7 +669,7 @@ def owner_criar_atendimento(request):
                 slots = gerar_slots_disponiveis(funcionario, dia)
 
             ctx = {
-                'clientes': clientes,
+                'cliente_sel': cliente_sel,
                 'lojas': lojas,               # <-- NOVO
                 'loja_sel': loja_sel,         # <-- NOVO (para marcar selected)
                 'funcionarios': funcionarios, # <-- pode ser None se loja não escolhida
@@ -438,12 +712,11 @@ def owner_criar_atendimento(request):
 
         return resp
 
-    # GET: etapa 1 (Loja + Cliente)
-    clientes = request.user.clientes.select_related('user').order_by('user__full_name')
+    # GET: etapa 1 (Loja + Cliente); o cliente é escolhido pela busca (owner_buscar_clientes)
     lojas = request.user.lojas.order_by('nome')
 
     ctx = {
-        'clientes': clientes,
+        'cliente_sel': None,
         'lojas': lojas,
         'loja_sel': None,
         'funcionarios': None,   # etapa 2 virá por AJAX
@@ -453,6 +726,52 @@ def owner_criar_atendimento(request):
     }
     return render(request, 'accounts/partials/criar_atendimento_modal.html', ctx)
 
+CLIENTES_SUGESTOES = 8
+
+def _cliente_do_dono(owner, user_id):
+    if not user_id:
+        return None
+    return User.objects.filter(pk=user_id, cliente_de__owner=owner).only('id', 'full_name', 'phone').first()
+
+def _buscar_clientes(owner, termo, limite=CLIENTES_SUGESTOES):
+    """Sugestões por prefixo de nome ou telefone (ver ``filtro_busca_cliente``)."""
+    filtro, campo = filtro_busca_cliente(termo)
+    if not filtro:
+        return []
+    return list(
+        Cliente.objects.filter(filtro, owner=owner)
+        .order_by(campo)
+        .values('user_id', 'user__full_name', 'user__phone')[:limite]
+    )
+
+def _clientes_recentes(owner, limite=CLIENTES_SUGESTOES):
+    """Clientes dos últimos agendamentos do dono (pelo id, sem ordenar a tabela)."""
+    ids = []
+    for cliente_id in (Agendamento.objects.filter(loja__owner=owner)
+                       .order_by('-id').values_list('cliente_id', flat=True)[:limite * 10]):
+        if cliente_id not in ids:
+            ids.append(cliente_id)
+            if len(ids) == limite:
+                break
+    clientes = {
+        c['user_id']: c
+        for c in Cliente.objects.filter(owner=owner, user_id__in=ids)
+        .values('user_id', 'user__full_name', 'user__phone')
+    }
+    return [clientes[i] for i in ids if i in clientes]
+
+@login_required
+@subscription_required
+def owner_buscar_clientes(request):
+    """Sugestões do seletor de cliente: busca por prefixo ou, sem termo, os recentes."""
+    if not getattr(request.user, 'is_owner', False):
+        return HttpResponse(status=403)
+    termo = request.GET.get('q', '').strip()
+    clientes = _buscar_clientes(request.user, termo) if termo else _clientes_recentes(request.user)
+    return render(request, 'accounts/partials/cliente_opcoes.html', {
+        'clientes': clientes, 'termo': termo,
+    })
+
 @login_required
 @subscription_required
 def owner_add_cliente(request):
@@ -465,10 +784,9 @@ def owner_add_cliente(request):
         if form.is_valid():
             user = form.save()
             Cliente.objects.get_or_create(owner=request.user, user=user)
-            resp = HttpResponse(f'<option value="{user.id}" selected>{user.full_name}</option>')
-            resp['HX-Retarget'] = '#cliente'
-            resp['HX-Reswap'] = 'beforeend'
-            resp['HX-Reselect'] = f'#cliente option[value="{user.id}"]'
+            resp = render(request, 'accounts/partials/cliente_picker.html', {'cliente_sel': user})
+            resp['HX-Retarget'] = '#cliente-picker'
+            resp['HX-Reswap'] = 'outerHTML'
             return resp
         resp = render(request, 'accounts/partials/cliente_form_modal.html', {'cliente_form': form}, status=422)
         resp['HX-Retarget'] = '#modalShell .modal-content'
@@ -641,10 +959,15 @@ def client_dashboard(request):
         from apps.cadastro.models import Loja
         loja = Loja.objects.filter(slug=shop_slug, ativa=True).first()
 
-    agendamentos = Agendamento.objects.filter(cliente=request.user)
-    if loja:
-        agendamentos = agendamentos.filter(loja=loja)
-    agendamentos = agendamentos.select_related("funcionario", "loja").prefetch_related("servicos").order_by("-data", "-hora")
+    # agendamentos antigos já arquivados entram na mesma lista
+    modelos = [Agendamento, AgendamentoArquivado] if arquivo.alcanca(None) else [Agendamento]
+    agendamentos = []
+    for modelo in modelos:
+        qs = modelo.objects.filter(cliente=request.user)
+        if loja:
+            qs = qs.filter(loja=loja)
+        agendamentos.extend(qs.select_related("funcionario", "loja").prefetch_related("servicos"))
+    agendamentos.sort(key=lambda a: (a.data, a.hora), reverse=True)
 
     return render(
         request,
@@ -655,6 +978,21 @@ def client_dashboard(request):
         }
     )
 
+def metricas_prometheus(request):
+    """``/metrics`` no formato texto do Prometheus (ver ``apps.accounts.metricas``)."""
+    if not getattr(settings, 'METRICAS', False):
+        raise Http404
+    token = getattr(settings, 'METRICAS_TOKEN', None)
+    if not token:
+        # sem token o scrape só é aberto em desenvolvimento
+        if not settings.DEBUG:
+            return HttpResponse(status=403)
+    elif not hmac.compare_digest(
+        request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()
+    ):
+        return HttpResponse(status=401)
+    return HttpResponse(metricas.exportar(), content_type=metricas.CONTENT_TYPE)
+
 @require_POST
 def client_resend_code(request):
     """
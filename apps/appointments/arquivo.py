@@ -0,0 +1,124 @@
+"""
+Arquivo (tabela fria) de agendamentos antigos.
+
+``arquivar`` move agendamentos finalizados ou no-show com ``data`` anterior a
+``settings.AGENDAMENTO_ARQUIVO_DIAS`` para ``AgendamentoArquivado``, em lotes
+pequenos, cada um na sua transação: interromper e rodar de novo continua de
+onde parou. A cópia e a remoção (SQL direto) não disparam sinais, de
+propósito: a entrada do agendamento no índice de busca fica onde está, porque
+o id se mantém e ``busca`` lê as duas tabelas ao reconstruir ou reindexar um
+cliente/serviço; e os totais do dashboard não mudam (ele lê as duas tabelas).
+
+Quem precisa do passado lê as duas tabelas só quando o intervalo alcança o
+arquivo, usando ``limite()`` (a data mais recente arquivada).
+"""
+from datetime import date, timedelta
+import heapq
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import Agendamento, AgendamentoArquivado
+
+LOTE = 1000
+LIMITE_CHAVE = "agendamentos:arquivo:limite"
+LIMITE_TTL = 3600
+
+
+def idade_dias() -> int:
+    return getattr(settings, "AGENDAMENTO_ARQUIVO_DIAS", 365)
+
+
+def data_corte(hoje: date | None = None) -> date:
+    return (hoje or timezone.localdate()) - timedelta(days=idade_dias())
+
+
+def limite() -> date | None:
+    """Data mais recente no arquivo (None se vazio); em cache até o próximo lote."""
+    valor = cache.get(LIMITE_CHAVE)
+    if valor is None:
+        valor = {"data": AgendamentoArquivado.objects.aggregate(m=Max("data"))["m"]}
+        cache.set(LIMITE_CHAVE, valor, timeout=LIMITE_TTL)
+    return valor["data"]
+
+
+def alcanca(inicio: date | None) -> bool:
+    """Um intervalo que começa em ``inicio`` (None = sem início) precisa do arquivo?"""
+    fim_arquivo = limite()
+    return fim_arquivo is not None and (inicio is None or inicio <= fim_arquivo)
+
+
+def _campos():
+    return [f.attname for f in AgendamentoArquivado._meta.concrete_fields if f.name != "arquivado_em"]
+
+
+def _apagar(ids) -> None:
+    """Remove da tabela principal (e os serviços deles) sem sinais nem coleta de cascata."""
+    campo = Agendamento.servicos.field
+    qn = connection.ops.quote_name
+    marcas = ", ".join(["%s"] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {qn(campo.m2m_db_table())} WHERE {qn(campo.m2m_column_name())} IN ({marcas})", ids
+        )
+        cursor.execute(f"DELETE FROM {qn(Agendamento._meta.db_table)} WHERE {qn('id')} IN ({marcas})", ids)
+
+
+def arquivar_lote(corte: date, tamanho: int = LOTE) -> int:
+    """Move um lote (os menores ids elegíveis) e retorna quantos foram movidos."""
+    through = Agendamento.servicos.through
+    arq_through = AgendamentoArquivado.servicos.through
+    with transaction.atomic():
+        ids = list(
+            Agendamento.objects
+            .filter(Q(confirmado=True) | Q(no_show=True), data__lt=corte)
+            .order_by("id")
+            .values_list("id", flat=True)[:tamanho]
+        )
+        if not ids:
+            return 0
+        AgendamentoArquivado.objects.bulk_create(
+            [AgendamentoArquivado(**r) for r in Agendamento.objects.filter(id__in=ids).values(*_campos())],
+            ignore_conflicts=True,
+        )
+        arq_through.objects.bulk_create(
+            [
+                arq_through(agendamentoarquivado_id=ag_id, servico_id=servico_id)
+                for ag_id, servico_id in through.objects.filter(agendamento_id__in=ids)
+                .values_list("agendamento_id", "servico_id")
+            ],
+            ignore_conflicts=True,
+        )
+        _apagar(ids)
+    cache.delete(LIMITE_CHAVE)
+    return len(ids)
+
+
+def arquivar(dias: int | None = None, tamanho: int = LOTE, max_lotes: int | None = None, ao_lote=None) -> int:
+    """
+    Arquiva em lotes até acabar (ou ``max_lotes``). ``ao_lote(total)`` é chamado
+    depois de cada lote confirmado. Retorna o total movido.
+    """
+    corte = timezone.localdate() - timedelta(days=dias if dias is not None else idade_dias())
+    total = lotes = 0
+    while max_lotes is None or lotes < max_lotes:
+        movidos = arquivar_lote(corte, tamanho)
+        if not movidos:
+            break
+        total += movidos
+        lotes += 1
+        if ao_lote:
+            ao_lote(total)
+    return total
+
+
+def _chave(a):
+    return (a.data, a.hora, a.id)
+
+
+def mais_recentes(querysets, n: int) -> list:
+    """Os ``n`` primeiros de vários querysets já ordenados por ``-data, -hora, -id``."""
+    return heapq.nlargest(n, (a for qs in querysets for a in qs[:n]), key=_chave)
@@ -0,0 +1,140 @@
+"""
+Busca textual do histórico (cliente, serviços e observação).
+
+No SQLite o texto de cada agendamento fica numa tabela virtual FTS5
+(``agendamento_busca``, ``rowid`` = id do agendamento, criada na migração
+0008) com tokenizer que ignora acentos e índice de prefixos, mantida pelos
+sinais em ``models.py``.
+O índice cobre a tabela principal e a do arquivo (``AgendamentoArquivado``
+mantém o id): reconstruir ou reindexar um cliente/serviço lê as duas.
+Em outros bancos a busca cai para ``icontains`` nos mesmos campos.
+
+``bulk_create``/``update`` não disparam sinais: depois de cargas em massa,
+chame ``indexar(ids)`` ou ``reconstruir()``.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+TABELA = "agendamento_busca"
+LOTE = 500
+
+
+def disponivel() -> bool:
+    return connection.vendor == "sqlite"
+
+
+def _fontes():
+    """Tabelas que alimentam o índice: a principal e a do arquivo (mesmos ids)."""
+    from .models import Agendamento, AgendamentoArquivado
+
+    fontes = []
+    for modelo in (Agendamento, AgendamentoArquivado):
+        campo = modelo.servicos.field
+        fontes.append({
+            "ag": modelo._meta.db_table,
+            "through": campo.m2m_db_table(),
+            "ag_col": campo.m2m_column_name(),
+            "serv_col": campo.m2m_reverse_name(),
+        })
+    return fontes
+
+
+def _de_todas(sql: str, filtro: str, params=()) -> tuple[str, list]:
+    """
+    ``sql`` (com ``{ag}``, ``{through}``..., ``{filtro}``) aplicado a cada
+    fonte e unido com UNION ALL; os parâmetros do filtro se repetem por fonte.
+    """
+    from .models import Agendamento
+    from apps.cadastro.models import Servico
+
+    comuns = {
+        "user": Agendamento._meta.get_field("cliente").related_model._meta.db_table,
+        "servico": Servico._meta.db_table,
+    }
+    fontes = _fontes()
+    partes = [sql.format(filtro=filtro.format(**f), **f, **comuns) for f in fontes]
+    return " UNION ALL ".join(partes), list(params) * len(fontes)
+
+
+def _sql_inserir(filtro: str, params=()) -> tuple[str, list]:
+    """INSERT ... SELECT montando o documento de cada agendamento (das duas tabelas)."""
+    select, params = _de_todas(
+        "SELECT a.id, COALESCE(u.full_name, '') || ' ' || COALESCE(u.phone, ''), "
+        "COALESCE((SELECT group_concat(s.nome, ' ') FROM {through} x "
+        "JOIN {servico} s ON s.id = x.{serv_col} WHERE x.{ag_col} = a.id), ''), "
+        "a.observacao "
+        "FROM {ag} a JOIN {user} u ON u.id = a.cliente_id {filtro}",
+        filtro, params,
+    )
+    return f"INSERT INTO {TABELA} (rowid, cliente, servicos, observacao) {select}", params
+
+
+def remover(ids) -> None:
+    ids = list(ids)
+    if not ids or not disponivel():
+        return
+    with connection.cursor() as cursor:
+        for i in range(0, len(ids), LOTE):
+            lote = ids[i:i + LOTE]
+            marcas = ", ".join(["%s"] * len(lote))
+            cursor.execute(f"DELETE FROM {TABELA} WHERE rowid IN ({marcas})", lote)
+
+
+def indexar(ids) -> None:
+    """(Re)indexa os agendamentos informados, em lotes."""
+    ids = list(ids)
+    if not ids or not disponivel():
+        return
+    remover(ids)
+    with connection.cursor() as cursor:
+        for i in range(0, len(ids), LOTE):
+            lote = ids[i:i + LOTE]
+            marcas = ", ".join(["%s"] * len(lote))
+            cursor.execute(*_sql_inserir(f"WHERE a.id IN ({marcas})", lote))
+
+
+def indexar_por(campo: str, valor) -> None:
+    """Reindexa os agendamentos (e arquivados) de um cliente (``cliente_id``) ou serviço (``servico_id``)."""
+    if not disponivel():
+        return
+    if campo == "cliente_id":
+        filtro = "WHERE a.cliente_id = %s"
+    else:
+        filtro = "WHERE a.id IN (SELECT {ag_col} FROM {through} WHERE {serv_col} = %s)"
+    ids, params = _de_todas("SELECT a.id FROM {ag} a {filtro}", filtro, [valor])
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABELA} WHERE rowid IN ({ids})", params)
+        cursor.execute(*_sql_inserir(filtro, [valor]))
+
+
+def reconstruir() -> None:
+    if not disponivel():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABELA}")
+        cursor.execute(*_sql_inserir(""))
+
+
+def consulta_fts(termo: str) -> str:
+    """``maria cor`` -> ``"maria"* "cor"*``: todos os termos, por prefixo."""
+    return " ".join(f'"{t}"*' for t in re.findall(r"\w+", termo or ""))
+
+
+def filtrar(qs, termo: str):
+    """Restringe ``qs`` (de Agendamento) aos que casam com todos os termos."""
+    consulta = consulta_fts(termo)
+    if not consulta:
+        return qs
+    if disponivel():
+        return qs.filter(id__in=RawSQL(
+            f"SELECT rowid FROM {TABELA} WHERE {TABELA} MATCH %s", [consulta]
+        ))
+    for t in re.findall(r"\w+", termo):
+        qs = qs.filter(
+            Q(cliente__full_name__icontains=t) | Q(cliente__phone__icontains=t)
+            | Q(servicos__nome__icontains=t) | Q(observacao__icontains=t)
+        )
+    return qs.distinct()
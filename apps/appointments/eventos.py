@@ -0,0 +1,120 @@
+"""
+Eventos de agendamento por loja, consumidos pelo calendário do dono via SSE.
+
+Cada loja tem um contador de sequência no cache e cada evento fica numa chave
+própria (``agendamentos:eventos:<loja>:<seq>``) por alguns minutos. O fluxo SSE
+lê as chaves a partir do último ``id`` entregue (por loja, quando o fluxo
+cobre várias), o que permite retomar a conexão pelo ``Last-Event-ID`` do
+navegador. Com um cache compartilhado (Redis/Memcached) os eventos
+atravessam processos; com o LocMemCache padrão valem apenas dentro do mesmo
+processo.
+"""
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+EVENTO_TTL = 600            # segundos que um evento fica disponível para reenvio
+EVENTOS_JANELA = 200        # máximo de eventos reenviados numa reconexão
+SSE_INTERVALO = 1.0         # intervalo entre leituras do cache
+SSE_HEARTBEAT = 15          # comentário ":" para manter a conexão viva
+SSE_DURACAO = 300           # encerra o fluxo; o EventSource reconecta sozinho
+SSE_RETRY_MS = 3000
+
+TIPOS = ("criado", "finalizado", "no_show")
+
+
+def _chave_seq(loja_id) -> str:
+    return f"agendamentos:eventos:{loja_id}:seq"
+
+
+def _chave_evento(loja_id, seq: int) -> str:
+    return f"agendamentos:eventos:{loja_id}:{seq}"
+
+
+def publicar(loja_id: int, tipo: str, **dados) -> int:
+    """Registra um evento da loja e retorna a sua sequência."""
+    chave = _chave_seq(loja_id)
+    cache.add(chave, 0, timeout=None)
+    try:
+        seq = cache.incr(chave)
+    except ValueError:  # chave removida entre o add e o incr
+        cache.set(chave, 1, timeout=None)
+        seq = 1
+    cache.set(_chave_evento(loja_id, seq), {"tipo": tipo, **dados}, timeout=EVENTO_TTL)
+    return seq
+
+
+def ultimo_seq(loja_id: int) -> int:
+    return cache.get(_chave_seq(loja_id), 0)
+
+
+def eventos_desde(loja_id: int, desde: int) -> tuple[list[tuple[int, dict]], int]:
+    """Eventos com sequência maior que ``desde`` e o novo cursor."""
+    atual = ultimo_seq(loja_id)
+    if desde >= atual:
+        # nada novo (ou o contador foi reiniciado: não há como saber o que se perdeu)
+        return [], atual
+    inicio = max(desde + 1, atual - EVENTOS_JANELA + 1)
+    chaves = {seq: _chave_evento(loja_id, seq) for seq in range(inicio, atual + 1)}
+    encontrados = cache.get_many(chaves.values())
+    eventos = [(seq, encontrados[c]) for seq, c in chaves.items() if c in encontrados]
+    return eventos, atual
+
+
+def formatar_sse(evento_id: str, evento: dict) -> str:
+    return f"id: {evento_id}\nevent: agendamento\ndata: {json.dumps(evento, separators=(',', ':'))}\n\n"
+
+
+def _ler_cursores(loja_ids, ultimo_id):
+    """
+    ``Last-Event-ID`` -> cursor por loja. Com uma loja o id é a própria
+    sequência; com várias, ``loja:seq`` separados por vírgula.
+    """
+    if not ultimo_id:
+        return None
+    try:
+        if ":" not in ultimo_id:
+            return {loja_ids[0]: int(ultimo_id)} if len(loja_ids) == 1 else None
+        pares = dict(p.split(":", 1) for p in ultimo_id.split(","))
+        return {l: int(pares.get(str(l), 0)) for l in loja_ids}
+    except ValueError:
+        return None
+
+
+def _id_evento(cursores) -> str:
+    if len(cursores) == 1:
+        return str(next(iter(cursores.values())))
+    return ",".join(f"{l}:{seq}" for l, seq in cursores.items())
+
+
+async def fluxo_sse(loja_ids, ultimo_id: str | None = None):
+    """Gerador assíncrono do corpo ``text/event-stream`` de uma ou mais lojas."""
+    ler = sync_to_async(eventos_desde, thread_sensitive=False)
+    loja_ids = list(loja_ids)
+    cursores = _ler_cursores(loja_ids, ultimo_id)
+    if cursores is None:
+        cursores = {}
+        for loja_id in loja_ids:
+            cursores[loja_id] = await sync_to_async(ultimo_seq, thread_sensitive=False)(loja_id)
+
+    yield f"retry: {SSE_RETRY_MS}\n\n"
+    inicio = ultimo_envio = time.monotonic()
+    while time.monotonic() - inicio < SSE_DURACAO:
+        enviou = False
+        for loja_id in loja_ids:
+            eventos, atual = await ler(loja_id, cursores[loja_id])
+            for seq, evento in eventos:
+                cursores[loja_id] = seq
+                enviou = True
+                yield formatar_sse(_id_evento(cursores), {**evento, "loja": loja_id})
+            cursores[loja_id] = atual
+        agora = time.monotonic()
+        if enviou:
+            ultimo_envio = agora
+        elif agora - ultimo_envio >= SSE_HEARTBEAT:
+            ultimo_envio = agora
+            yield ": ping\n\n"
+        await asyncio.sleep(SSE_INTERVALO)
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from apps.appointments import arquivo
+
+
+class Command(BaseCommand):
+    help = (
+        "Move agendamentos finalizados/no-show antigos para a tabela de arquivo, "
+        "em lotes. Pode ser interrompido e executado de novo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dias", type=int, default=None,
+                            help="Idade mínima em dias (padrão: settings.AGENDAMENTO_ARQUIVO_DIAS).")
+        parser.add_argument("--lote", type=int, default=arquivo.LOTE)
+        parser.add_argument("--max-lotes", type=int, default=None)
+
+    def handle(self, *args, dias=None, lote=arquivo.LOTE, max_lotes=None, **options):
+        verbosidade = options["verbosity"]
+
+        def progresso(total):
+            if verbosidade > 1:
+                self.stdout.write(f"{total} agendamentos arquivados...")
+
+        total = arquivo.arquivar(dias=dias, tamanho=lote, max_lotes=max_lotes, ao_lote=progresso)
+        self.stdout.write(self.style.SUCCESS(f"{total} agendamentos arquivados."))
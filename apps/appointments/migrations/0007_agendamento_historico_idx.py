@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0006_agendamento_no_show'),
+        ('cadastro', '0006_formapagamento_loja_pagamentos_aceitos_lojahorario'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agendamento',
+            index=models.Index(fields=['data', 'hora', 'id'], name='agendamento_data_hora_id_idx'),
+        ),
+    ]
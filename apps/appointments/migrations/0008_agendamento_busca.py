@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.db import migrations
+
+CRIAR = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS agendamento_busca USING fts5("
+    "cliente, servicos, observacao, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+POPULAR = (
+    "INSERT INTO agendamento_busca (rowid, cliente, servicos, observacao) "
+    "SELECT a.id, COALESCE(u.full_name, '') || ' ' || COALESCE(u.phone, ''), "
+    "COALESCE((SELECT group_concat(s.nome, ' ') FROM appointments_agendamento_servicos x "
+    "JOIN cadastro_servico s ON s.id = x.servico_id WHERE x.agendamento_id = a.id), ''), "
+    "a.observacao "
+    "FROM appointments_agendamento a JOIN accounts_user u ON u.id = a.cliente_id"
+)
+
+
+def criar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(CRIAR)
+    schema_editor.execute(POPULAR)
+
+
+def remover_indice(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS agendamento_busca")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0007_agendamento_historico_idx'),
+        ('cadastro', '0006_formapagamento_loja_pagamentos_aceitos_lojahorario'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0008_agendamento_busca'),
+        ('cadastro', '0006_formapagamento_loja_pagamentos_aceitos_lojahorario'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgendamentoArquivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('duracao_total_minutos', models.PositiveIntegerField(default=0)),
+                ('data', models.DateField()),
+                ('hora', models.TimeField()),
+                ('criado_em', models.DateTimeField()),
+                ('confirmado', models.BooleanField(default=False)),
+                ('no_show', models.BooleanField(default=False)),
+                ('valor_final', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('teve_desconto', models.BooleanField(default=False)),
+                ('forma_pagamento', models.CharField(blank=True, choices=[('pix', 'PIX'), ('debito', 'Débito'), ('dinheiro', 'Dinheiro'), ('credito', 'Cartão de Crédito')], max_length=20, null=True)),
+                ('observacao', models.TextField(blank=True)),
+                ('finalizado_em', models.DateTimeField(blank=True, null=True)),
+                ('arquivado_em', models.DateTimeField(auto_now_add=True)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='agendamentos_arquivados', to=settings.AUTH_USER_MODEL)),
+                ('funcionario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='agendamentos_arquivados', to='cadastro.funcionario')),
+                ('loja', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='agendamentos_arquivados', to='cadastro.loja')),
+                ('servicos', models.ManyToManyField(related_name='agendamentos_arquivados', to='cadastro.servico')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['data', 'hora', 'id'], name='arquivado_data_hora_id_idx'), models.Index(fields=['cliente', 'data'], name='arquivado_cliente_data_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0009_agendamentoarquivado'),
+        ('cadastro', '0007_cliente_busca'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agendamento',
+            index=models.Index(fields=['loja', 'data', 'confirmado', 'no_show'], name='agendamento_loja_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='agendamento',
+            index=models.Index(condition=models.Q(('confirmado', False), ('no_show', False)), fields=['loja', 'data'], name='agendamento_pendente_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='agendamento',
+            index=models.Index(fields=['funcionario', 'data'], name='agendamento_func_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='agendamento',
+            index=models.Index(fields=['cliente', '-data', '-hora'], name='agendamento_cliente_data_idx'),
+        ),
+        # os compostos acima cobrem as FKs: sai o índice próprio de cada uma
+        migrations.AlterField(
+            model_name='agendamento',
+            name='cliente',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='agendamentos', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='agendamento',
+            name='funcionario',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='agendamentos', to='cadastro.funcionario'),
+        ),
+        migrations.AlterField(
+            model_name='agendamento',
+            name='loja',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='agendamentos', to='cadastro.loja'),
+        ),
+    ]
@@ -1,17 +1,27 @@
 from django.db import models
 from django.conf import settings
+from django.db import transaction
 from django.db.models import Sum
-from django.db.models.signals import m2m_changed
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
+from django.utils import timezone
+
+from . import busca
 
 class Agendamento(models.Model):
+    # sem índice próprio nas FKs: os compostos de Meta.indexes começam por elas
     cliente = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        related_name="agendamentos"
+        related_name="agendamentos",
+        db_index=False,
+    )
+    loja = models.ForeignKey(
+        "cadastro.Loja", on_delete=models.CASCADE, related_name="agendamentos", db_index=False
+    )
+    funcionario = models.ForeignKey(
+        "cadastro.Funcionario", on_delete=models.CASCADE, related_name="agendamentos", db_index=False
     )
-    loja = models.ForeignKey("cadastro.Loja", on_delete=models.CASCADE, related_name="agendamentos")
-    funcionario = models.ForeignKey("cadastro.Funcionario", on_delete=models.CASCADE, related_name="agendamentos")
     servicos = models.ManyToManyField("cadastro.Servico", related_name="agendamentos")
 
     duracao_total_minutos = models.PositiveIntegerField(default=0)
@@ -39,6 +49,33 @@ class Agendamento(models.Model):
     observacao = models.TextField(blank=True)
     finalizado_em = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # ordem e cursor do histórico (keyset em data, hora, id)
+            models.Index(fields=["data", "hora", "id"], name="agendamento_data_hora_id_idx"),
+            # calendário/contadores por loja e dia (também loja__owner + data)
+            models.Index(fields=["loja", "data", "confirmado", "no_show"], name="agendamento_loja_data_idx"),
+            # só os pendentes: bem menor que a tabela, que cresce com os finalizados
+            models.Index(
+                fields=["loja", "data"], name="agendamento_pendente_idx",
+                condition=models.Q(confirmado=False, no_show=False),
+            ),
+            # slots e ocupação por profissional
+            models.Index(fields=["funcionario", "data"], name="agendamento_func_data_idx"),
+            # painel do cliente, já na ordem de exibição
+            models.Index(fields=["cliente", "-data", "-hora"], name="agendamento_cliente_data_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # guarda o dia carregado: se o agendamento for remarcado, o dia antigo
+        # também precisa sair do cache do dashboard
+        instance._dia_original = (instance.__dict__.get("loja_id"), instance.__dict__.get("data"))
+        # e o estado carregado, para publicar só as transições (finalizado/no-show)
+        instance._estado_original = (instance.__dict__.get("confirmado"), instance.__dict__.get("no_show"))
+        return instance
+
     def __str__(self):
         nomes = ", ".join(s.nome for s in self.servicos.all()[:3])
         if self.servicos.count() > 3:
@@ -46,6 +83,52 @@ class Agendamento(models.Model):
         return f"{self.cliente.full_name} – {nomes} ({self.data} {self.hora:%H:%M})"
 
 
+class AgendamentoArquivado(models.Model):
+    """
+    Agendamento finalizado ou no-show antigo, movido da tabela principal por
+    ``arquivo.arquivar``. Mantém o id original: cursores do histórico e a
+    entrada no índice de busca (que também lê esta tabela) continuam valendo.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    cliente = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="agendamentos_arquivados"
+    )
+    loja = models.ForeignKey("cadastro.Loja", on_delete=models.CASCADE, related_name="agendamentos_arquivados")
+    funcionario = models.ForeignKey("cadastro.Funcionario", on_delete=models.CASCADE, related_name="agendamentos_arquivados")
+    servicos = models.ManyToManyField("cadastro.Servico", related_name="agendamentos_arquivados")
+
+    duracao_total_minutos = models.PositiveIntegerField(default=0)
+
+    data = models.DateField()
+    hora = models.TimeField()
+
+    criado_em = models.DateTimeField()
+    confirmado = models.BooleanField(default=False)
+    no_show = models.BooleanField(default=False)
+
+    valor_final = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True
+    )
+    teve_desconto = models.BooleanField(default=False)
+    forma_pagamento = models.CharField(
+        max_length=20, choices=Agendamento.FormaPagamento.choices, blank=True, null=True
+    )
+    observacao = models.TextField(blank=True)
+    finalizado_em = models.DateTimeField(blank=True, null=True)
+    arquivado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["data", "hora", "id"], name="arquivado_data_hora_id_idx"),
+            models.Index(fields=["cliente", "data"], name="arquivado_cliente_data_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.cliente.full_name} ({self.data} {self.hora:%H:%M}, arquivado)"
+
+
 @receiver(m2m_changed, sender=Agendamento.servicos.through)
 def atualizar_duracao_total(sender, instance: Agendamento, action, **kwargs):
     """Atualiza ``duracao_total_minutos`` ao alterar os serviços do agendamento."""
@@ -53,3 +136,84 @@ def atualizar_duracao_total(sender, instance: Agendamento, action, **kwargs):
         total = instance.servicos.aggregate(total=Sum("duracao_minutos"))
         instance.duracao_total_minutos = total["total"] or 0
         instance.save(update_fields=["duracao_total_minutos"])
+        busca.indexar([instance.pk])
+
+
+@receiver(post_save, sender=Agendamento)
+@receiver(post_delete, sender=Agendamento)
+def invalidar_dashboard(sender, instance: Agendamento, **kwargs):
+    """
+    Toda alteração descarta os painéis em cache da loja; alterações em dias já
+    fechados também descartam os agregados desses dias.
+    """
+    from apps.accounts.dashboard import invalidar_dia, invalidar_paineis
+
+    hoje = timezone.localdate()
+    dias = {(instance.loja_id, instance.data), getattr(instance, "_dia_original", (None, None))}
+    for loja_id in {l for l, _ in dias if l}:
+        invalidar_paineis(loja_id)
+    for loja_id, dia in dias:
+        if loja_id and dia and dia < hoje:
+            invalidar_dia(loja_id, dia)
+
+
+@receiver(post_save, sender=Agendamento)
+def publicar_evento_agendamento(sender, instance: Agendamento, created, **kwargs):
+    """Publica criação, finalização e no-show para o calendário ao vivo (SSE)."""
+    from .eventos import publicar
+
+    confirmado_antes, no_show_antes = getattr(instance, "_estado_original", (False, False))
+    if created:
+        tipo = "criado"
+    elif instance.no_show and not no_show_antes:
+        tipo = "no_show"
+    elif instance.confirmado and not confirmado_antes:
+        tipo = "finalizado"
+    else:
+        return
+    instance._estado_original = (instance.confirmado, instance.no_show)
+
+    dados = {
+        "id": instance.pk,
+        "data": str(instance.data),
+        "hora": str(instance.hora)[:5],
+        "funcionario": instance.funcionario_id,
+    }
+    transaction.on_commit(lambda: publicar(instance.loja_id, tipo, **dados))
+
+
+@receiver(post_save, sender=Agendamento)
+def indexar_busca(sender, instance: Agendamento, update_fields=None, **kwargs):
+    """Mantém o índice de busca do histórico (cliente, serviços, observação)."""
+    if update_fields is not None and not {"cliente", "observacao"} & set(update_fields):
+        return
+    busca.indexar([instance.pk])
+
+
+@receiver(post_delete, sender=Agendamento)
+@receiver(post_delete, sender=AgendamentoArquivado)
+def remover_busca(sender, instance, **kwargs):
+    busca.remover([instance.pk])
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def reindexar_cliente(sender, instance, created, update_fields=None, **kwargs):
+    """Nome ou telefone do cliente alterado: reindexa os agendamentos dele."""
+    if update_fields is not None and not {"full_name", "phone"} & set(update_fields):
+        return
+    # compara com o carregado do banco (``User.from_db``); sem ele, reindexa por garantia
+    atual = (instance.__dict__.get("full_name"), instance.__dict__.get("phone"))
+    mudou = not created and getattr(instance, "_busca_original", None) != atual
+    instance._busca_original = atual
+    if mudou:
+        busca.indexar_por("cliente_id", instance.pk)
+
+
+@receiver(post_save, sender="cadastro.Servico")
+def reindexar_servico(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and "nome" not in update_fields:
+        return
+    mudou = not created and getattr(instance, "_nome_original", None) != instance.nome
+    instance._nome_original = instance.nome
+    if mudou:
+        busca.indexar_por("servico_id", instance.pk)
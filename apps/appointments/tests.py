@@ -1,16 +1,29 @@
-from datetime import date, time
+from datetime import date, time, timedelta
+from unittest import mock, skipUnless
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.utils import timezone
+from django.urls import reverse
 
 from apps.cadastro.models import (
     Loja,
     LojaAgendamentoConfig,
     Funcionario,
     FuncionarioAgendaSemanal,
+    FuncionarioAgendaExcecao,
     Servico,
 )
-from .utils import gerar_slots_disponiveis
+from . import arquivo, busca
+from .models import Agendamento, AgendamentoArquivado
+from .utils import (
+    calcular_ocupacao,
+    distribuir_em_faixas,
+    gerar_slots_disponiveis,
+    semana_por_profissional,
+)
 
 
 class SlotDisponivelTests(TestCase):
@@ -71,3 +84,371 @@ class SlotDisponivelTests(TestCase):
         slots = gerar_slots_disponiveis(self.funcionario, date(2024, 1, 1))
         horas = [s.time() for s in slots]
         self.assertEqual(horas, [time(9, 30)])
+
+
+class OcupacaoTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.owner = User.objects.create_user(
+            email="ocupacao@example.com", username="ocupacao", password="123", is_owner=True
+        )
+        self.loja = Loja.objects.create(owner=self.owner, nome="Loja Ocupação")
+        LojaAgendamentoConfig.objects.create(loja=self.loja, slot_interval_minutes=30)
+        self.funcionario = Funcionario.objects.create(loja=self.loja, nome="Ana")
+        # segunda: 09h-13h com almoço 11h-12h => 180 min disponíveis
+        FuncionarioAgendaSemanal.objects.create(
+            funcionario=self.funcionario, weekday=0, inicio=time(9, 0), fim=time(13, 0),
+            almoco_inicio=time(11, 0), almoco_fim=time(12, 0),
+        )
+        self.servico = Servico.objects.create(
+            loja=self.loja, nome="Corte", duracao_minutos=90, preco=10
+        )
+
+    def _agenda(self, dia, hora, **kwargs):
+        ag = self.funcionario.agendamentos.create(
+            cliente=self.owner, loja=self.loja, data=dia, hora=hora, **kwargs
+        )
+        ag.servicos.add(self.servico)
+        return ag
+
+    def test_ocupacao_desconta_almoco_e_no_show(self):
+        segunda = date(2024, 1, 1)
+        self._agenda(segunda, time(10, 30))              # 10:30-12:00, almoço fora
+        self._agenda(segunda, time(12, 0), no_show=True)  # não conta
+
+        funcionarios = list(
+            Funcionario.objects.select_related("loja__agendamento_config").filter(pk=self.funcionario.pk)
+        )
+        with self.assertNumQueries(3):
+            res = calcular_ocupacao(funcionarios, segunda, date(2024, 1, 7))
+
+        self.assertEqual(res["disponivel"], 180)
+        self.assertEqual(res["ocupado"], 30)
+        self.assertEqual(res["dias"][0], {
+            "data": segunda, "disponivel": 180, "ocupado": 30, "percentual": 30 / 180 * 100,
+        })
+        self.assertTrue(all(d["disponivel"] == 0 for d in res["dias"][1:]))
+        horas = {h["hora"]: (h["disponivel"], h["ocupado"]) for h in res["horas"]}
+        self.assertEqual(horas, {9: (60, 0), 10: (60, 30), 12: (60, 0)})
+
+    def test_excecao_substitui_agenda_semanal(self):
+        FuncionarioAgendaExcecao.objects.create(
+            funcionario=self.funcionario, data=date(2024, 1, 8), is_day_off=True
+        )
+        FuncionarioAgendaExcecao.objects.create(
+            funcionario=self.funcionario, data=date(2024, 1, 15), inicio=time(8, 0)
+        )
+        res = calcular_ocupacao([self.funcionario], date(2024, 1, 8), date(2024, 1, 15))
+        dias = {d["data"]: d["disponivel"] for d in res["dias"]}
+        self.assertEqual(dias[date(2024, 1, 8)], 0)
+        self.assertEqual(dias[date(2024, 1, 15)], 240)
+
+
+class DiaAtualizadoTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.owner = User.objects.create_user(
+            email="oob@example.com", username="oob", password="123", is_owner=True
+        )
+        self.loja = Loja.objects.create(owner=self.owner, nome="Loja OOB")
+        self.funcionario = Funcionario.objects.create(loja=self.loja, nome="Bia")
+        self.dia = date(2024, 3, 12)
+        self.ags = [
+            self.funcionario.agendamentos.create(
+                cliente=self.owner, loja=self.loja, data=self.dia, hora=time(h, 0)
+            )
+            for h in (9, 10)
+        ]
+        # outro dia do mesmo mês: conta no total de pendentes, mas não é renderizado
+        self.funcionario.agendamentos.create(
+            cliente=self.owner, loja=self.loja, data=date(2024, 3, 20), hora=time(9, 0)
+        )
+        self.client.force_login(self.owner)
+
+    def test_no_show_devolve_somente_o_dia_e_o_contador(self):
+        url = reverse("appointments:marcar_no_show", args=[self.ags[0].pk])
+        response = self.client.post(url, {
+            "loja_filtro": self.loja.pk, "view": "month", "y": 2024, "m": 3,
+        })
+        self.assertEqual(response["HX-Reswap"], "none")
+        html = response.content.decode()
+        self.assertIn('id="ag-dia-2024-03-12" data-dia="2024-03-12" hx-swap-oob="true"', html)
+        self.assertNotIn(f'data-agendamento="{self.ags[0].pk}"', html)
+        self.assertIn(f'data-agendamento="{self.ags[1].pk}"', html)
+        self.assertIn('<span id="ag-pendentes" hx-swap-oob="true">2</span>', html)
+
+    def test_dia_fora_da_tela_nao_renderiza_nada(self):
+        url = reverse("appointments:marcar_no_show", args=[self.ags[0].pk])
+        response = self.client.post(url, {
+            "loja_filtro": self.loja.pk, "view": "day", "d": "2024-03-13",
+        })
+        self.assertEqual(response.content, b"")
+        self.assertIn("show-toast", response["HX-Trigger"])
+
+
+class SemanaPorProfissionalTests(TestCase):
+    def test_distribuir_em_faixas_reaproveita_faixas_livres(self):
+        # 9:00-10:30 e 9:30-10:00 se sobrepõem; 10:00 e 10:30 reaproveitam faixas
+        faixas, total = distribuir_em_faixas([(600, 630), (540, 630), (570, 600), (630, 660)])
+        self.assertEqual(total, 2)
+        self.assertEqual(faixas, [1, 0, 1, 0])
+        self.assertEqual(distribuir_em_faixas([]), ([], 0))
+
+    def test_semana_em_uma_consulta_de_agendamentos(self):
+        User = get_user_model()
+        owner = User.objects.create_user(
+            email="semana@example.com", username="semana", password="123", is_owner=True
+        )
+        loja = Loja.objects.create(owner=owner, nome="Loja Semana")
+        LojaAgendamentoConfig.objects.create(loja=loja, slot_interval_minutes=30)
+        ana = Funcionario.objects.create(loja=loja, nome="Ana")
+        Funcionario.objects.create(loja=loja, nome="Bia")
+        FuncionarioAgendaSemanal.objects.create(
+            funcionario=ana, weekday=0, inicio=time(9, 0), fim=time(17, 30)
+        )
+        segunda = date(2024, 1, 1)
+        for hora in (time(9, 0), time(9, 0), time(10, 0)):
+            ana.agendamentos.create(cliente=owner, loja=loja, data=segunda, hora=hora)
+        ana.agendamentos.create(cliente=owner, loja=loja, data=segunda, hora=time(11, 0), no_show=True)
+
+        loja = Loja.objects.select_related("agendamento_config").get(pk=loja.pk)
+        # agendamentos, funcionários e o eixo de horas
+        with self.assertNumQueries(3):
+            semana = semana_por_profissional([loja], segunda, segunda + timedelta(days=6))
+
+        self.assertEqual([f.nome for f in semana["funcionarios"]], ["Ana", "Bia"])
+        self.assertEqual(semana["horas"][0]["hora"], 9)
+        self.assertEqual(semana["horas"][-1]["hora"], 17)
+        self.assertEqual(semana["total_pendentes"], 3)
+        celula = semana["linhas"][0]["celulas"][0]
+        self.assertEqual(celula["altura"], "4.50")      # duas faixas
+        self.assertEqual([c["top"] for c in celula["caixas"]], ["0.00", "2.25", "0.00"])
+        self.assertEqual(celula["caixas"][0]["left"], "0.000")
+        self.assertEqual(celula["caixas"][0]["fim"], "09:30")
+        self.assertEqual(semana["linhas"][1]["celulas"][0]["caixas"], [])
+
+
+class BuscaHistoricoTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        owner = User.objects.create_user(
+            email="busca@example.com", username="busca", password="123", is_owner=True
+        )
+        self.cliente = User.objects.create_user(
+            email="jose@example.com", username="jose", password="123",
+            is_client=True, full_name="José Araújo",
+        )
+        loja = Loja.objects.create(owner=owner, nome="Loja Busca")
+        func = Funcionario.objects.create(loja=loja, nome="Ana")
+        self.servico = Servico.objects.create(loja=loja, nome="Corte degradê", preco=40)
+        self.ag = Agendamento.objects.create(
+            cliente=self.cliente, loja=loja, funcionario=func,
+            data=date(2024, 3, 1), hora=time(9, 0), observacao="Cliente prefere máquina 2",
+        )
+        self.ag.servicos.set([self.servico])
+        self.outro = Agendamento.objects.create(
+            cliente=owner, loja=loja, funcionario=func, data=date(2024, 3, 1), hora=time(10, 0),
+        )
+
+    def _ids(self, termo):
+        return list(busca.filtrar(Agendamento.objects.all(), termo).values_list("id", flat=True))
+
+    def test_busca_por_prefixo_sem_acentos(self):
+        self.assertEqual(self._ids("jose arau"), [self.ag.id])
+        self.assertEqual(self._ids("degrade"), [self.ag.id])
+        self.assertEqual(self._ids("maquina"), [self.ag.id])
+        self.assertEqual(self._ids("jose barba"), [])
+        self.assertEqual(len(self._ids("")), 2)
+
+    def test_sinais_mantem_o_indice(self):
+        self.servico.nome = "Pigmentação"
+        self.servico.save()
+        self.assertEqual(self._ids("pigment"), [self.ag.id])
+        self.assertEqual(self._ids("degrade"), [])
+
+        self.cliente.full_name = "José Lima"
+        self.cliente.save()
+        self.assertEqual(self._ids("lima"), [self.ag.id])
+
+        self.ag.delete()
+        self.assertEqual(self._ids("lima"), [])
+
+    def test_so_reindexa_quando_nome_ou_telefone_mudam(self):
+        servico = Servico.objects.get(pk=self.servico.pk)
+        cliente = get_user_model().objects.get(pk=self.cliente.pk)
+        with mock.patch.object(busca, "indexar_por") as indexar_por:
+            servico.preco = 45
+            servico.save()
+            cliente.email = "jose.araujo@example.com"
+            cliente.save()
+            self.assertFalse(indexar_por.called)
+
+            servico.nome = "Navalhado"
+            servico.save()
+            cliente.phone = "+5585999990000"
+            cliente.save()
+            servico.save()
+        self.assertEqual(indexar_por.call_args_list, [
+            mock.call("servico_id", servico.pk), mock.call("cliente_id", cliente.pk),
+        ])
+
+    def test_reconstruir_apos_bulk_create(self):
+        novo, = Agendamento.objects.bulk_create([Agendamento(
+            cliente=self.cliente, loja=self.ag.loja, funcionario=self.ag.funcionario,
+            data=date(2024, 3, 2), hora=time(9, 0), observacao="retoque",
+        )])
+        self.assertEqual(self._ids("retoque"), [])
+        busca.reconstruir()
+        self.assertEqual(self._ids("retoque"), [novo.id])
+
+
+class ArquivoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        User = get_user_model()
+        owner = User.objects.create_user(
+            email="arq@example.com", username="arq", password="123", is_owner=True
+        )
+        self.loja = loja = Loja.objects.create(owner=owner, nome="Loja Arquivo")
+        self.func = func = Funcionario.objects.create(loja=loja, nome="Ana")
+        corte = Servico.objects.create(loja=loja, nome="Corte", preco=30)
+        self.antigo = antigo = timezone.localdate() - timedelta(days=400)
+        self.finalizados = []
+        for hora in (9, 10, 11):
+            ag = Agendamento.objects.create(
+                cliente=owner, loja=loja, funcionario=func, data=antigo, hora=time(hora, 0),
+                confirmado=True, valor_final=30, observacao="barba feita",
+            )
+            ag.servicos.set([corte])
+            self.finalizados.append(ag.id)
+        self.no_show = Agendamento.objects.create(
+            cliente=owner, loja=loja, funcionario=func, data=antigo, hora=time(14, 0), no_show=True,
+        ).id
+        self.pendente = Agendamento.objects.create(
+            cliente=owner, loja=loja, funcionario=func, data=antigo, hora=time(15, 0),
+        ).id
+        self.recente = Agendamento.objects.create(
+            cliente=owner, loja=loja, funcionario=func, data=timezone.localdate() - timedelta(days=5),
+            hora=time(9, 0), confirmado=True, valor_final=30,
+        ).id
+
+    def test_move_em_lotes_e_retoma(self):
+        self.assertIsNone(arquivo.limite())
+        # interrompido depois de um lote: a próxima execução continua
+        self.assertEqual(arquivo.arquivar(tamanho=2, max_lotes=1), 2)
+        self.assertEqual(arquivo.arquivar(tamanho=2), 2)
+        self.assertEqual(arquivo.arquivar(tamanho=2), 0)
+
+        movidos = sorted(self.finalizados + [self.no_show])
+        self.assertEqual(list(AgendamentoArquivado.objects.order_by("id").values_list("id", flat=True)), movidos)
+        self.assertEqual(
+            sorted(Agendamento.objects.values_list("id", flat=True)), [self.pendente, self.recente]
+        )
+        arquivado = AgendamentoArquivado.objects.get(pk=self.finalizados[0])
+        self.assertEqual([s.nome for s in arquivado.servicos.all()], ["Corte"])
+        self.assertEqual(arquivo.limite(), arquivado.data)
+
+        # mesmo id: o índice de busca continua encontrando o agendamento arquivado
+        encontrados = busca.filtrar(AgendamentoArquivado.objects.all(), "barba")
+        self.assertEqual(sorted(encontrados.values_list("id", flat=True)), self.finalizados)
+
+    def test_busca_alcanca_arquivados_apos_reconstruir_e_renomear(self):
+        arquivo.arquivar()
+        busca.reconstruir()
+        arquivados = AgendamentoArquivado.objects.all()
+        # reconstruído só da tabela principal, o arquivado sumiria da busca
+        self.assertEqual(sorted(busca.filtrar(arquivados, "barba").values_list("id", flat=True)), self.finalizados)
+        cliente = AgendamentoArquivado.objects.get(pk=self.finalizados[0]).cliente
+        cliente.full_name = "Novo Nome"
+        cliente.save()
+        esperados = sorted(self.finalizados + [self.no_show])
+        self.assertEqual(sorted(busca.filtrar(arquivados, "novo").values_list("id", flat=True)), esperados)
+        self.assertEqual(sorted(busca.filtrar(arquivados, "corte").values_list("id", flat=True)), self.finalizados)
+
+        AgendamentoArquivado.objects.filter(pk=self.no_show).delete()
+        self.assertNotIn(self.no_show, busca.filtrar(arquivados, "novo").values_list("id", flat=True))
+
+    def test_ocupacao_e_semana_leem_o_arquivo(self):
+        FuncionarioAgendaSemanal.objects.create(
+            funcionario=self.func, weekday=self.antigo.weekday(), inicio=time(9, 0), fim=time(17, 0)
+        )
+
+        def medir():
+            ocupacao = calcular_ocupacao([self.func], self.antigo, self.antigo)
+            semana = semana_por_profissional([self.loja], self.antigo, self.antigo)
+            caixas = [cx["a"].id for c in semana["linhas"][0]["celulas"] for cx in c["caixas"]]
+            return ocupacao["percentual"], caixas
+
+        antes = medir()
+        self.assertGreater(antes[0], 0)
+        arquivo.arquivar()
+        self.assertEqual(medir(), antes)
+
+    def test_mais_recentes_intercala_as_tabelas(self):
+        arquivo.arquivar()
+        qs = [
+            m.objects.order_by("-data", "-hora", "-id")
+            for m in (Agendamento, AgendamentoArquivado)
+        ]
+        ids = [a.id for a in arquivo.mais_recentes(qs, 3)]
+        self.assertEqual(ids, [self.recente, self.pendente, self.no_show])
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN é do SQLite")
+class IndicesAgendamentoTests(TestCase):
+    """As consultas quentes de Agendamento continuam usando os índices de Meta."""
+
+    dia = date(2024, 1, 1)
+
+    def plano(self, qs):
+        return qs.explain()
+
+    def assertUsaIndice(self, qs, indice):
+        plano = self.plano(qs)
+        self.assertIn(f"USING INDEX {indice}", plano, plano)
+        self.assertNotIn("SCAN appointments_agendamento", plano, plano)
+
+    def test_pendentes_por_loja_usam_indice_parcial(self):
+        qs = Agendamento.objects.filter(
+            loja_id__in=[1, 2], data__range=[self.dia, self.dia + timedelta(days=6)],
+            confirmado=False, no_show=False,
+        )
+        self.assertUsaIndice(qs, "agendamento_pendente_idx")
+
+    def test_agenda_da_loja_por_periodo(self):
+        qs = Agendamento.objects.filter(
+            loja__in=[1], data__range=[self.dia, self.dia + timedelta(days=6)], no_show=False,
+        )
+        self.assertUsaIndice(qs, "agendamento_loja_data_idx")
+
+    def test_slots_do_profissional_no_dia(self):
+        qs = Agendamento.objects.filter(funcionario=1, data=self.dia)
+        self.assertUsaIndice(qs, "agendamento_func_data_idx")
+
+    def test_ocupacao_da_semana_por_profissional(self):
+        qs = Agendamento.objects.filter(
+            funcionario_id__in=[1, 2], data__range=[self.dia, self.dia + timedelta(days=6)], no_show=False,
+        )
+        self.assertUsaIndice(qs, "agendamento_func_data_idx")
+
+    def test_painel_do_cliente_sem_ordenacao_temporaria(self):
+        qs = Agendamento.objects.filter(cliente=1).order_by("-data", "-hora")
+        self.assertUsaIndice(qs, "agendamento_cliente_data_idx")
+        self.assertNotIn("TEMP B-TREE", self.plano(qs))
+
+    def test_fks_sem_indice_redundante(self):
+        with connection.cursor() as cursor:
+            restricoes = connection.introspection.get_constraints(cursor, Agendamento._meta.db_table)
+        indices = [r["columns"] for r in restricoes.values() if r["index"]]
+        for coluna in ("cliente_id", "loja_id", "funcionario_id"):
+            self.assertNotIn([coluna], indices)
+            self.assertTrue(any(c[0] == coluna for c in indices), coluna)
+
+    def test_agenda_do_dono_no_dia(self):
+        # o filtro por dono passa pelo JOIN com a loja; o lado do agendamento
+        # precisa continuar sendo uma busca por data, não uma varredura
+        qs = Agendamento.objects.filter(loja__owner=1, data=self.dia)
+        plano = self.plano(qs)
+        self.assertIn("SEARCH appointments_agendamento USING INDEX", plano, plano)
+        self.assertNotIn("SCAN appointments_agendamento", plano, plano)
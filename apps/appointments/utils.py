@@ -1,7 +1,11 @@
+import heapq
 from datetime import datetime, timedelta, time, date
+from django.db.models import Count, Max, Min, Q
 from django.utils.timezone import make_aware
 from django.utils import timezone
 
+from apps.accounts.cronometro import cronometrado
+
 def _time_ranges_minus_lunch(start: time, end: time, lunch_start: time | None, lunch_end: time | None):
     """
     Retorna uma lista de janelas [(start,end), ...] excluindo o almoço, se houver.
@@ -65,6 +69,7 @@ def get_applicable_schedule(funcionario, dia: date):
     return (weekly.inicio, weekly.fim, weekly.almoco_inicio, weekly.almoco_fim, interval, tz)
 
 
+@cronometrado("slots")
 def gerar_slots_disponiveis(funcionario, dia: date) -> list[datetime]:
     """
     Gera a lista de *inícios de slots* (timezone-aware) disponíveis para o
@@ -107,3 +112,342 @@ def gerar_slots_disponiveis(funcionario, dia: date) -> list[datetime]:
             slots_ok.append(s)
 
     return slots_ok
+
+
+# ---------- Ocupação (utilização da agenda) ----------
+#
+# Cada dia de cada funcionário vira um bitset de minutos (um ``int`` de 1440
+# bits): disponibilidade e reservas são montadas com operações de bits e a
+# ocupação é ``(disponivel & reservado).bit_count()``. As agendas semanais,
+# exceções e agendamentos do intervalo são carregados em três consultas, sem
+# chamar ``get_applicable_schedule`` dia a dia.
+
+_MINUTOS_DIA = 24 * 60
+_MASCARA_HORA = (1 << 60) - 1
+
+
+def _minuto(t: time) -> int:
+    return t.hour * 60 + t.minute
+
+
+def _faixa(inicio_min: int, fim_min: int) -> int:
+    """Bitset com os minutos ``[inicio_min, fim_min)`` ligados."""
+    inicio_min = max(0, min(inicio_min, _MINUTOS_DIA))
+    fim_min = max(0, min(fim_min, _MINUTOS_DIA))
+    if fim_min <= inicio_min:
+        return 0
+    return ((1 << fim_min) - 1) ^ ((1 << inicio_min) - 1)
+
+
+def _janela_do_dia(weekly, exc, intervalo_loja):
+    """
+    Mesmas regras de ``get_applicable_schedule`` (exceção > semanal), a partir
+    de objetos já carregados. Retorna (inicio, fim, almoco_inicio, almoco_fim,
+    intervalo) ou None.
+    """
+    if exc:
+        if exc.is_day_off:
+            return None
+        start = exc.inicio or (weekly.inicio if weekly else None)
+        end = exc.fim or (weekly.fim if weekly else None)
+        if not (start and end):
+            return None
+        lunch_s = exc.almoco_inicio or (weekly.almoco_inicio if weekly else None)
+        lunch_e = exc.almoco_fim or (weekly.almoco_fim if weekly else None)
+        interval = (
+            exc.slot_interval_minutes
+            or (weekly.slot_interval_minutes if weekly else None)
+            or intervalo_loja
+        )
+        return (start, end, lunch_s, lunch_e, interval)
+    if not weekly:
+        return None
+    return (weekly.inicio, weekly.fim, weekly.almoco_inicio, weekly.almoco_fim,
+            weekly.slot_interval_minutes or intervalo_loja)
+
+
+def _percentual(ocupado: int, disponivel: int) -> float:
+    return (ocupado / disponivel * 100) if disponivel else 0.0
+
+
+@cronometrado("slots")
+def calcular_ocupacao(funcionarios, inicio: date, fim: date) -> dict:
+    """
+    Ocupação dos ``funcionarios`` em ``[inicio, fim]``: minutos reservados
+    dentro da agenda / minutos disponíveis (agenda semanal, exceções e almoço).
+
+    Agendamentos marcados como no-show não contam como ocupação; agendamentos
+    sem serviços ocupam um intervalo de slot. Intervalos que alcançam o
+    arquivo também leem ``AgendamentoArquivado``.
+
+    Retorna totais gerais e quebras por dia, por hora do dia e por funcionário.
+    """
+    from apps.cadastro.models import FuncionarioAgendaExcecao, FuncionarioAgendaSemanal
+    from . import arquivo
+    from .models import Agendamento, AgendamentoArquivado
+
+    funcionarios = list(funcionarios)
+    func_ids = [f.id for f in funcionarios]
+    dias = [inicio + timedelta(days=i) for i in range((fim - inicio).days + 1)]
+
+    semanais = {
+        (a.funcionario_id, a.weekday): a
+        for a in FuncionarioAgendaSemanal.objects.filter(funcionario_id__in=func_ids, ativo=True).order_by()
+    }
+    excecoes = {
+        (e.funcionario_id, e.data): e
+        for e in FuncionarioAgendaExcecao.objects.filter(
+            funcionario_id__in=func_ids, data__range=[inicio, fim]
+        ).order_by()
+    }
+    reservas = {}
+    modelos = [Agendamento, AgendamentoArquivado] if arquivo.alcanca(inicio) else [Agendamento]
+    for modelo in modelos:
+        for r in (modelo.objects
+                  .filter(funcionario_id__in=func_ids, data__range=[inicio, fim], no_show=False)
+                  .values_list("funcionario_id", "data", "hora", "duracao_total_minutos")):
+            reservas.setdefault((r[0], r[1]), []).append((r[2], r[3]))
+
+    por_dia = {d: [0, 0] for d in dias}            # [disponível, ocupado]
+    por_hora = [[0, 0] for _ in range(24)]
+    por_func = {f.id: [0, 0] for f in funcionarios}
+
+    for func in funcionarios:
+        config = getattr(func.loja, "agendamento_config", None)
+        intervalo_loja = getattr(config, "slot_interval_minutes", 15)
+        for dia in dias:
+            janela = _janela_do_dia(
+                semanais.get((func.id, dia.weekday())), excecoes.get((func.id, dia)), intervalo_loja
+            )
+            if not janela:
+                continue
+            start, end, lunch_s, lunch_e, intervalo = janela
+
+            disponivel = _faixa(_minuto(start), _minuto(end))
+            if lunch_s and lunch_e:
+                disponivel &= ~_faixa(_minuto(lunch_s), _minuto(lunch_e))
+
+            reservado = 0
+            for hora, duracao in reservas.get((func.id, dia), ()):
+                ini = _minuto(hora)
+                reservado |= _faixa(ini, ini + (duracao or intervalo))
+            ocupado = disponivel & reservado
+
+            disp_min, ocup_min = disponivel.bit_count(), ocupado.bit_count()
+            por_dia[dia][0] += disp_min
+            por_dia[dia][1] += ocup_min
+            por_func[func.id][0] += disp_min
+            por_func[func.id][1] += ocup_min
+            for h in range(_minuto(start) // 60, min(24, (_minuto(end) + 59) // 60)):
+                por_hora[h][0] += ((disponivel >> (h * 60)) & _MASCARA_HORA).bit_count()
+                por_hora[h][1] += ((ocupado >> (h * 60)) & _MASCARA_HORA).bit_count()
+
+    total_disp = sum(v[0] for v in por_dia.values())
+    total_ocup = sum(v[1] for v in por_dia.values())
+    return {
+        "disponivel": total_disp,
+        "ocupado": total_ocup,
+        "percentual": _percentual(total_ocup, total_disp),
+        "dias": [
+            {"data": d, "disponivel": v[0], "ocupado": v[1], "percentual": _percentual(v[1], v[0])}
+            for d, v in por_dia.items()
+        ],
+        "horas": [
+            {"hora": h, "disponivel": v[0], "ocupado": v[1], "percentual": _percentual(v[1], v[0])}
+            for h, v in enumerate(por_hora) if v[0]
+        ],
+        "funcionarios": [
+            {
+                "id": f.id, "nome": f.nome, "cor_hex": f.cor_hex,
+                "disponivel": por_func[f.id][0], "ocupado": por_func[f.id][1],
+                "percentual": _percentual(por_func[f.id][1], por_func[f.id][0]),
+            }
+            for f in funcionarios
+        ],
+    }
+
+
+# ---------- Calendário do dono: modo compacto ----------
+
+COMPACTO_LIMITE = 150  # pendentes no mês acima dos quais o calendário abre compacto
+
+
+def resumo_pendentes_por_dia(pendentes, por_loja: bool = False) -> dict:
+    """
+    Contagem dos agendamentos ``pendentes`` (queryset) por dia e por
+    funcionário (ou por loja, na visão "todas as lojas"), num único GROUP BY,
+    sem instanciar agendamentos.
+
+    Retorna ``{data: {"total": n, "grupos": [{"id", "nome", "cor", "n"}, ...]}}``.
+    """
+    if por_loja:
+        campos = ("data", "loja_id", "loja__nome")
+    else:
+        campos = ("data", "funcionario_id", "funcionario__nome", "funcionario__cor_hex")
+    resumo = {}
+    linhas = (pendentes
+              .values(*campos)
+              .annotate(n=Count("id"))
+              .order_by("data", campos[2]))
+    for linha in linhas:
+        dia = resumo.setdefault(linha["data"], {"total": 0, "grupos": []})
+        dia["total"] += linha["n"]
+        dia["grupos"].append({
+            "id": linha[campos[1]],
+            "nome": linha[campos[2]],
+            "cor": linha.get("funcionario__cor_hex"),
+            "n": linha["n"],
+        })
+    return resumo
+
+
+def pendentes_do_dia(loja_ids, dia: date, compacto: bool = False, todas: bool = False):
+    """
+    Itens de um dia do calendário do dono (``loja_ids``): os agendamentos
+    pendentes ou, no modo compacto, apenas o resumo por funcionário (por loja,
+    com ``todas``). Retorna ``(items, total)``.
+    """
+    from .models import Agendamento
+
+    pendentes = Agendamento.objects.filter(
+        loja_id__in=loja_ids, data=dia, confirmado=False, no_show=False
+    )
+    if compacto:
+        items = resumo_pendentes_por_dia(pendentes, por_loja=todas).get(dia, {"total": 0, "grupos": []})
+        return items, items["total"]
+    relacionados = ("funcionario", "cliente", "loja") if todas else ("funcionario", "cliente")
+    items = list(pendentes
+                 .select_related(*relacionados)
+                 .prefetch_related("servicos")
+                 .order_by("hora", "funcionario__nome"))
+    return items, len(items)
+
+
+# ---------- Calendário do dono: semana por profissional ----------
+
+EIXO_PADRAO = (8, 20)      # horas exibidas quando a loja não tem agenda semanal
+_LINHA_TL_REM = 2.25       # altura de uma faixa na linha do tempo
+
+
+def distribuir_em_faixas(intervalos) -> tuple[list[int], int]:
+    """
+    Distribui ``intervalos`` ``(inicio, fim)`` em faixas sem sobreposição.
+
+    Varredura ordenada por início com duas heaps (faixas ocupadas por fim e
+    faixas livres), O(n log n). Retorna a faixa de cada intervalo, na ordem
+    recebida, e o total de faixas usadas.
+    """
+    ordem = sorted(range(len(intervalos)), key=lambda i: intervalos[i])
+    ocupadas = []   # (fim, faixa)
+    livres = []
+    faixas = [0] * len(intervalos)
+    total = 0
+    for i in ordem:
+        inicio, fim = intervalos[i]
+        while ocupadas and ocupadas[0][0] <= inicio:
+            heapq.heappush(livres, heapq.heappop(ocupadas)[1])
+        if livres:
+            faixa = heapq.heappop(livres)
+        else:
+            faixa, total = total, total + 1
+        faixas[i] = faixa
+        heapq.heappush(ocupadas, (fim, faixa))
+    return faixas, total
+
+
+def eixo_horas(lojas) -> tuple[int, int]:
+    """Horas [inicio, fim) da linha do tempo: da menor entrada à maior saída das lojas."""
+    from apps.cadastro.models import FuncionarioAgendaSemanal
+
+    agg = (FuncionarioAgendaSemanal.objects
+           .filter(funcionario__loja__in=lojas, ativo=True)
+           .aggregate(inicio=Min("inicio"), fim=Max("fim")))
+    if not (agg["inicio"] and agg["fim"]):
+        return EIXO_PADRAO
+    h0 = agg["inicio"].hour
+    h1 = agg["fim"].hour + (1 if agg["fim"].minute else 0)
+    return h0, max(h1, h0 + 1)
+
+
+def semana_por_profissional(lojas, inicio: date, fim: date) -> dict:
+    """
+    Linhas (dias) × colunas (funcionários das ``lojas``) da visão semanal, com
+    as caixas dos agendamentos já posicionadas (``left``/``width`` em % do eixo
+    e faixa).
+
+    Os agendamentos do intervalo vêm de uma única consulta (mais uma no
+    arquivo, se o intervalo o alcança); no-shows ficam de fora.
+    """
+    from apps.cadastro.models import Funcionario
+    from . import arquivo
+    from .models import Agendamento, AgendamentoArquivado
+
+    lojas = list(lojas)
+    modelos = [Agendamento, AgendamentoArquivado] if arquivo.alcanca(inicio) else [Agendamento]
+    agendamentos = sorted(
+        (a for modelo in modelos for a in (
+            modelo.objects
+            .filter(loja__in=lojas, data__range=[inicio, fim], no_show=False)
+            .select_related("cliente")
+            .order_by("data", "hora")
+        )),
+        key=lambda a: (a.data, a.hora),
+    )
+    com_agenda = {a.funcionario_id for a in agendamentos}
+    funcionarios = list(
+        Funcionario.objects
+        .filter(Q(ativo=True) | Q(id__in=com_agenda), loja__in=lojas)
+        .select_related("loja")
+        .order_by("nome", "loja__nome")
+    )
+
+    intervalo_por_loja = {
+        l.id: getattr(getattr(l, "agendamento_config", None), "slot_interval_minutes", 15)
+        for l in lojas
+    }
+    h0, h1 = eixo_horas(lojas)
+    base, span = h0 * 60, (h1 - h0) * 60
+
+    por_celula = {}
+    for a in agendamentos:
+        por_celula.setdefault((a.data, a.funcionario_id), []).append(a)
+
+    linhas = []
+    for n in range((fim - inicio).days + 1):
+        dia = inicio + timedelta(days=n)
+        celulas = []
+        for func in funcionarios:
+            ags = por_celula.get((dia, func.id), [])
+            intervalos = []
+            for a in ags:
+                ini = _minuto(a.hora)
+                intervalos.append((ini, ini + (a.duracao_total_minutos or intervalo_por_loja[a.loja_id])))
+            faixas, total_faixas = distribuir_em_faixas(intervalos)
+
+            caixas = []
+            for a, (ini, fim_min), faixa in zip(ags, intervalos, faixas):
+                # fora do eixo: encosta na borda em vez de sumir
+                esq = min(max(ini - base, 0), span - 1)
+                dir_ = max(min(fim_min - base, span), esq + 1)
+                caixas.append({
+                    "a": a,
+                    "fim": f"{fim_min // 60 % 24:02d}:{fim_min % 60:02d}",
+                    "left": f"{esq / span * 100:.3f}",
+                    "width": f"{(dir_ - esq) / span * 100:.3f}",
+                    "top": f"{faixa * _LINHA_TL_REM:.2f}",
+                })
+            celulas.append({
+                "funcionario": func,
+                "altura": f"{max(total_faixas, 1) * _LINHA_TL_REM:.2f}",
+                "caixas": caixas,
+            })
+        linhas.append({"dia": dia, "celulas": celulas})
+
+    return {
+        "funcionarios": funcionarios,
+        "linhas": linhas,
+        "horas": [
+            {"hora": h, "left": f"{(h - h0) * 60 / span * 100:.3f}"} for h in range(h0, h1)
+        ],
+        "total_pendentes": sum(1 for a in agendamentos if not a.confirmado),
+    }
@@ -1,40 +1,92 @@
 from datetime import date, timedelta
 from calendar import Calendar
 import json 
-from urllib.parse import urlparse, parse_qs
 
 from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, render
 from django.urls import reverse
 from django.utils import timezone
 from django.db.models import Sum
 
 from apps.cadastro.models import Loja, Funcionario, Servico
-from apps.accounts.views import owner_home_agendamentos
 from .models import Agendamento
 from .forms import AgendamentoDataHoraForm, FinalizarAtendimentoForm
-from .utils import gerar_slots_disponiveis
-
-def _inherit_htmx_query(request):
-    """Copia view/d/y/m/loja_filtro do HX-Current-URL (se houver) para request.GET."""
-    
-    hx_url = request.headers.get('HX-Current-URL') or ''
-
-    if not hx_url:
-        return
-
-    parsed = urlparse(hx_url)
-    qs = parse_qs(parsed.query)
-    if not qs:
-        return
-
-    # torne GET mutável e injete apenas chaves que nos interessam
-    mutable = request.GET.copy()
-    for key in ('view', 'd', 'y', 'm', 'loja_filtro'):
-        if key in qs and qs[key]:
-            mutable[key] = qs[key][0]
+from .utils import gerar_slots_disponiveis, pendentes_do_dia, semana_por_profissional
+
+def _dia_atualizado(request, agendamento, mensagem):
+    """
+    Resposta de finalizar / no-show: swaps out-of-band apenas do dia afetado
+    e do contador de pendentes, calculados a partir do próprio dia.
+
+    A tela atual (loja, modo, dia ou mês) vem do formulário
+    ``#filtro-agendamentos``, incluído no POST via ``hx-include``.
+    """
+    dia = agendamento.data
+    modo = request.POST.get("view") if request.POST.get("view") in ("day", "week") else "month"
+    loja_visivel = request.POST.get("loja_filtro") or request.session.get("loja_filtro")
+
+    if modo == "day":
+        inicio = fim = dia if request.POST.get("d") == dia.isoformat() else None
+    elif modo == "week":
+        try:
+            exibido = date.fromisoformat(request.POST.get("d", ""))
+        except ValueError:
+            exibido = dia
+        inicio = exibido - timedelta(days=exibido.weekday())
+        fim = inicio + timedelta(days=6)
+    else:
+        try:
+            current = date(int(request.POST.get("y")), int(request.POST.get("m")), 1)
+        except (TypeError, ValueError):
+            current = dia.replace(day=1)
+        semanas = Calendar(firstweekday=0).monthdatescalendar(current.year, current.month)
+        inicio, fim = semanas[0][0], semanas[-1][-1]
+
+    todas = str(loja_visivel) == "todas"
+    visivel = (
+        inicio is not None and inicio <= dia <= fim
+        and (todas or str(agendamento.loja_id) == str(loja_visivel or agendamento.loja_id))
+    )
+    if visivel:
+        if todas:
+            lojas = list(
+                Loja.objects.filter(owner_id=agendamento.loja.owner_id)
+                .select_related("agendamento_config").order_by("nome")
+            )
+        else:
+            lojas = [agendamento.loja]
+        loja_ids = [l.id for l in lojas]
+        ctx = {"todas": todas, "loja_param": "todas" if todas else agendamento.loja_id}
+
+    if visivel and modo == "week":
+        semana = semana_por_profissional(lojas, dia, dia)
+        total = Agendamento.objects.filter(
+            loja_id__in=loja_ids, data__range=[inicio, fim], confirmado=False, no_show=False
+        ).count()
+        response = render(request, "accounts/partials/agendamento_semana_oob.html", {
+            **ctx, "linha": semana["linhas"][0], "horas": semana["horas"],
+            "today": timezone.localdate(), "total_pendentes": total,
+        })
+    elif visivel:
+        compacto = modo == "month" and request.POST.get("tela_compacta") == "1"
+        items, total_dia = pendentes_do_dia(loja_ids, dia, compacto, todas=todas)
+        total = total_dia if inicio == fim else Agendamento.objects.filter(
+            loja_id__in=loja_ids, data__range=[inicio, fim], confirmado=False, no_show=False
+        ).count()
+        response = render(request, "accounts/partials/agendamento_dia_oob.html", {
+            **ctx, "day": dia, "items": items, "modo": modo, "compacto": compacto,
+            "loja": None if todas else agendamento.loja, "total_pendentes": total,
+        })
+    else:
+        response = HttpResponse("")
 
-    request.GET = mutable
+    response["HX-Reswap"] = "none"
+    response["HX-Trigger"] = json.dumps({
+        "show-toast": {"text": mensagem, "level": "success"},
+        "reload-owner-home": None,
+    })
+    return response
 
 @login_required
 def agendamento_start(request):
@@ -182,7 +234,10 @@ def agendamento_datahora(request):
 
 @login_required
 def agendamento_confirmacao(request, agendamento_id):
-    agendamento = get_object_or_404(Agendamento, id=agendamento_id, cliente=request.user)
+    agendamento = get_object_or_404(
+        Agendamento.objects.select_related("funcionario", "loja").prefetch_related("servicos"),
+        id=agendamento_id, cliente=request.user,
+    )
     if request.headers.get("HX-Request"):
         return render(
             request,
@@ -216,71 +271,7 @@ def finalizar_agendamento(request, pk):
             ag.save()
             form.save_m2m()
 
-            # Re-renderiza o calendário preservando loja e mês/ano atuais
-            lojas = request.user.lojas.order_by("nome")
-            loja_id = request.POST.get("loja_filtro") or request.POST.get("loja")
-            loja = (
-                get_object_or_404(lojas, pk=loja_id)
-                if loja_id
-                else (lojas.first() if lojas.exists() else None)
-            )
-
-            # Determina mês/ano exibidos (enviados como hidden no filtro)
-            try:
-                y = int(request.POST.get("y") or request.POST.get("year") or 0)
-                m = int(request.POST.get("m") or request.POST.get("month") or 0)
-                current = date(y, m, 1)
-            except Exception:
-                today = date.today()
-                current = today.replace(day=1)
-
-            cal = Calendar(firstweekday=0)
-            weeks_dates = cal.monthdatescalendar(current.year, current.month)
-            start, end = weeks_dates[0][0], weeks_dates[-1][-1]
-
-            pendentes_qs = (
-                Agendamento.objects
-                .filter(loja=loja, data__range=[start, end], confirmado=False, no_show=False)
-                .select_related("funcionario", "cliente")
-                .prefetch_related("servicos")
-                .order_by("data", "hora")
-            )
-
-            by_day = {}
-            for a in pendentes_qs:
-                by_day.setdefault(a.data, []).append(a)
-
-            weeks = [[(d, by_day.get(d, [])) for d in week] for week in weeks_dates]
-
-            prev_first = (current.replace(day=1) - timedelta(days=1)).replace(day=1)
-            next_first = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
-
-            ctx = {
-                "lojas": lojas,
-                "loja": loja,
-                "weeks": weeks,
-                "current": current,
-                "today": date.today(),
-                "prev_y": prev_first.year,
-                "prev_m": prev_first.month,
-                "next_y": next_first.year,
-                "next_m": next_first.month,
-                "total_pendentes": pendentes_qs.count(),
-            }
-
-            # >>> herda os parâmetros da tela atual (view=day/d=... ou month/y&m)
-            _inherit_htmx_query(request)
-
-            # >>> delega para a view que renderiza o calendário/lista respeitando o modo atual
-            resp = owner_home_agendamentos(request)
-
-            resp["HX-Retarget"] = "#agendamentos-section"
-            resp["HX-Reswap"]   = "outerHTML"
-            resp["HX-Trigger"]  = json.dumps({
-                "show-toast": {"text": "Atendimento finalizado com sucesso!", "level": "success"},
-                "reload-owner-home": None,
-            })
-            return resp
+            return _dia_atualizado(request, ag, "Atendimento finalizado com sucesso!")
 
     else:
         total = agendamento.servicos.aggregate(total=Sum("preco"))["total"] or 0
@@ -306,65 +297,7 @@ def marcar_no_show(request, pk):
         agendamento.valor_final = 0
         agendamento.save(update_fields=["confirmado", "no_show", "finalizado_em", "valor_final"])
 
-        # Re-renderiza o calendário preservando loja e mês/ano atuais
-        lojas = request.user.lojas.order_by("nome")
-        loja_id = request.POST.get("loja_filtro") or request.POST.get("loja")
-        loja = (
-            get_object_or_404(lojas, pk=loja_id)
-            if loja_id
-            else (lojas.first() if lojas.exists() else None)
-        )
-
-        try:
-            y = int(request.POST.get("y") or request.POST.get("year") or 0)
-            m = int(request.POST.get("m") or request.POST.get("month") or 0)
-            current = date(y, m, 1)
-        except Exception:
-            today = date.today()
-            current = today.replace(day=1)
-
-        cal = Calendar(firstweekday=0)
-        weeks_dates = cal.monthdatescalendar(current.year, current.month)
-        start, end = weeks_dates[0][0], weeks_dates[-1][-1]
-
-        pendentes_qs = (
-            Agendamento.objects
-            .filter(loja=loja, data__range=[start, end], confirmado=False, no_show=False)
-            .select_related("funcionario", "cliente")
-            .prefetch_related("servicos")
-            .order_by("data", "hora")
-        )
-
-        by_day = {}
-        for a in pendentes_qs:
-            by_day.setdefault(a.data, []).append(a)
-
-        weeks = [[(d, by_day.get(d, [])) for d in week] for week in weeks_dates]
-
-        prev_first = (current.replace(day=1) - timedelta(days=1)).replace(day=1)
-        next_first = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
-
-        ctx = {
-            "lojas": lojas,
-            "loja": loja,
-            "weeks": weeks,
-            "current": current,
-            "today": date.today(),
-            "prev_y": prev_first.year,
-            "prev_m": prev_first.month,
-            "next_y": next_first.year,
-            "next_m": next_first.month,
-            "total_pendentes": pendentes_qs.count(),
-        }
-        response = render(request, "accounts/partials/owner_home_agendamentos.html", ctx)
-        response["HX-Retarget"] = "#agendamentos-section"
-        response["HX-Reswap"] = "outerHTML"
-        response['HX-Trigger'] = json.dumps({
-            "show-toast": {"text": "Não comparecimento salvo com sucesso!", "level": "success"},
-            "reload-owner-home": None,
-        })
-
-        return response
+        return _dia_atualizado(request, agendamento, "Não comparecimento salvo com sucesso!")
 
     return render(
         request,
@@ -1,6 +1,6 @@
 from django import forms
 from django.urls import reverse
-from django.forms import inlineformset_factory
+from django.forms import formset_factory, inlineformset_factory
 
 from .models import Loja, Funcionario, Servico, FuncionarioAgendaSemanal, LojaHorario, FormaPagamento, Semana
 from apps.accounts.models import Plan, PlanInfo, User
@@ -299,4 +299,60 @@ FuncionarioAgendaSemanalFormSet = inlineformset_factory(
     extra=7,
     max_num=7,
     can_delete=False,
-)
\ No newline at end of file
+)
+
+# ====== Agenda em massa ======
+
+class AgendaModeloDiaForm(forms.Form):
+    """Um dia da semana-modelo aplicada a vários funcionários."""
+    ACOES = [
+        ("manter", "Manter"),
+        ("trabalha", "Trabalha"),
+        ("folga", "Folga"),
+    ]
+
+    weekday = forms.TypedChoiceField(
+        choices=FuncionarioAgendaSemanal.DiaSemana.choices, coerce=int, widget=forms.HiddenInput
+    )
+    acao = forms.ChoiceField(choices=ACOES, initial="manter")
+    inicio = forms.TimeField(required=False, widget=forms.TimeInput(attrs={"type": "time"}))
+    fim = forms.TimeField(required=False, widget=forms.TimeInput(attrs={"type": "time"}))
+    almoco_inicio = forms.TimeField(required=False, widget=forms.TimeInput(attrs={"type": "time"}))
+    almoco_fim = forms.TimeField(required=False, widget=forms.TimeInput(attrs={"type": "time"}))
+    slot_interval_minutes = forms.IntegerField(required=False, min_value=1)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get("acao") != "trabalha" or self.errors:
+            return cleaned_data
+        if not cleaned_data.get("inicio") or not cleaned_data.get("fim"):
+            raise forms.ValidationError("Informe início e fim para os dias de trabalho.")
+        # mesmas regras do modelo, em memória (sem funcionário nem banco)
+        FuncionarioAgendaSemanal(
+            weekday=cleaned_data["weekday"],
+            **{c: cleaned_data.get(c) for c in ("inicio", "fim", "almoco_inicio", "almoco_fim", "slot_interval_minutes")},
+        ).clean()
+        return cleaned_data
+
+    def campos_agenda(self):
+        return {
+            c: self.cleaned_data.get(c)
+            for c in ("inicio", "fim", "almoco_inicio", "almoco_fim", "slot_interval_minutes")
+        }
+
+
+AgendaModeloFormSet = formset_factory(AgendaModeloDiaForm, extra=0, min_num=7, max_num=7, validate_max=True)
+
+
+class AgendaEmMassaForm(forms.Form):
+    funcionarios = forms.ModelMultipleChoiceField(
+        queryset=Funcionario.objects.none(),
+        widget=forms.CheckboxSelectMultiple,
+        label="Aplicar a",
+        error_messages={"required": "Escolha ao menos um funcionário."},
+    )
+
+    def __init__(self, *args, **kwargs):
+        loja = kwargs.pop("loja")
+        super().__init__(*args, **kwargs)
+        self.fields["funcionarios"].queryset = loja.funcionarios.order_by("nome")
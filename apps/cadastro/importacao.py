@@ -0,0 +1,350 @@
+"""
+Importação em massa de clientes (CSV) e do catálogo de serviços (CSV/JSON).
+
+O arquivo é lido em fluxo, linha a linha, e gravado em lotes: cada lote
+consulta de uma vez os usuários que já existem (por telefone ou e-mail),
+cria os novos com ``bulk_create`` e vincula todos ao dono, também com
+``bulk_create``. Só contas de cliente são vinculadas: telefone ou e-mail de
+um dono ou de alguém da equipe vira erro na linha. Cada lote tem a sua
+transação; linhas com problema não interrompem a importação e voltam no
+relatório com o número da linha. Um trecho que não está em UTF-8 encerra a
+leitura ali, com o que veio antes já gravado.
+
+``bulk_create`` não chama ``save()`` nem dispara sinais: os campos de busca
+do ``Cliente`` e os slugs dos serviços são preenchidos aqui.
+
+O catálogo é tudo ou nada: valida todas as linhas em memória (profissionais
+por slug, resolvidos com uma consulta), reserva os slugs de uma vez e, se
+não houver erro, grava serviços e atribuições com dois ``bulk_create`` numa
+transação, reservando de novo se outro cadastro tomar um dos slugs antes.
+"""
+import csv
+import itertools
+import json
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils.text import slugify
+
+from apps.accounts import slugs
+
+from .models import Cliente, Servico, campos_busca, normalizar_busca
+
+LOTE = 500
+
+# cabeçalhos aceitos (já normalizados com ``normalizar_busca``) -> campo
+COLUNAS = {
+    'nome': 'full_name', 'nome completo': 'full_name', 'full_name': 'full_name',
+    'name': 'full_name', 'cliente': 'full_name',
+    'email': 'email', 'e-mail': 'email',
+    'telefone': 'phone', 'phone': 'phone', 'celular': 'phone', 'whatsapp': 'phone', 'fone': 'phone',
+}
+
+
+COLUNAS_SERVICO = {
+    'nome': 'nome', 'servico': 'nome', 'descricao': 'descricao',
+    'preco': 'preco', 'valor': 'preco',
+    'duracao': 'duracao_minutos', 'duracao_minutos': 'duracao_minutos', 'duracao (min)': 'duracao_minutos',
+    'ativo': 'ativo', 'profissionais': 'profissionais', 'funcionarios': 'profissionais',
+}
+SIM = {'1', 'sim', 's', 'true', 'verdadeiro', 'x', 'ativo'}
+
+
+def normalizar_telefone(valor):
+    """
+    ``'(85) 99999-0000'`` com DDI -> ``'+5585999990000'``; mesmas regras de
+    ``ClientStartForm.clean_phone``. ``ValueError`` se inválido.
+    """
+    digitos = re.sub(r'\D', '', re.sub(r'[^\d+]', '', (valor or '').strip()))
+    if len(digitos) < 10 or len(digitos) > 15:
+        raise ValueError("Telefone inválido. Use o formato +5585...")
+    return '+' + digitos
+
+
+def novo_relatorio():
+    return {'lidas': 0, 'criados': 0, 'vinculados': 0, 'existentes': 0, 'erros': []}
+
+
+def linhas_csv(texto, colunas, exige=None):
+    """
+    ``(numero_da_linha, {campo: valor})`` de um arquivo texto com cabeçalho,
+    detectando ``;`` ou ``,``. ``colunas`` mapeia o cabeçalho normalizado
+    para o campo; ``exige`` (campo -> rótulo) lista campos dos quais ao menos
+    um deve existir.
+    """
+    primeira = next(texto, '')
+    delimitador = ';' if primeira.count(';') > primeira.count(',') else ','
+    leitor = csv.reader(itertools.chain([primeira], texto), delimiter=delimitador)
+    cabecalho = [colunas.get(normalizar_busca(c)) for c in next(leitor, [])]
+    if exige and not set(exige) & set(cabecalho):
+        raise ValueError(f"O arquivo precisa de uma coluna de {' ou de '.join(exige.values())}.")
+    for valores in leitor:
+        if not any(v.strip() for v in valores):
+            continue
+        dados = {campo: v.strip() for campo, v in zip(cabecalho, valores) if campo}
+        yield leitor.line_num, dados
+
+
+def _validar(dados):
+    """Normaliza uma linha; ``ValueError`` com a mensagem do relatório."""
+    nome = (dados.get('full_name') or '')[:120]
+    email = (dados.get('email') or '').lower()
+    telefone = dados.get('phone') or ''
+    if not email and not telefone:
+        raise ValueError("Informe telefone ou e-mail.")
+    if telefone:
+        telefone = normalizar_telefone(telefone)
+    if email:
+        try:
+            validate_email(email)
+        except ValidationError:
+            raise ValueError("E-mail inválido.")
+    return {'full_name': nome, 'email': email, 'phone': telefone or None}
+
+
+def _novo_usuario(dados):
+    User = get_user_model()
+    telefone = dados['phone']
+    email = dados['email'] or f'cliente-{telefone}@example.local'
+    user = User(
+        email=email,
+        # como em ClienteForm (e-mail) ou no cadastro por OTP (nome_telefone)
+        username=(dados['email'] or f"{dados['full_name'] or 'Cliente'}_{telefone}")[:150],
+        full_name=dados['full_name'] or None,
+        phone=telefone,
+        is_client=True,
+    )
+    user.set_unusable_password()
+    return user
+
+
+def _so_cliente(user) -> bool:
+    """Conta que pode ser vinculada a um dono (e depois editada ou excluída por ele)."""
+    return user.is_client and not (user.is_owner or user.is_staff or user.is_superuser)
+
+
+def _gravar_lote(owner, lote, relatorio):
+    User = get_user_model()
+    telefones = {d['phone'] for _, d in lote if d['phone']}
+    emails = {d['email'] for _, d in lote if d['email']}
+    existentes = list(
+        User.objects
+        .alias(email_minusculo=Lower('email'))
+        .filter(Q(phone__in=telefones | {t[1:] for t in telefones}) | Q(email_minusculo__in=emails))
+        .only('id', 'email', 'phone', 'full_name', 'is_client', 'is_owner', 'is_staff', 'is_superuser')
+    )
+    por_email = {u.email.lower(): u for u in existentes}
+    por_telefone = {'+' + u.phone.lstrip('+'): u for u in existentes if u.phone}
+    ja_clientes = set(
+        Cliente.objects.filter(owner=owner, user__in=existentes).values_list('user_id', flat=True)
+    )
+
+    vincular, novos = [], []
+    for linha, dados in lote:
+        user = por_email.get(dados['email']) or por_telefone.get(dados['phone'])
+        if user is None:
+            novos.append((linha, _novo_usuario(dados)))
+        elif not _so_cliente(user):
+            relatorio['erros'].append((linha, "Telefone ou e-mail de uma conta que não é de cliente."))
+        elif user.id in ja_clientes:
+            relatorio['existentes'] += 1
+        else:
+            ja_clientes.add(user.id)
+            vincular.append(user)
+
+    with transaction.atomic():
+        criados = [u for _, u in novos]
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(criados)
+        except IntegrityError:
+            # algum conflito no lote (ex.: username já usado): repete linha a linha
+            criados = []
+            for linha, user in novos:
+                user.pk, user._state.adding = None, True
+                try:
+                    with transaction.atomic():
+                        user.save()
+                except IntegrityError:
+                    relatorio['erros'].append((linha, "Conflito com um usuário já cadastrado."))
+                else:
+                    criados.append(user)
+        Cliente.objects.bulk_create(
+            [
+                Cliente(owner=owner, user=user, **dict(zip(('nome_busca', 'telefone_busca'), campos_busca(user))))
+                for user in itertools.chain(criados, vincular)
+            ],
+            ignore_conflicts=True,
+        )
+    relatorio['criados'] += len(criados)
+    relatorio['vinculados'] += len(vincular)
+
+
+def _contando(texto, lidas):
+    """Repassa as linhas de ``texto`` somando em ``lidas[0]`` as que já vieram."""
+    for linha in texto:
+        lidas[0] += 1
+        yield linha
+
+
+def importar_clientes(owner, texto, lote: int = LOTE, ao_lote=None) -> dict:
+    """
+    Importa os clientes do arquivo texto ``texto`` (iterável de linhas) para
+    ``owner``. Duplicados dentro do próprio arquivo entram uma vez só.
+    Retorna o relatório: contagens e ``erros`` como ``(linha, mensagem)``.
+    ``ValueError`` se o cabeçalho não tem telefone nem e-mail ou não está em
+    UTF-8; um erro de codificação mais adiante encerra a importação naquela
+    linha e volta no relatório.
+    """
+    relatorio = novo_relatorio()
+    lidas = [0]
+    vistos = {}
+    pendentes = []
+    try:
+        for linha, bruto in linhas_csv(
+            _contando(iter(texto), lidas), COLUNAS, exige={'phone': 'telefone', 'email': 'e-mail'}
+        ):
+            relatorio['lidas'] += 1
+            try:
+                dados = _validar(bruto)
+            except ValueError as e:
+                relatorio['erros'].append((linha, str(e)))
+                continue
+            chaves = [c for c in (dados['phone'], dados['email']) if c]
+            repetida = next((vistos[c] for c in chaves if c in vistos), None)
+            if repetida:
+                relatorio['erros'].append((linha, f"Duplicado no arquivo (linha {repetida})."))
+                continue
+            vistos.update((c, linha) for c in chaves)
+            pendentes.append((linha, dados))
+            if len(pendentes) >= lote:
+                _gravar_lote(owner, pendentes, relatorio)
+                pendentes = []
+                if ao_lote:
+                    ao_lote(relatorio)
+    except UnicodeDecodeError:
+        if not lidas[0]:
+            raise ValueError("O arquivo precisa estar em UTF-8.")
+        relatorio['erros'].append((lidas[0] + 1, "Trecho fora de UTF-8: importação interrompida nesta linha."))
+    if pendentes:
+        _gravar_lote(owner, pendentes, relatorio)
+        if ao_lote:
+            ao_lote(relatorio)
+    return relatorio
+
+
+# ------ Catálogo de serviços ------
+
+def ler_catalogo(conteudo: str):
+    """
+    ``(linha, dados)`` de um catálogo em JSON (lista de objetos, ou
+    ``{"servicos": [...]}``) ou CSV. No CSV os profissionais vêm separados
+    por ``|`` ou vírgula.
+    """
+    if conteudo.lstrip()[:1] in ('[', '{'):
+        try:
+            dados = json.loads(conteudo)
+        except ValueError:
+            raise ValueError("JSON inválido.")
+        itens = dados.get('servicos', []) if isinstance(dados, dict) else dados
+        if not isinstance(itens, list) or not all(isinstance(i, dict) for i in itens):
+            raise ValueError("O JSON deve ser uma lista de serviços.")
+        return [(n, item) for n, item in enumerate(itens, start=1)]
+    linhas = []
+    for n, item in linhas_csv(iter(conteudo.splitlines()), COLUNAS_SERVICO, exige={'nome': 'nome'}):
+        if 'profissionais' in item:
+            item['profissionais'] = [p for p in re.split(r'[|,\s]+', item['profissionais']) if p]
+        linhas.append((n, item))
+    return linhas
+
+
+def _validar_servico(item, funcionarios):
+    nome = str(item.get('nome') or '').strip()
+    if not nome:
+        raise ValueError("Informe o nome do serviço.")
+    try:
+        preco = Decimal(str(item.get('preco', '')).strip().replace(',', '.'))
+    except InvalidOperation:
+        raise ValueError("Preço inválido.")
+    if not preco.is_finite() or not 0 <= preco < Decimal('1e8'):
+        raise ValueError("Preço inválido.")
+    duracao = item.get('duracao_minutos') or 30
+    try:
+        duracao = int(duracao)
+    except (TypeError, ValueError):
+        raise ValueError("Duração inválida.")
+    if not 1 <= duracao <= 32767:
+        raise ValueError("Duração inválida.")
+    ativo = item.get('ativo', True)
+    if isinstance(ativo, str):
+        ativo = normalizar_busca(ativo) in SIM
+    profissionais = item.get('profissionais') or []
+    if isinstance(profissionais, (str, int)):
+        profissionais = [profissionais]
+    if not isinstance(profissionais, list) or not all(isinstance(p, (str, int)) for p in profissionais):
+        raise ValueError("Profissionais inválidos: informe os slugs da equipe.")
+    profissionais = [str(p).strip() for p in profissionais]
+    desconhecidos = [s for s in profissionais if s not in funcionarios]
+    if desconhecidos:
+        raise ValueError(f"Profissional não encontrado: {', '.join(desconhecidos)}.")
+    servico = Servico(
+        nome=nome[:160], descricao=str(item.get('descricao') or ''),
+        preco=preco.quantize(Decimal('0.01')), duracao_minutos=duracao, ativo=bool(ativo),
+    )
+    return servico, {funcionarios[s] for s in profissionais}
+
+
+def importar_servicos(loja, linhas) -> dict:
+    """
+    Cria na ``loja`` os serviços de ``linhas`` (de ``ler_catalogo``).
+    Serviço com o mesmo nome de um existente (ou repetido no arquivo) é
+    ignorado, o que permite reenviar o mesmo catálogo. Se alguma linha tiver
+    erro, nada é gravado. Retorna ``{'lidas', 'criados', 'ignorados',
+    'atribuicoes', 'erros'}``.
+    """
+    relatorio = {'lidas': 0, 'criados': 0, 'ignorados': 0, 'atribuicoes': 0, 'erros': []}
+    funcionarios = dict(loja.funcionarios.values_list('slug', 'id'))
+    nomes = {normalizar_busca(n) for n in loja.servicos.values_list('nome', flat=True)}
+
+    novos = []
+    for linha, item in linhas:
+        relatorio['lidas'] += 1
+        try:
+            servico, profissionais = _validar_servico(item, funcionarios)
+        except ValueError as e:
+            relatorio['erros'].append((linha, str(e)))
+            continue
+        chave = normalizar_busca(servico.nome)
+        if chave in nomes:
+            relatorio['ignorados'] += 1
+            continue
+        nomes.add(chave)
+        novos.append((servico, profissionais))
+    if relatorio['erros'] or not novos:
+        return relatorio
+
+    servicos = [s for s, _ in novos]
+    for servico in servicos:
+        servico.loja = loja
+    through = Servico.profissionais.through
+
+    def gravar():
+        Servico.objects.bulk_create(servicos)
+        return through.objects.bulk_create([
+            through(servico_id=servico.id, funcionario_id=f)
+            for servico, profissionais in novos
+            for f in sorted(profissionais)
+        ])
+
+    atribuicoes = slugs.salvar_com_slugs(
+        servicos, 'slug', [slugify(s.nome) or 'servico' for s in servicos], loja.servicos.all(), gravar,
+    )
+    relatorio['criados'] = len(servicos)
+    relatorio['atribuicoes'] = len(atribuicoes)
+    return relatorio
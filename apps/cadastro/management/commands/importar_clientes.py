@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.cadastro import importacao
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa clientes de um CSV (colunas nome, e-mail e/ou telefone) para um dono, "
+        "em lotes. Linhas com erro são listadas no final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("owner", help="E-mail do dono.")
+        parser.add_argument("arquivo", help="Caminho do CSV (UTF-8).")
+        parser.add_argument("--lote", type=int, default=importacao.LOTE)
+
+    def handle(self, *args, owner, arquivo, lote=importacao.LOTE, **options):
+        verbosidade = options["verbosity"]
+        try:
+            dono = get_user_model().objects.get(email=owner, is_owner=True)
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"Dono {owner} não encontrado.")
+
+        def progresso(relatorio):
+            if verbosidade > 1:
+                self.stdout.write(f"{relatorio['lidas']} linhas lidas...")
+
+        try:
+            with open(arquivo, encoding="utf-8-sig", newline="") as texto:
+                relatorio = importacao.importar_clientes(dono, texto, lote=lote, ao_lote=progresso)
+        except (OSError, UnicodeDecodeError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for linha, mensagem in relatorio["erros"]:
+            self.stderr.write(f"linha {linha}: {mensagem}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{relatorio['criados']} criados, {relatorio['vinculados']} vinculados, "
+            f"{relatorio['existentes']} já eram clientes, {len(relatorio['erros'])} com erro."
+        ))
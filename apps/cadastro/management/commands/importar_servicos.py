@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.cadastro import importacao
+from apps.cadastro.models import Loja
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa um catálogo de serviços (CSV ou JSON) para uma loja, com os "
+        "profissionais atribuídos pelo slug. Tudo ou nada: com qualquer erro, nada é gravado."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("loja", help="Slug da loja.")
+        parser.add_argument("arquivo", help="Caminho do CSV/JSON (UTF-8).")
+
+    def handle(self, *args, loja, arquivo, **options):
+        try:
+            destino = Loja.objects.get(slug=loja)
+        except Loja.DoesNotExist:
+            raise CommandError(f"Loja {loja} não encontrada.")
+
+        try:
+            with open(arquivo, encoding="utf-8-sig") as f:
+                relatorio = importacao.importar_servicos(destino, importacao.ler_catalogo(f.read()))
+        except (OSError, UnicodeDecodeError, ValueError) as e:
+            raise CommandError(str(e))
+
+        if relatorio["erros"]:
+            for linha, mensagem in relatorio["erros"]:
+                self.stderr.write(f"linha {linha}: {mensagem}")
+            raise CommandError(f"{len(relatorio['erros'])} linha(s) com erro; nada foi importado.")
+        self.stdout.write(self.style.SUCCESS(
+            f"{relatorio['criados']} serviços criados, {relatorio['atribuicoes']} atribuições, "
+            f"{relatorio['ignorados']} já existiam."
+        ))
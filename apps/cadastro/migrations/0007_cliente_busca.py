@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:28
+
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def preencher_busca(apps, schema_editor):
+    # cópia de ``campos_busca`` como era nesta migração
+    Cliente = apps.get_model('cadastro', 'Cliente')
+    clientes = list(Cliente.objects.select_related('user'))
+    for c in clientes:
+        nome = unicodedata.normalize('NFKD', c.user.full_name or '').encode('ascii', 'ignore').decode()
+        c.nome_busca = ' '.join(nome.lower().split())[:120]
+        c.telefone_busca = re.sub(r'\D', '', c.user.phone or '')
+    Cliente.objects.bulk_update(clientes, ['nome_busca', 'telefone_busca'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cadastro', '0006_formapagamento_loja_pagamentos_aceitos_lojahorario'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='nome_busca',
+            field=models.CharField(blank=True, editable=False, max_length=120),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='telefone_busca',
+            field=models.CharField(blank=True, editable=False, max_length=17),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['owner', 'nome_busca'], name='cliente_owner_nome_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['owner', 'telefone_busca'], name='cliente_owner_tel_idx'),
+        ),
+        migrations.RunPython(preencher_busca, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,19 @@
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 from django.urls import reverse
 from django.utils.text import slugify
 from django.core.validators import MinValueValidator, RegexValidator
 from django.utils.text import slugify
 from django.core.exceptions import ValidationError
 
+from apps.accounts import slugs
+
 import datetime as dt
+from functools import partial
+import re
+import unicodedata
 
 User = settings.AUTH_USER_MODEL
 
@@ -52,13 +59,10 @@ class Loja(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            base = slugify(self.nome)
-            slug = base or 'loja'
-            i = 1
-            while Loja.objects.filter(slug=slug).exclude(pk=self.pk).exists():
-                i += 1
-                slug = f"{base}-{i}"
-            self.slug = slug
+            return slugs.salvar_com_slug(
+                self, 'slug', slugify(self.nome) or 'loja', Loja.objects.exclude(pk=self.pk),
+                partial(super().save, *args, **kwargs),
+            )
         super().save(*args, **kwargs)
 
     def get_public_path(self):
@@ -187,13 +191,11 @@ class Funcionario(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            base = slugify(self.nome) or 'funcionario'
-            tentativa = base
-            i = 1
-            while Funcionario.objects.filter(loja=self.loja, slug=tentativa).exclude(pk=self.pk).exists():
-                i += 1
-                tentativa = f'{base}-{i}'
-            self.slug = tentativa
+            return slugs.salvar_com_slug(
+                self, 'slug', slugify(self.nome) or 'funcionario',
+                Funcionario.objects.filter(loja_id=self.loja_id).exclude(pk=self.pk),
+                partial(super().save, *args, **kwargs),
+            )
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -262,6 +264,39 @@ class FuncionarioAgendaSemanal(models.Model):
         ds = self.get_weekday_display()
         return f'{self.funcionario.nome} – {ds} {self.inicio}-{self.fim}'
 
+AGENDA_CAMPOS = ('inicio', 'fim', 'almoco_inicio', 'almoco_fim', 'slot_interval_minutes', 'ativo')
+
+def aplicar_agenda_semanal(funcionario_ids, dias: dict, folgas=()) -> int:
+    """
+    Aplica uma semana-modelo a vários funcionários de uma vez.
+
+    ``dias`` mapeia weekday -> campos da agenda (já validados com
+    ``FuncionarioAgendaSemanal.clean``); cada (funcionário, dia) vira um
+    upsert numa única instrução ``bulk_create(update_conflicts=True)``.
+    Os dias em ``folgas`` são desativados com um ``update`` só. Dias fora dos
+    dois ficam como estão. Não dispara sinais. Retorna quantas linhas foram
+    gravadas.
+    """
+    funcionario_ids = list(funcionario_ids)
+    linhas = [
+        FuncionarioAgendaSemanal(funcionario_id=f, weekday=dia, **{'ativo': True, **campos})
+        for f in funcionario_ids
+        for dia, campos in sorted(dias.items())
+    ]
+    with transaction.atomic():
+        if linhas:
+            FuncionarioAgendaSemanal.objects.bulk_create(
+                linhas,
+                update_conflicts=True,
+                unique_fields=['funcionario', 'weekday'],
+                update_fields=list(AGENDA_CAMPOS),
+            )
+        if folgas:
+            FuncionarioAgendaSemanal.objects.filter(
+                funcionario_id__in=funcionario_ids, weekday__in=list(folgas)
+            ).update(ativo=False)
+    return len(linhas)
+
 class FuncionarioAgendaExcecao(models.Model):
     """
     Permite ajustar um dia específico:
@@ -319,15 +354,64 @@ class Cliente(models.Model):
         limit_choices_to={'is_client': True}
     )
     criado_em = models.DateTimeField(auto_now_add=True)
+    # cópias normalizadas de nome/telefone do usuário para a busca por prefixo
+    # (índices por owner); mantidas no save e pelo sinal de alteração do usuário
+    nome_busca = models.CharField(max_length=120, blank=True, editable=False)
+    telefone_busca = models.CharField(max_length=17, blank=True, editable=False)
 
     class Meta:
         unique_together = (('owner', 'user'),)
         ordering = ('user__full_name',)
+        indexes = [
+            models.Index(fields=['owner', 'nome_busca'], name='cliente_owner_nome_idx'),
+            models.Index(fields=['owner', 'telefone_busca'], name='cliente_owner_tel_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.nome_busca, self.telefone_busca = campos_busca(self.user)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         nome = self.user.full_name or self.user.email
         return f'{nome} – {self.owner.email}'
 
+
+def normalizar_busca(texto):
+    """Minúsculas, sem acentos e com espaços simples: ``' José  ARAÚJO'`` -> ``'jose araujo'``."""
+    sem_acento = unicodedata.normalize('NFKD', texto or '').encode('ascii', 'ignore').decode()
+    return ' '.join(sem_acento.lower().split())
+
+
+def campos_busca(user):
+    """``(nome_busca, telefone_busca)`` de um usuário cliente."""
+    return normalizar_busca(user.full_name)[:120], re.sub(r'\D', '', user.phone or '')
+
+
+def filtro_busca_cliente(termo):
+    """
+    ``(Q, campo)`` para a busca de clientes por prefixo de nome (sem acentos)
+    ou de telefone, como intervalo ``[prefixo, sucessor)`` que usa os índices
+    ``(owner, nome_busca)`` e ``(owner, telefone_busca)``. Termo sem letras é
+    telefone; sem o DDI também casa com ``55``. ``Q`` vazio se não há termo.
+    """
+    digitos = re.sub(r'\D', '', termo or '')
+    if digitos and not re.search(r'[^\W\d_]', termo):
+        campo, prefixos = 'telefone_busca', {digitos, '55' + digitos}
+    else:
+        campo, prefixos = 'nome_busca', {normalizar_busca(termo)}
+    filtro = models.Q()
+    for p in filter(None, prefixos):
+        filtro |= models.Q(**{f'{campo}__gte': p, f'{campo}__lt': p[:-1] + chr(ord(p[-1]) + 1)})
+    return filtro, campo
+
+
+@receiver(post_save, sender=User)
+def atualizar_busca_clientes(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and not {'full_name', 'phone'} & set(update_fields)):
+        return
+    nome, telefone = campos_busca(instance)
+    Cliente.objects.filter(user=instance).update(nome_busca=nome, telefone_busca=telefone)
+
 # ------ Serviços -----
 
 class Servico(models.Model):
@@ -346,15 +430,20 @@ class Servico(models.Model):
     criado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # nome carregado: a busca do histórico só reindexa se ele mudar
+        instance._nome_original = instance.__dict__.get('nome')
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.slug:
-            base = slugify(self.nome) or 'servico'
-            tentativa = base
-            i = 1
-            while Servico.objects.filter(loja=self.loja, slug=tentativa).exclude(pk=self.pk).exists():
-                i += 1
-                tentativa = f"{base}-{i}"
-            self.slug = tentativa
+            return slugs.salvar_com_slug(
+                self, 'slug', slugify(self.nome) or 'servico',
+                Servico.objects.filter(loja_id=self.loja_id).exclude(pk=self.pk),
+                partial(super().save, *args, **kwargs),
+            )
         super().save(*args, **kwargs)
 
     @property
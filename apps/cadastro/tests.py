@@ -1,3 +1,397 @@
+import codecs
+from datetime import time, timedelta
+from decimal import Decimal
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.accounts import slugs
+from apps.accounts.models import Subscription
+from . import importacao, views
+from .models import Cliente, Funcionario, FuncionarioAgendaSemanal, Loja, Servico
+
+
+class ClientesListaTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.owner = User.objects.create_user(
+            email="lista@example.com", username="lista", password="123", is_owner=True
+        )
+        Subscription.objects.create(owner=self.owner, end_date=timezone.now() + timedelta(days=7))
+        for i, nome in enumerate(("Bruno", "Ana", "Carla", "Álvaro")):
+            user = User.objects.create_user(
+                email=f"c{i}@example.com", username=f"c{i}", password="123",
+                is_client=True, full_name=nome, phone=f"+55859990000{i}",
+            )
+            Cliente.objects.create(owner=self.owner, user=user)
+        self.client.force_login(self.owner)
+        self.url = reverse("cadastro:clientes")
+
+    def _nomes(self, response):
+        return [c["user__full_name"] for c in response.context["page_obj"]]
+
+    def test_ordena_pagina_e_busca(self):
+        hx = {"HTTP_HX_REQUEST": "true"}
+        response = self.client.get(self.url, **hx)
+        self.assertEqual(self._nomes(response), ["Álvaro", "Ana", "Bruno", "Carla"])
+        response = self.client.get(self.url, {"ordem": "-nome"}, **hx)
+        self.assertEqual(self._nomes(response), ["Carla", "Bruno", "Ana", "Álvaro"])
+        response = self.client.get(self.url, {"q": "a"}, **hx)
+        self.assertEqual(self._nomes(response), ["Álvaro", "Ana"])
+        for termo in ("´", "~"):  # normaliza para vazio: nenhum cliente, como no seletor
+            self.assertEqual(self._nomes(self.client.get(self.url, {"q": termo}, **hx)), [])
+
+        with mock.patch("apps.cadastro.views.CLIENTES_POR_PAGINA", 3):
+            response = self.client.get(self.url, {"page": 2, "ordem": "recentes"}, **hx)
+        self.assertEqual(self._nomes(response), ["Bruno"])
+        self.assertContains(response, "4 clientes")
+
+    def test_mutacoes_devolvem_so_a_linha(self):
+        hx = {"HTTP_HX_REQUEST": "true"}
+        response = self.client.post(self.url, {
+            "full_name": "Davi", "email": "davi@example.com", "phone": "+5585988880000",
+        }, **hx)
+        novo = Cliente.objects.get(user__email="davi@example.com")
+        self.assertContains(response, f'<tr id="cliente-{novo.pk}">')
+        self.assertNotContains(response, "Bruno")
+
+        url = reverse("cadastro:cliente_edit", args=[novo.pk])
+        response = self.client.post(url, {
+            "full_name": "Davi Lima", "email": "davi@example.com", "phone": "+5585988880000",
+        }, **hx)
+        self.assertContains(response, "Davi Lima")
+        self.assertContains(response, "<tr ", count=1)
+
+        response = self.client.post(reverse("cadastro:cliente_delete", args=[novo.pk]), **hx)
+        self.assertEqual(response.content, b"")
+        self.assertFalse(Cliente.objects.filter(pk=novo.pk).exists())
+
+
+class ServicosFacetasTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.owner = User.objects.create_user(
+            email="facetas@example.com", username="facetas", password="123", is_owner=True
+        )
+        Subscription.objects.create(owner=self.owner, end_date=timezone.now() + timedelta(days=7))
+        self.loja = Loja.objects.create(owner=self.owner, nome="Loja Facetas")
+        self.ana = Funcionario.objects.create(loja=self.loja, nome="Ana")
+        self.bia = Funcionario.objects.create(loja=self.loja, nome="Bia")
+        dados = [("Corte", 25, 30, True), ("Barba", 40, 20, True), ("Pintura", 120, 90, True), ("Antigo", 50, 45, False)]
+        for nome, preco, duracao, ativo in dados:
+            s = Servico.objects.create(loja=self.loja, nome=nome, preco=preco, duracao_minutos=duracao, ativo=ativo)
+            s.profissionais.add(self.ana)
+            if nome == "Pintura":
+                s.profissionais.add(self.bia)
+        self.client.force_login(self.owner)
+
+    def _contagens(self, facetas):
+        return {f["campo"]: {o["rotulo"]: o["n"] for o in f["opcoes"]} for f in facetas}
+
+    def test_contagens_ignoram_so_a_propria_faceta(self):
+        filtros = {k: None for k in ("q", "prof", "preco_min", "preco_max", "dur_min", "dur_max", "faixa_dur")}
+        filtros.update(status="ativos", faixa_preco="30-60")
+        with self.assertNumQueries(4):
+            ctx = views._servicos_ctx(self.loja, filtros)
+            nomes = [s.nome for s in ctx["servicos"]]
+            for s in ctx["servicos"]:
+                list(s.profissionais.all())
+        self.assertEqual(nomes, ["Barba"])
+        contagens = self._contagens(ctx["facetas"])
+        # status conta com a faixa de preço aplicada; a faixa, com o status
+        self.assertEqual(contagens["status"], {"Ativos": 1, "Inativos": 1})
+        self.assertEqual(contagens["faixa_preco"]["Até R$ 30"], 1)
+        self.assertEqual(contagens["faixa_preco"]["Acima de R$ 100"], 1)
+        self.assertEqual(contagens["prof"], {"Ana": 1, "Bia": 0})
+        self.assertEqual(ctx["profissionais"], [self.ana, self.bia])
+
+    def test_filtro_por_profissional_na_tela(self):
+        response = self.client.get(
+            reverse("cadastro:servicos"), {"prof": self.bia.id, "q": "pin"}, HTTP_HX_REQUEST="true"
+        )
+        self.assertEqual([s.nome for s in response.context["servicos"]], ["Pintura"])
+        self.assertContains(response, 'id="servicos-facetas"')
+        contagens = self._contagens(response.context["facetas"])
+        self.assertEqual(contagens["prof"], {"Ana": 1, "Bia": 1})
+
+        response = self.client.get(reverse("cadastro:servicos"), {"faixa_dur": "60-90"})
+        self.assertContains(response, 'name="faixa_dur" value="60-90"')
+        self.assertEqual([s.nome for s in response.context["servicos"]], ["Pintura"])
+
+
+class AgendaEmMassaTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.owner = User.objects.create_user(
+            email="agenda@example.com", username="agenda", password="123", is_owner=True
+        )
+        Subscription.objects.create(owner=self.owner, end_date=timezone.now() + timedelta(days=7))
+        self.loja = Loja.objects.create(owner=self.owner, nome="Loja Agenda")
+        self.ana = Funcionario.objects.create(loja=self.loja, nome="Ana")
+        self.bia = Funcionario.objects.create(loja=self.loja, nome="Bia")
+        FuncionarioAgendaSemanal.objects.create(
+            funcionario=self.ana, weekday=0, inicio=time(8), fim=time(12)
+        )
+        FuncionarioAgendaSemanal.objects.create(
+            funcionario=self.ana, weekday=6, inicio=time(8), fim=time(12)
+        )
+        self.client.force_login(self.owner)
+        self.url = reverse("cadastro:funcionarios_agenda_massa")
+
+    def _dados(self, dias):
+        dados = {
+            "loja_filtro": self.loja.id,
+            "funcionarios": [self.ana.id, self.bia.id],
+            "modelo-TOTAL_FORMS": 7, "modelo-INITIAL_FORMS": 0,
+            "modelo-MIN_NUM_FORMS": 7, "modelo-MAX_NUM_FORMS": 7,
+        }
+        for dia in range(7):
+            campos = dias.get(dia, {"acao": "manter"})
+            dados[f"modelo-{dia}-weekday"] = dia
+            for nome, valor in campos.items():
+                dados[f"modelo-{dia}-{nome}"] = valor
+        return dados
+
+    def test_aplica_semana_modelo(self):
+        response = self.client.get(self.url, {"loja_filtro": self.loja.id}, HTTP_HX_REQUEST="true")
+        self.assertContains(response, 'name="modelo-6-acao"')
+        trabalho = {"acao": "trabalha", "inicio": "09:00", "fim": "18:00",
+                    "almoco_inicio": "12:00", "almoco_fim": "13:00"}
+        dados = self._dados({0: trabalho, 1: trabalho, 6: {"acao": "folga"}})
+        response = self.client.post(self.url, dados, HTTP_HX_REQUEST="true")
+        self.assertEqual(response.status_code, 200)
+
+        agendas = FuncionarioAgendaSemanal.objects.filter(ativo=True)
+        self.assertEqual(
+            sorted(agendas.values_list("funcionario__nome", "weekday")),
+            [("Ana", 0), ("Ana", 1), ("Bia", 0), ("Bia", 1)],
+        )
+        seg = FuncionarioAgendaSemanal.objects.get(funcionario=self.ana, weekday=0)
+        self.assertEqual((seg.inicio, seg.fim, seg.almoco_inicio), (time(9), time(18), time(12)))
+        # folga desativa sem apagar
+        self.assertFalse(FuncionarioAgendaSemanal.objects.get(funcionario=self.ana, weekday=6).ativo)
+
+    def test_valida_como_o_modelo(self):
+        dados = self._dados({2: {"acao": "trabalha", "inicio": "09:00", "fim": "18:00",
+                                    "almoco_inicio": "17:30", "almoco_fim": "19:00"}})
+        response = self.client.post(self.url, dados, HTTP_HX_REQUEST="true")
+        self.assertEqual(response.status_code, 422)
+        self.assertContains(response, "O intervalo de almoço deve estar dentro do horário de trabalho.", status_code=422)
+        self.assertFalse(FuncionarioAgendaSemanal.objects.filter(weekday=2).exists())
+
+
+class ImportacaoClientesTests(TestCase):
+    CSV = (
+        "Nome;Telefone;E-mail\n"
+        "Ana Souza;+55 (85) 99999-0001;\n"
+        "Bruno;+55 85 99999-0002;bruno@example.com\n"
+        "Carla;123;\n"
+        "Ana de novo;5585999990001;\n"
+        "Sem contato;;\n"
+        ";;JA@example.com\n"
+        "Outro Dono;+5585999990009;\n"
+    )
+
+    def setUp(self):
+        User = get_user_model()
+        self.owner = User.objects.create_user(
+            email="import@example.com", username="import", password="123", is_owner=True
+        )
+        Subscription.objects.create(owner=self.owner, end_date=timezone.now() + timedelta(days=7))
+        outro = User.objects.create_user(email="outro@example.com", username="outro", password="123", is_owner=True)
+        self.ja = User.objects.create_user(email="ja@example.com", username="ja", is_client=True, full_name="Já")
+        Cliente.objects.create(owner=self.owner, user=self.ja)
+        self.de_outro = User.objects.create_user(
+            email="x@example.com", username="x", is_client=True, full_name="Outro Dono", phone="5585999990009"
+        )
+        Cliente.objects.create(owner=outro, user=self.de_outro)
+
+    def test_importa_em_lotes_com_relatorio(self):
+        relatorio = importacao.importar_clientes(self.owner, StringIO(self.CSV), lote=2)
+        self.assertEqual(
+            (relatorio["lidas"], relatorio["criados"], relatorio["vinculados"], relatorio["existentes"]),
+            (7, 2, 1, 1),
+        )
+        self.assertEqual(relatorio["erros"], [
+            (4, "Telefone inválido. Use o formato +5585..."),
+            (5, "Duplicado no arquivo (linha 2)."),
+            (6, "Informe telefone ou e-mail."),
+        ])
+        ana = Cliente.objects.get(owner=self.owner, user__phone="+5585999990001")
+        self.assertEqual((ana.nome_busca, ana.telefone_busca), ("ana souza", "5585999990001"))
+        self.assertFalse(ana.user.has_usable_password())
+        self.assertTrue(Cliente.objects.filter(owner=self.owner, user=self.de_outro).exists())
+        self.assertEqual(get_user_model().objects.filter(phone="+5585999990002").count(), 1)
+
+        # rodar de novo não duplica nada
+        relatorio = importacao.importar_clientes(self.owner, StringIO(self.CSV))
+        self.assertEqual((relatorio["criados"], relatorio["vinculados"], relatorio["existentes"]), (0, 0, 4))
+
+    def test_utf8_quebrado_entre_lotes(self):
+        linhas = [b"nome;telefone\n", b"Ana;+5585999990041\n", b"Bia;+5585999990042\n", b"Ca\xe7a;+5585999990043\n"]
+        relatorio = importacao.importar_clientes(self.owner, codecs.iterdecode(iter(linhas), "utf-8"), lote=1)
+        self.assertEqual(relatorio["criados"], 2)
+        self.assertEqual(relatorio["erros"], [(4, "Trecho fora de UTF-8: importação interrompida nesta linha.")])
+
+    def test_so_vincula_contas_de_cliente(self):
+        User = get_user_model()
+        User.objects.create_user(email="equipe@example.com", username="equipe", is_client=True, is_staff=True)
+        maiusculo = User.objects.create_user(email="Foo@Example.com", username="foo", is_client=True)
+        csv_texto = "nome,email\nDono,outro@example.com\nEquipe,equipe@example.com\nFoo,foo@example.com\n"
+        relatorio = importacao.importar_clientes(self.owner, StringIO(csv_texto))
+        self.assertEqual((relatorio["criados"], relatorio["vinculados"]), (0, 1))
+        self.assertEqual([linha for linha, _ in relatorio["erros"]], [2, 3])
+        self.assertEqual(
+            list(Cliente.objects.filter(owner=self.owner).exclude(user=self.ja).values_list("user", flat=True)),
+            [maiusculo.id],
+        )
+        self.assertFalse(User.objects.filter(email="foo@example.com").exists())
+
+    def test_utf8_quebrado_no_meio_mantem_o_relatorio(self):
+        conteudo = "nome;telefone\nAna;+5585999990031\nBia;+5585999990032\n".encode() + b"Ca\xe7a;+5585999990033\n"
+        self.client.force_login(self.owner)
+        arquivo = SimpleUploadedFile("clientes.csv", conteudo, content_type="text/csv")
+        response = self.client.post(reverse("cadastro:clientes_importar"), {"arquivo": arquivo}, HTTP_HX_REQUEST="true")
+        self.assertContains(response, "2 cliente(s) criado(s)")
+        self.assertContains(response, "<td>4</td><td>Trecho fora de UTF-8")
+        self.assertEqual(Cliente.objects.filter(owner=self.owner).count(), 3)
+
+        arquivo = SimpleUploadedFile("clientes.csv", b"nom\xe9;telefone\n", content_type="text/csv")
+        response = self.client.post(reverse("cadastro:clientes_importar"), {"arquivo": arquivo}, HTTP_HX_REQUEST="true")
+        self.assertContains(response, "precisa estar em UTF-8", status_code=422)
+
+        arquivo = SimpleUploadedFile("clientes.csv", conteudo, content_type="text/csv")
+        with mock.patch.object(views, "CLIENTES_TAMANHO_MAXIMO", 10):
+            response = self.client.post(reverse("cadastro:clientes_importar"), {"arquivo": arquivo}, HTTP_HX_REQUEST="true")
+        self.assertContains(response, "Arquivo muito grande", status_code=422)
+
+    def test_telefone_como_no_cadastro_do_cliente(self):
+        from apps.accounts.forms import ClientStartForm
+
+        for valor in ("(85) 99999-0000", "+55 85 99999-0000", "12345", "85 9 9999 0000 ramal"):
+            form = ClientStartForm(data={"full_name": "X", "phone": valor})
+            try:
+                esperado = form.is_valid() and form.cleaned_data["phone"]
+                obtido = importacao.normalizar_telefone(valor)
+            except ValueError:
+                obtido = False
+            self.assertEqual(obtido, esperado)
+
+    def test_view_e_comando(self):
+        self.client.force_login(self.owner)
+        arquivo = SimpleUploadedFile("clientes.csv", self.CSV.encode("utf-8-sig"), content_type="text/csv")
+        response = self.client.post(reverse("cadastro:clientes_importar"), {"arquivo": arquivo}, HTTP_HX_REQUEST="true")
+        self.assertContains(response, "2 cliente(s) criado(s)")
+        self.assertContains(response, "Duplicado no arquivo (linha 2).")
+        self.assertIn("clientes-importados", response["HX-Trigger"])
+
+        arquivo = SimpleUploadedFile("x.csv", b"nome;cidade\nAna;Fortaleza\n", content_type="text/csv")
+        response = self.client.post(reverse("cadastro:clientes_importar"), {"arquivo": arquivo}, HTTP_HX_REQUEST="true")
+        self.assertContains(response, "coluna de telefone ou de e-mail", status_code=422)
+
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False, encoding="utf-8") as f:
+            f.write("nome,telefone\nDavi,+5585999990077\n")
+        self.addCleanup(os.remove, f.name)
+        saida = StringIO()
+        call_command("importar_clientes", self.owner.email, f.name, stdout=saida)
+        self.assertIn("1 criados", saida.getvalue())
+        self.assertTrue(Cliente.objects.filter(owner=self.owner, user__full_name="Davi").exists())
+
+
+class ImportacaoCatalogoTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.owner = User.objects.create_user(
+            email="catalogo@example.com", username="catalogo", password="123", is_owner=True
+        )
+        Subscription.objects.create(owner=self.owner, end_date=timezone.now() + timedelta(days=7))
+        self.loja = Loja.objects.create(owner=self.owner, nome="Loja Catálogo")
+        self.ana = Funcionario.objects.create(loja=self.loja, nome="Ana")
+        self.bia = Funcionario.objects.create(loja=self.loja, nome="Bia")
+        Servico.objects.create(loja=self.loja, nome="Corte", preco=30)
+
+    def test_catalogo_grande_em_poucas_consultas(self):
+        itens = [
+            {"nome": f"Serviço {i}", "preco": "25.5", "duracao_minutos": 20 + i % 40, "profissionais": ["ana", "bia"]}
+            for i in range(200)
+        ]
+        with CaptureQueriesContext(connection) as consultas:
+            relatorio = importacao.importar_servicos(self.loja, importacao.ler_catalogo(json.dumps(itens)))
+        self.assertEqual((relatorio["criados"], relatorio["atribuicoes"]), (200, 400))
+        self.assertLess(len(consultas), 10)
+        servico = Servico.objects.get(loja=self.loja, slug="servico-7")
+        self.assertEqual(sorted(servico.profissionais.values_list("nome", flat=True)), ["Ana", "Bia"])
+
+    def test_profissionais_que_nao_sao_slugs(self):
+        itens = [
+            {"nome": "Barba", "preco": 20, "profissionais": [7]},
+            {"nome": "Luzes", "preco": 90, "profissionais": [["ana"]]},
+            {"nome": "Pintura", "preco": 80, "profissionais": {"ana": 1}},
+        ]
+        relatorio = importacao.importar_servicos(self.loja, importacao.ler_catalogo(json.dumps(itens)))
+        self.assertEqual(relatorio["erros"], [
+            (1, "Profissional não encontrado: 7."),
+            (2, "Profissionais inválidos: informe os slugs da equipe."),
+            (3, "Profissionais inválidos: informe os slugs da equipe."),
+        ])
+
+    def test_slug_tomado_durante_a_importacao(self):
+        reservar = slugs.reservar
+        tomados = iter([["corte-2", "corte"]])  # "corte" já é do serviço existente
+
+        def reservar_com_corrida(*args, **kwargs):
+            return next(tomados, None) or reservar(*args, **kwargs)
+
+        itens = [{"nome": "Corte!", "preco": 35}, {"nome": "Corte?", "preco": 40, "profissionais": ["ana"]}]
+        with mock.patch.object(slugs, "reservar", side_effect=reservar_com_corrida) as espiao:
+            relatorio = importacao.importar_servicos(self.loja, importacao.ler_catalogo(json.dumps(itens)))
+        self.assertEqual(espiao.call_count, 2)
+        self.assertEqual((relatorio["criados"], relatorio["atribuicoes"]), (2, 1))
+        self.assertEqual(
+            sorted(self.loja.servicos.values_list("slug", flat=True)), ["corte", "corte-2", "corte-3"]
+        )
+
+    def test_csv_tudo_ou_nada_e_slugs(self):
+        csv_ok = (
+            "nome;preco;duracao;profissionais;ativo\n"
+            "Barba;25,00;20;ana;sim\n"
+            "Corte;30;30;;\n"
+            "Corte!;35;30;ana|bia;não\n"
+        )
+        csv_erro = csv_ok + "Pintura;abc;30;;\nLuzes;90;60;carla;\n"
+        relatorio = importacao.importar_servicos(self.loja, importacao.ler_catalogo(csv_erro))
+        self.assertEqual(relatorio["erros"], [(5, "Preço inválido."), (6, "Profissional não encontrado: carla.")])
+        self.assertEqual(self.loja.servicos.count(), 1)
+
+        relatorio = importacao.importar_servicos(self.loja, importacao.ler_catalogo(csv_ok))
+        self.assertEqual((relatorio["criados"], relatorio["ignorados"]), (2, 1))
+        novo = Servico.objects.get(loja=self.loja, nome="Corte!")
+        self.assertEqual((novo.slug, novo.ativo, novo.preco), ("corte-2", False, Decimal("35.00")))
+
+    def test_view_e_comando(self):
+        self.client.force_login(self.owner)
+        arquivo = SimpleUploadedFile("c.json", b'[{"nome": "Barba", "preco": 20, "profissionais": ["ana"]}]')
+        response = self.client.post(
+            reverse("cadastro:servicos_importar"), {"arquivo": arquivo, "loja_filtro": self.loja.id},
+            HTTP_HX_REQUEST="true",
+        )
+        self.assertContains(response, "1 serviço(s) criado(s)")
+        self.assertIn("servicos-importados", response["HX-Trigger"])
 
-# Create your tests here.
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False, encoding="utf-8") as f:
+            f.write("nome,preco\nHidratação,40\n")
+        self.addCleanup(os.remove, f.name)
+        saida = StringIO()
+        call_command("importar_servicos", self.loja.slug, f.name, stdout=saida)
+        self.assertIn("1 serviços criados", saida.getvalue())
@@ -12,17 +12,20 @@ urlpatterns = [
 
     # ======== FUNCIONARIOS ========
     path('funcionarios/', views.funcionarios, name='funcionarios'),
+    path('funcionarios/agenda/', views.funcionarios_agenda_massa, name='funcionarios_agenda_massa'),
     path('funcionarios/<int:pk>/edit/', views.funcionario_edit, name='funcionario_edit'),
     path('funcionarios/<int:pk>/delete/', views.funcionario_delete, name='funcionario_delete'),
 
     # ======== SERVIÇOS ========
     path('servicos/form/', views.servico_form, name='servico_form'),
     path('servicos/', views.servicos, name='servicos'),
+    path('servicos/importar/', views.servicos_importar, name='servicos_importar'),
     path('servicos/<int:pk>/edit/', views.servico_edit, name='servico_edit'),
     path('servicos/<int:pk>/delete/', views.servico_delete, name='servico_delete'),
 
     # ======== CLIENTES ========
     path('clientes/', views.clientes, name='clientes'),
+    path('clientes/importar/', views.clientes_importar, name='clientes_importar'),
     path('clientes/<int:pk>/edit/', views.cliente_edit, name='cliente_edit'),
     path('clientes/<int:pk>/delete/', views.cliente_delete, name='cliente_delete'),
 ]
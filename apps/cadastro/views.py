@@ -1,18 +1,27 @@
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404, redirect, render
+from django.core.paginator import Paginator
+from django.db.models import Count, Q
+from django.http import HttpResponse
 from django.urls import reverse
 
-from .models import Loja, Funcionario, Servico, FuncionarioAgendaSemanal, Cliente
+from .models import (
+    Loja, Funcionario, Servico, FuncionarioAgendaSemanal, Cliente, filtro_busca_cliente, aplicar_agenda_semanal,
+)
 from .forms import (
     LojaForm,
     FuncionarioForm,
     ServicoForm,
     FuncionarioAgendaSemanalFormSet,
     ClienteForm,
+    AgendaEmMassaForm,
+    AgendaModeloFormSet,
 )
 from apps.accounts.decorators import subscription_required
+from . import importacao
 
+import codecs
 import json
 
 # ========== UTILITÁRIAS ==========
@@ -38,6 +47,19 @@ def _agenda_formset(instance, data=None):
         form.initial["weekday"] = dia
     return formset
 
+FAIXAS_PRECO = (
+    ('ate-30', 'Até R$ 30', None, 30),
+    ('30-60', 'R$ 30 a 60', 30, 60),
+    ('60-100', 'R$ 60 a 100', 60, 100),
+    ('100+', 'Acima de R$ 100', 100, None),
+)
+FAIXAS_DURACAO = (
+    ('ate-30', 'Até 30 min', None, 30),
+    ('30-60', '31 a 60 min', 30, 60),
+    ('60-90', '61 a 90 min', 60, 90),
+    ('90+', 'Mais de 90 min', 90, None),
+)
+
 def _parse_filtros(request):
     data = request.GET if request.method == 'GET' else request.POST
     return {
@@ -48,43 +70,134 @@ def _parse_filtros(request):
         'preco_max': (data.get('preco_max') or '').strip() or None,
         'dur_min': (data.get('dur_min') or '').strip() or None,
         'dur_max': (data.get('dur_max') or '').strip() or None,
+        'faixa_preco': (data.get('faixa_preco') or '').strip() or None,
+        'faixa_dur': (data.get('faixa_dur') or '').strip() or None,
     }
 
-def _aplica_filtros(qs, filtros):
+def _q_faixa(campo, minimo, maximo):
+    """Faixa ``(minimo, maximo]``; ``None`` deixa o lado aberto."""
+    q = Q()
+    if minimo is not None:
+        q &= Q(**{f'{campo}__gt': minimo})
+    if maximo is not None:
+        q &= Q(**{f'{campo}__lte': maximo})
+    return q
+
+def _q_intervalo(campo, minimo, maximo, conv, faixas, faixa):
+    q = Q()
+    for valor, lookup in ((minimo, 'gte'), (maximo, 'lte')):
+        if valor:
+            try:
+                q &= Q(**{f'{campo}__{lookup}': conv(valor)})
+            except ValueError:
+                pass
+    for chave, _rotulo, de, ate in faixas:
+        if chave == faixa:
+            q &= _q_faixa(campo, de, ate)
+    return q
+
+def _filtros_q(filtros):
+    """
+    Um ``Q`` por faceta. A busca textual não é faceta: vale para todas as
+    contagens. O profissional vira subconsulta na tabela intermediária, sem
+    join na consulta principal (e sem ``distinct``).
+    """
+    partes = {'busca': Q(), 'status': Q(), 'prof': Q(), 'preco': Q(), 'duracao': Q()}
     if filtros['q']:
-        qs = qs.filter(models.Q(nome__icontains=filtros['q']) | models.Q(descricao__icontains=filtros['q']))
+        partes['busca'] = Q(nome__icontains=filtros['q']) | Q(descricao__icontains=filtros['q'])
     if filtros['status'] == 'ativos':
-        qs = qs.filter(ativo=True)
+        partes['status'] = Q(ativo=True)
     elif filtros['status'] == 'inativos':
-        qs = qs.filter(ativo=False)
+        partes['status'] = Q(ativo=False)
     if filtros['prof']:
         try:
-            qs = qs.filter(profissionais__id=int(filtros['prof']))
+            partes['prof'] = Q(id__in=Servico.profissionais.through.objects
+                               .filter(funcionario_id=int(filtros['prof'])).values('servico_id'))
         except ValueError:
             pass
-    # preço
-    if filtros['preco_min']:
-        try:
-            qs = qs.filter(preco__gte=float(filtros['preco_min']))
-        except ValueError:
-            pass
-    if filtros['preco_max']:
-        try:
-            qs = qs.filter(preco__lte=float(filtros['preco_max']))
-        except ValueError:
-            pass
-    # duração
-    if filtros['dur_min']:
-        try:
-            qs = qs.filter(duracao_minutos__gte=int(filtros['dur_min']))
-        except ValueError:
-            pass
-    if filtros['dur_max']:
-        try:
-            qs = qs.filter(duracao_minutos__lte=int(filtros['dur_max']))
-        except ValueError:
-            pass
-    return qs.distinct()
+    partes['preco'] = _q_intervalo('preco', filtros['preco_min'], filtros['preco_max'], float,
+                                   FAIXAS_PRECO, filtros.get('faixa_preco'))
+    partes['duracao'] = _q_intervalo('duracao_minutos', filtros['dur_min'], filtros['dur_max'], int,
+                                     FAIXAS_DURACAO, filtros.get('faixa_dur'))
+    return partes
+
+def _aplica_filtros(qs, filtros):
+    return qs.filter(*_filtros_q(filtros).values())
+
+def _facetas(loja, filtros):
+    """
+    Contagens por faceta em duas consultas agrupadas: status e faixas num só
+    ``aggregate`` com ``Count(filter=...)`` e profissionais anotados (a mesma
+    lista alimenta o select). Cada faceta conta com os demais filtros
+    aplicados, mas não com o próprio, para mostrar as alternativas.
+    Retorna ``(facetas, profissionais)``.
+    """
+    partes = _filtros_q(filtros)
+
+    def sem(faceta):
+        q = Q()
+        for nome, parte in partes.items():
+            if nome != faceta:
+                q &= parte
+        return q
+
+    grupos = [
+        ('status', 'Status', 'status', [
+            ('ativos', 'Ativos', Q(ativo=True)),
+            ('inativos', 'Inativos', Q(ativo=False)),
+        ]),
+        ('preco', 'Preço', 'faixa_preco',
+         [(chave, rotulo, _q_faixa('preco', de, ate)) for chave, rotulo, de, ate in FAIXAS_PRECO]),
+        ('duracao', 'Duração', 'faixa_dur',
+         [(chave, rotulo, _q_faixa('duracao_minutos', de, ate)) for chave, rotulo, de, ate in FAIXAS_DURACAO]),
+    ]
+    contagens = {}
+    for faceta, _titulo, _campo, opcoes in grupos:
+        base = sem(faceta)
+        for i, (_valor, _rotulo, q) in enumerate(opcoes):
+            contagens[f'{faceta}_{i}'] = Count('id', filter=base & q)
+    totais = loja.servicos.aggregate(**contagens)
+
+    profissionais = list(
+        loja.funcionarios.filter(ativo=True)
+        .annotate(n_servicos=Count('servicos', filter=Q(servicos__in=loja.servicos.filter(sem('prof')).values('id'))))
+        .order_by('nome')
+    )
+
+    facetas = [
+        {
+            'titulo': titulo,
+            'campo': campo,
+            'opcoes': [
+                {'valor': valor, 'rotulo': rotulo, 'n': totais[f'{faceta}_{i}'],
+                 'ativo': filtros.get(campo) == valor}
+                for i, (valor, rotulo, _q) in enumerate(opcoes)
+            ],
+        }
+        for faceta, titulo, campo, opcoes in grupos
+    ]
+    facetas.insert(1, {
+        'titulo': 'Profissional',
+        'campo': 'prof',
+        'opcoes': [
+            {'valor': str(p.id), 'rotulo': p.nome, 'n': p.n_servicos, 'ativo': filtros['prof'] == str(p.id)}
+            for p in profissionais
+        ],
+    })
+    return facetas, profissionais
+
+def _servicos_ctx(loja, filtros):
+    """Lista filtrada + facetas: quatro consultas, qualquer que seja o filtro."""
+    facetas, profissionais = _facetas(loja, filtros)
+    return {
+        'servicos': _aplica_filtros(
+            loja.servicos.select_related('loja').prefetch_related('profissionais').order_by('nome'),
+            filtros,
+        ),
+        'filtros': filtros,
+        'facetas': facetas,
+        'profissionais': profissionais,
+    }
 
 def _collect_errors_for_toast(form, formset=None) -> str:
     # 1) non-field do form (inclui ValidationError de clean() do Model/Form)
@@ -430,6 +543,53 @@ def funcionario_delete(request, pk):
     # GET → confirma a exclusão
     return render(request, 'cadastro/partials/funcionario_confirm_delete.html', {'funcionario': func})
 
+@login_required
+@subscription_required
+def funcionarios_agenda_massa(request):
+    """
+    Aplica uma semana-modelo a vários funcionários da loja (modal via HTMX).
+    Cada dia pode ser mantido, definido como trabalho ou como folga.
+    """
+    if not getattr(request.user, 'is_owner', False):
+        return redirect('accounts:owner_login')
+
+    lojas_qs = request.user.lojas.order_by('nome')
+    loja = _get_loja_ativa(request, lojas_qs)
+    if not loja:
+        return HttpResponse(status=404)
+
+    if request.method == 'POST':
+        form = AgendaEmMassaForm(request.POST, loja=loja)
+        formset = AgendaModeloFormSet(request.POST, prefix='modelo')
+        if form.is_valid() and formset.is_valid():
+            dias = {f.cleaned_data['weekday']: f.campos_agenda()
+                    for f in formset if f.cleaned_data['acao'] == 'trabalha'}
+            folgas = [f.cleaned_data['weekday'] for f in formset if f.cleaned_data['acao'] == 'folga']
+            funcionarios = form.cleaned_data['funcionarios']
+            aplicar_agenda_semanal([f.id for f in funcionarios], dias, folgas)
+
+            response = HttpResponse(status=200)
+            response['HX-Reswap'] = 'none'
+            response['HX-Trigger'] = json.dumps({"show-toast": {
+                "text": f"Agenda aplicada a {len(funcionarios)} funcionário(s)!", "level": "success",
+            }})
+            return response
+
+        msg = _collect_errors_for_toast(form, formset)
+        resp = render(request, 'cadastro/partials/agenda_massa_form.html',
+                      {'form': form, 'formset': formset, 'loja': loja}, status=422)
+        resp['HX-Trigger'] = json.dumps({"show-toast": {"text": msg, "level": "error"}})
+        resp['HX-Retarget'] = '#modalFuncionarioOps .modal-content'
+        resp['HX-Reswap'] = 'innerHTML'
+        return resp
+
+    form = AgendaEmMassaForm(loja=loja)
+    formset = AgendaModeloFormSet(prefix='modelo', initial=[
+        {'weekday': dia, 'acao': 'manter'} for dia in FuncionarioAgendaSemanal.DiaSemana.values
+    ])
+    return render(request, 'cadastro/partials/agenda_massa_form.html',
+                  {'form': form, 'formset': formset, 'loja': loja})
+
 # ========== SERVIÇOS ==========
 
 @login_required
@@ -463,17 +623,11 @@ def servicos(request):
             obj.save()
             form.save_m2m()
 
-            qs = _aplica_filtros(
-                loja.servicos.select_related('loja').prefetch_related('profissionais').order_by('nome'),
-                filtros
-            )
             ctx = {
                 'lojas': lojas_qs,
                 'loja': loja,
                 'form': ServicoForm(lojas=lojas_qs, initial={'loja': loja}),
-                'servicos': qs,
-                'filtros': filtros,
-                'profissionais': loja.funcionarios.filter(ativo=True).order_by('nome'),
+                **_servicos_ctx(loja, filtros),
                 'form_salvo': True,
             }
 
@@ -489,17 +643,11 @@ def servicos(request):
             return redirect(f"{request.path}?loja_filtro={loja.id}")
 
         else:
-            qs = _aplica_filtros(
-                loja.servicos.select_related('loja').prefetch_related('profissionais').order_by('nome'),
-                filtros
-            )
             ctx = {
                 'lojas': lojas_qs,
                 'loja': loja,
                 'form': form,
-                'servicos': qs,
-                'filtros': filtros,
-                'profissionais': loja.funcionarios.filter(ativo=True).order_by('nome'),
+                **_servicos_ctx(loja, filtros),
             }
             tpl = 'cadastro/partials/servicos.html' if (request.headers.get('HX-Request') and request.headers.get('HX-Target') != 'content') else 'cadastro/servicos.html'
             response = render(request, tpl, ctx, status=422)
@@ -516,19 +664,56 @@ def servicos(request):
 
     # GET
     form = ServicoForm(lojas=lojas_qs, initial={'loja': loja})
-    qs = _aplica_filtros(loja.servicos.select_related('loja').prefetch_related('profissionais').order_by('nome'), filtros)
     ctx = {
         'lojas': lojas_qs,
         'loja': loja,
         'form': form,
-        'servicos': qs,
-        'filtros': filtros,
-        'profissionais': loja.funcionarios.filter(ativo=True).order_by('nome'),
+        **_servicos_ctx(loja, filtros),
     }
     if request.headers.get('HX-Request') and request.headers.get('HX-Target') != 'content':
         return render(request, 'cadastro/partials/servicos.html', ctx)
     return render(request, 'cadastro/servicos.html', ctx)
 
+CATALOGO_TAMANHO_MAXIMO = 2 * 1024 * 1024
+
+@login_required
+@subscription_required
+def servicos_importar(request):
+    """Importa um catálogo (CSV/JSON) para a loja filtrada; responde com o relatório."""
+    if not getattr(request.user, 'is_owner', False):
+        return redirect('accounts:owner_login')
+    if request.method != 'POST':
+        return redirect('cadastro:servicos')
+
+    loja = _get_loja_ativa(request, request.user.lojas.order_by('nome'))
+    arquivo = request.FILES.get('arquivo')
+    relatorio, erro = None, None
+    if not loja:
+        erro = "Cadastre uma loja antes de importar serviços."
+    elif not arquivo:
+        erro = "Escolha um arquivo CSV ou JSON."
+    elif arquivo.size > CATALOGO_TAMANHO_MAXIMO:
+        erro = "Arquivo muito grande (máximo 2 MB)."
+    else:
+        try:
+            linhas = importacao.ler_catalogo(arquivo.read().decode('utf-8-sig'))
+            relatorio = importacao.importar_servicos(loja, linhas)
+        except UnicodeDecodeError:
+            erro = "O arquivo precisa estar em UTF-8."
+        except ValueError as e:
+            erro = str(e)
+
+    falhou = erro or relatorio['erros']
+    response = render(request, 'cadastro/partials/servicos_importacao.html', {
+        'relatorio': relatorio, 'erro': erro, 'loja': loja,
+    }, status=422 if falhou else 200)
+    if not falhou:
+        response['HX-Trigger'] = json.dumps({
+            "show-toast": {"text": f"{relatorio['criados']} serviço(s) importado(s).", "level": "success"},
+            "servicos-importados": True,
+        })
+    return response
+
 @login_required
 @subscription_required
 def servico_form(request):
@@ -571,16 +756,10 @@ def servico_edit(request, pk):
             # sucesso -> 200 (seu hx-on fecha o modal) + atualiza a lista
             loja = _get_loja_ativa(request, lojas_qs)
             filtros = _parse_filtros(request)
-            qs = _aplica_filtros(
-                loja.servicos.select_related('loja').prefetch_related('profissionais').order_by('nome'),
-                filtros
-            )
             ctx = {
                 'lojas': lojas_qs,
                 'loja': loja,
-                'servicos': qs,
-                'filtros': filtros,
-                'profissionais': loja.funcionarios.filter(ativo=True).order_by('nome'),
+                **_servicos_ctx(loja, filtros),
             }
             response = render(request, 'cadastro/partials/servicos.html', ctx)
             response['HX-Trigger'] = json.dumps({"show-toast": {"text": "Serviço atualizado!", "level": "success"}})
@@ -624,18 +803,10 @@ def servico_delete(request, pk):
 
         loja = _get_loja_ativa(request, lojas_qs)
         filtros = _parse_filtros(request)
-        qs = _aplica_filtros(
-            loja.servicos.select_related('loja')
-                         .prefetch_related('profissionais')
-                         .order_by('nome'),
-            filtros
-        )
         ctx = {
             'lojas': lojas_qs,
             'loja': loja,
-            'servicos': qs,
-            'filtros': filtros,
-            'profissionais': loja.funcionarios.filter(ativo=True).order_by('nome'),
+            **_servicos_ctx(loja, filtros),
         }
 
         # Se for HTMX, retorna parcial + evento de toast
@@ -654,6 +825,54 @@ def servico_delete(request, pk):
 
 # ======== CLIENTES ========
 
+CLIENTES_POR_PAGINA = 25
+CLIENTES_ORDENS = {
+    'nome': ('nome_busca', 'id'),
+    '-nome': ('-nome_busca', '-id'),
+    'telefone': ('telefone_busca', 'id'),
+    '-telefone': ('-telefone_busca', '-id'),
+    'recentes': ('-id',),
+}
+CLIENTE_CAMPOS = ('id', 'user__full_name', 'user__email', 'user__phone')
+
+
+def _cliente_linha(owner, pk):
+    """Uma linha da tabela de clientes (mesma projeção da listagem)."""
+    return Cliente.objects.filter(owner=owner, pk=pk).values(*CLIENTE_CAMPOS).first()
+
+
+def _clientes_ctx(request):
+    """
+    Página da lista de clientes: busca por prefixo (``q``), ordem (``ordem``)
+    e página (``page``), lendo só as colunas exibidas.
+    """
+    termo = request.GET.get('q', '').strip()
+    ordem = request.GET.get('ordem') if request.GET.get('ordem') in CLIENTES_ORDENS else 'nome'
+    qs = Cliente.objects.filter(owner=request.user)
+    if termo:
+        filtro, _ = filtro_busca_cliente(termo)
+        # termo que normaliza para nada ("´", "~") não casa ninguém, como no seletor
+        qs = qs.filter(filtro) if filtro else qs.none()
+    paginator = Paginator(qs.order_by(*CLIENTES_ORDENS[ordem]).values(*CLIENTE_CAMPOS), CLIENTES_POR_PAGINA)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    params = request.GET.copy()
+    params.pop('page', None)
+    return {
+        'page_obj': page_obj,
+        'paginas': paginator.get_elided_page_range(page_obj.number, on_each_side=2, on_ends=1),
+        'termo': termo,
+        'ordem': ordem,
+        'querystring': params.urlencode(),
+    }
+
+
+def _resposta_linha(request, cliente, toast):
+    response = render(request, 'cadastro/partials/cliente_linha.html', {'c': cliente})
+    response['HX-Trigger'] = json.dumps({"show-toast": {"text": toast, "level": "success"}})
+    return response
+
+
 @login_required
 @subscription_required
 def clientes(request):
@@ -666,39 +885,66 @@ def clientes(request):
         form = ClienteForm(request.POST)
         if form.is_valid():
             user = form.save()
-            Cliente.objects.create(owner=request.user, user=user)
+            cliente = Cliente.objects.create(owner=request.user, user=user)
             messages.success(request, 'Cliente cadastrado com sucesso!')
-            qs = Cliente.objects.filter(owner=request.user).select_related('user').order_by('user__full_name')
-            
-            if request.headers.get('HX-Request') and target != 'content':
-                form = ClienteForm()
 
-                response = render(request, 'cadastro/partials/clientes.html', {'clientes': qs})
-                response['HX-Trigger'] = json.dumps({
-                    "show-toast": {"text": "Cliente criado!", "level": "success"}
-                })
-
-                return response
+            if request.headers.get('HX-Request') and target != 'content':
+                # só a linha nova; o form a insere no topo da tabela
+                return _resposta_linha(request, _cliente_linha(request.user, cliente.pk), "Cliente criado!")
 
             return redirect('cadastro:clientes')
 
-        qs = Cliente.objects.filter(owner=request.user).select_related('user').order_by('user__full_name')
-        ctx = {'form': form, 'clientes': qs}
         if request.headers.get('HX-Request') and target != 'content':
-            resp = render(request, 'cadastro/clientes.html', ctx)
+            resp = render(request, 'cadastro/clientes.html', {'form': form, 'page_obj': None})
             resp['HX-Retarget'] = '#modal-cliente-body'
             resp['HX-Reselect'] = '#modal-cliente-body'
             resp['HX-Reswap'] = 'outerHTML'
 
             return resp
-        
-        return render(request, 'cadastro/clientes.html', ctx)
 
-    form = ClienteForm()
-    qs = Cliente.objects.filter(owner=request.user).select_related('user').order_by('user__full_name')
+        return render(request, 'cadastro/clientes.html', {'form': form, **_clientes_ctx(request)})
+
+    ctx = _clientes_ctx(request)
     if request.headers.get('HX-Request') and target != 'content':
-        return render(request, 'cadastro/partials/clientes.html', {'clientes': qs})
-    return render(request, 'cadastro/clientes.html', {'form': form, 'clientes': qs})
+        return render(request, 'cadastro/partials/clientes.html', ctx)
+    return render(request, 'cadastro/clientes.html', {'form': ClienteForm(), **ctx})
+
+IMPORTACAO_ERROS_EXIBIDOS = 200
+CLIENTES_TAMANHO_MAXIMO = 10 * 1024 * 1024
+
+@login_required
+@subscription_required
+def clientes_importar(request):
+    """Importa clientes de um CSV enviado no modal; responde com o relatório."""
+    if not getattr(request.user, 'is_owner', False):
+        return redirect('accounts:owner_login')
+    if request.method != 'POST':
+        return redirect('cadastro:clientes')
+
+    arquivo = request.FILES.get('arquivo')
+    relatorio, erro = None, None
+    if not arquivo:
+        erro = "Escolha um arquivo CSV."
+    elif arquivo.size > CLIENTES_TAMANHO_MAXIMO:
+        erro = "Arquivo muito grande (máximo 10 MB)."
+    else:
+        try:
+            relatorio = importacao.importar_clientes(request.user, codecs.iterdecode(arquivo, 'utf-8-sig'))
+        except ValueError as e:
+            erro = str(e)
+
+    response = render(request, 'cadastro/partials/clientes_importacao.html', {
+        'relatorio': relatorio,
+        'erro': erro,
+        'erros': relatorio['erros'][:IMPORTACAO_ERROS_EXIBIDOS] if relatorio else [],
+    }, status=422 if erro else 200)
+    if relatorio:
+        total = relatorio['criados'] + relatorio['vinculados']
+        response['HX-Trigger'] = json.dumps({
+            "show-toast": {"text": f"{total} cliente(s) importado(s).", "level": "success"},
+            "clientes-importados": True,
+        })
+    return response
 
 @login_required
 @subscription_required
@@ -706,7 +952,7 @@ def cliente_edit(request, pk):
     if not getattr(request.user, 'is_owner', False):
         return redirect('accounts:owner_login')
 
-    cliente = get_object_or_404(Cliente, pk=pk, owner=request.user)
+    cliente = get_object_or_404(Cliente.objects.select_related('user'), pk=pk, owner=request.user)
     user = cliente.user
 
     if request.method == 'POST':
@@ -714,19 +960,13 @@ def cliente_edit(request, pk):
         if form.is_valid():
             form.save()
             messages.success(request, 'Cliente atualizado!')
-            qs = Cliente.objects.filter(owner=request.user).select_related('user').order_by('user__full_name')
-                
-            response = render(request, 'cadastro/partials/clientes.html', {'clientes': qs})
-            response['HX-Trigger'] = json.dumps({
-                "show-toast": {"text": "Cliente atualizado!", "level": "success"}
-            })
-    
-            return response
-        
+            return _resposta_linha(request, _cliente_linha(request.user, cliente.pk), "Cliente atualizado!")
+
         resp = render(request, 'cadastro/partials/cliente_form_edit.html',
                       {'form': form, 'cliente': cliente, 'acao': 'Editar cliente'})
         resp['HX-Retarget'] = '#modalClienteOps .modal-content'
-        
+        resp['HX-Reswap'] = 'innerHTML'
+
         return resp
 
     form = ClienteForm(instance=user)
@@ -739,14 +979,14 @@ def cliente_delete(request, pk):
     if not getattr(request.user, 'is_owner', False):
         return redirect('accounts:owner_login')
 
-    cliente = get_object_or_404(Cliente, pk=pk, owner=request.user)
+    cliente = get_object_or_404(Cliente.objects.select_related('user'), pk=pk, owner=request.user)
 
     if request.method == 'POST':
         cliente.user.delete()
         messages.success(request, 'Cliente excluído!')
-        qs = Cliente.objects.filter(owner=request.user).select_related('user').order_by('user__full_name')
-        
-        response = render(request, 'cadastro/partials/clientes.html', {'clientes': qs})
+
+        # resposta vazia: o form troca a própria linha (outerHTML) e ela some
+        response = HttpResponse('')
         response['HX-Trigger'] = json.dumps({
             "show-toast": {"text": "Cliente excluído!", "level": "success"}
         })
@@ -3,6 +3,11 @@ ASGI config for barber project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The live owner calendar (``accounts:owner_agendamentos_eventos``) is a
+long-lived Server-Sent Events stream served by an async view, so it should be
+deployed through this application (e.g. ``uvicorn barber.asgi:application``)
+rather than the WSGI one, which would hold a worker per open calendar.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
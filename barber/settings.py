@@ -50,11 +50,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apps.accounts.metricas.MetricasMiddleware',
+    'apps.accounts.cronometro.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'apps.accounts.perfil.PerfilMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 
@@ -64,7 +67,7 @@ ROOT_URLCONF = 'barber.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'apps.accounts.cronometro.TemplatesCronometrados',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -134,6 +137,36 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'apps/accounts/static')]
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Agendamentos finalizados/no-show mais antigos que isso vão para a tabela de
+# arquivo (``python manage.py arquivar_agendamentos``)
+AGENDAMENTO_ARQUIVO_DIAS = 365
+
+# Cabeçalho Server-Timing (SQL, templates, slots e total) em cada resposta;
+# expõe tempos internos, então só fica ligado com DEBUG
+SERVER_TIMING = DEBUG
+
+# Métricas Prometheus em /metrics (``apps.accounts.metricas``). O scrape precisa
+# de ``Authorization: Bearer <METRICAS_TOKEN>``; sem token, só com DEBUG
+METRICAS = True
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN')
+
+# Perfil sob demanda (``apps.accounts.perfil``): staff marca a requisição com
+# ``X-Perfil: 1`` (cProfile) ou ``X-Perfil: amostragem`` e o arquivo vai para
+# cá. None desliga
+PERFIL_DIR = BASE_DIR / 'perfis'
+PERFIL_INTERVALO = 0.005
+
+# LocMemCache é por processo: com vários workers, os eventos do calendário ao
+# vivo (``apps.appointments.eventos``) e os caches do dashboard não são
+# compartilhados; em produção use um cache comum (Redis/Memcached) como BACKEND_REAL
+CACHES = {
+    'default': {
+        'BACKEND': 'apps.accounts.metricas.CacheComMetricas',
+        'BACKEND_REAL': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'default',
+    }
+}
+
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/home/'
 LOGOUT_REDIRECT_URL = '/login/'
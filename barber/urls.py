@@ -17,8 +17,11 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from apps.accounts.views import metricas_prometheus
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metricas_prometheus, name='metricas'),
     path('', include('apps.accounts.urls', namespace='accounts')),
     path('cadastro/', include('apps.cadastro.urls', namespace='cadastro')),
     path("appointments/", include("apps.appointments.urls", namespace="appointments")),